@@ -1,19 +1,41 @@
 import hashlib
+import math
 import json
 import logging
 import os
 import threading
 import time
 import uuid
+from collections import deque
 from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, Request
+import httpx
+from fastapi import FastAPI, HTTPException, Request, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from starlette.middleware.base import BaseHTTPMiddleware
 
-from rag_pipeline.rag_orchestrator import rag_query
+from rag_pipeline.rag_orchestrator import rag_query_async, rag_query_batch_async, rag_query_stream_async
+from rag_pipeline.configs.settings import (
+    RETRIEVAL_BACKEND, BATCH_MAX_QUESTIONS, ENABLE_SEMANTIC_CACHE, ADAPTIVE_FETCH, REQUEST_DEADLINE_MS,
+)
+from rag_pipeline.deadline import Deadline
+from rag_pipeline.semantic_cache import get_semantic_cache
+from rag_pipeline.completion_cache import get_completion_cache, completion_cache_enabled
+from rag_pipeline.llm_providers import close_providers, aclose_providers
+from rag_pipeline.llm_scheduler import LLMQueueTimeout, scheduler_stats
+from rag_pipeline.llm_hedging import hedge_stats
+from rag_pipeline.circuit_breaker import CircuitOpenError, breaker_stats, breakers_enabled
+from rag_pipeline.sessions import get_session_store, CACHED
+from vectorstore.embedding_generator import embed_texts
+from vectorstore.cpu_pool import run_cpu
+from vectorstore.qdrant_pool import close_qdrant_client, close_async_qdrant_client, qdrant_health
+from vectorstore.retrieval_cache import get_retrieval_cache
+from vectorstore.reranker import reranker_stats, clear_rerank_cache
+from vectorstore.adaptive_fetch import adaptive_fetch_stats
+from vectorstore.fallback_index import warm_fallback_index
 
 # ── Logging ──────────────────────────────────────────────────────────────────
 logging.basicConfig(
@@ -37,7 +59,40 @@ _cache: Dict[str, _CacheEntry] = {}
 _cache_lock = threading.Lock()
 
 # ── Metrics counters ──────────────────────────────────────────────────────────
-_metrics: Dict[str, int] = {"total": 0, "cache_hits": 0, "errors": 0}
+_metrics: Dict[str, int] = {"total": 0, "cache_hits": 0, "semantic_hits": 0, "errors": 0, "degraded": 0}
+
+# Time to first token and total latency of the last STREAM_STATS_WINDOW streams
+STREAM_STATS_WINDOW = int(os.getenv("STREAM_STATS_WINDOW", "1000"))
+_stream_ttft: deque = deque(maxlen=STREAM_STATS_WINDOW)
+_stream_latency: deque = deque(maxlen=STREAM_STATS_WINDOW)
+_stream_lock = threading.Lock()
+
+
+def _record_stream(ttft_ms: float, latency_ms: float) -> None:
+    with _stream_lock:
+        _stream_ttft.append(ttft_ms)
+        _stream_latency.append(latency_ms)
+
+
+def _latency_summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"avg": 0.0, "p50": 0.0, "p95": 0.0}
+    ordered = sorted(values)
+
+    def pick(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2)
+
+    return {"avg": round(sum(ordered) / len(ordered), 2), "p50": pick(0.50), "p95": pick(0.95)}
+
+
+def _stream_stats() -> Dict[str, Any]:
+    with _stream_lock:
+        ttft, latency = list(_stream_ttft), list(_stream_latency)
+    return {"requests": len(ttft), "ttft_ms": _latency_summary(ttft), "latency_ms": _latency_summary(latency)}
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 
 def _make_cache_key(question: str, top_k: int, filters: Optional[Dict]) -> str:
@@ -49,6 +104,54 @@ def _make_cache_key(question: str, top_k: int, filters: Optional[Dict]) -> str:
     return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
 
 
+def _cache_get(cache_key: str) -> Optional[dict]:
+    with _cache_lock:
+        entry = _cache.get(cache_key)
+        if entry and (time.time() - entry.created_at) < CACHE_TTL_SECONDS:
+            _metrics["cache_hits"] += 1
+            cached = dict(entry.result)
+            cached["latency_ms"] = 0.0
+            return cached
+    return None
+
+
+def _request_deadline(body_ms: Optional[float], header_ms: Optional[float]) -> Optional[Deadline]:
+    """Starts when the request arrives, so cache lookups count against it."""
+    return Deadline.from_ms(body_ms or header_ms or REQUEST_DEADLINE_MS)
+
+
+def _cache_put(cache_key: str, result: dict) -> None:
+    # Evict oldest if at capacity
+    with _cache_lock:
+        if len(_cache) >= CACHE_MAX_SIZE:
+            oldest = sorted(_cache.items(), key=lambda x: x[1].created_at)
+            for k, _ in oldest[: len(_cache) - CACHE_MAX_SIZE + 1]:
+                del _cache[k]
+        _cache[cache_key] = _CacheEntry(result=result)
+
+
+async def _semantic_lookup(
+    questions: List[str], top_k: int, filters: Optional[Dict],
+) -> Tuple[List[List[float]], List[Optional[dict]]]:
+    """Embed `questions` in one call; per question, a cached answer to a
+    close-enough earlier question (same filters and top_k) or None."""
+    vectors = await run_cpu(embed_texts, questions, normalize=True)
+    cache = get_semantic_cache()
+    found: List[Optional[dict]] = []
+    for question, qvec in zip(questions, vectors):
+        hit = cache.lookup(qvec, filters, top_k)
+        if hit is None:
+            found.append(None)
+            continue
+        result, similarity = hit
+        _metrics["semantic_hits"] += 1
+        logger.info("Semantic cache HIT | similarity=%.3f | question=%s", similarity, question[:60])
+        result["question"] = question
+        result["latency_ms"] = 0.0
+        found.append(result)
+    return vectors, found
+
+
 # ── Request ID middleware ─────────────────────────────────────────────────────
 class RequestIDMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -64,7 +167,14 @@ class RequestIDMiddleware(BaseHTTPMiddleware):
 async def lifespan(app: FastAPI):
     logger.info("HR Compliance RAG API starting up")
     logger.info("Cache settings: TTL=%ds MAX_SIZE=%d", CACHE_TTL_SECONDS, CACHE_MAX_SIZE)
+    if breakers_enabled() and RETRIEVAL_BACKEND == "qdrant":
+        # Load the snapshot now so the first fallback does not wait for it
+        await run_cpu(warm_fallback_index)
     yield
+    await close_async_qdrant_client()
+    close_qdrant_client()
+    await aclose_providers()
+    close_providers()
     logger.info("HR Compliance RAG API shutting down")
 
 
@@ -78,6 +188,10 @@ class QueryRequest(BaseModel):
     question: str = Field(..., min_length=3)
     top_k: int = Field(5, ge=1, le=20)
     filters: Optional[Dict[str, Any]] = None
+    deadline_ms: Optional[float] = Field(None, gt=0, description="Latency budget; overrides X-Deadline-Ms")
+    session_id: Optional[str] = Field(
+        None, min_length=1, max_length=128, description="Answer as a follow-up within this conversation",
+    )
 
 
 class Source(BaseModel):
@@ -98,29 +212,105 @@ class QueryResponse(BaseModel):
     filters: Dict[str, Any]
     top_k: int
     latency_ms: float
+    token_counts: Optional[Dict[str, int]] = None
+    degraded: List[str] = []
+    session: Optional[Dict[str, Any]] = None
+
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_QUESTIONS)
+    top_k: int = Field(5, ge=1, le=20)
+    filters: Optional[Dict[str, Any]] = None
+    deadline_ms: Optional[float] = Field(None, gt=0, description="Latency budget for the whole batch")
+
+
+class BatchItem(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    sources: List[Source] = []
+    latency_ms: Optional[float] = None
+    token_counts: Optional[Dict[str, int]] = None
+    degraded: List[str] = []
+    error: Optional[str] = None
+
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchItem]
+    filters: Dict[str, Any]
+    top_k: int
+    errors: int
+    latency_ms: float
 
 
 # ── Endpoints ─────────────────────────────────────────────────────────────────
 @app.get("/health")
 def health():
     logger.info("Health check called")
-    return {"status": "ok"}
+    if RETRIEVAL_BACKEND != "qdrant":
+        return {"status": "ok"}
+    qdrant = qdrant_health()
+    return {"status": "ok" if qdrant["status"] == "ok" else "degraded", "qdrant": qdrant}
+
+
+def _overloaded(e: Exception) -> Optional[HTTPException]:
+    """503 + Retry-After when the LLM is at its rate limit, or a dependency's
+    circuit breaker is open with no fallback, instead of a 500."""
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(
+            status_code=503,
+            detail=f"{e.name} is temporarily unavailable, retry later.",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+    if isinstance(e, LLMQueueTimeout):
+        retry_after = e.retry_after
+    elif isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429:
+        try:
+            retry_after = float(e.response.headers.get("retry-after", "1"))
+        except ValueError:
+            retry_after = 1.0
+    else:
+        return None
+    return HTTPException(
+        status_code=503,
+        detail="LLM provider is at its rate limit, retry later.",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def _uses_answer_cache(session_id: Optional[str]) -> bool:
+    # A follow-up depends on its conversation; a session's first question does not
+    return session_id is None or get_session_store().first_turn(session_id)
+
+
+def _cached_turn(result: Dict[str, Any], req: QueryRequest) -> Dict[str, Any]:
+    """A cached answer, remembered as the first turn of the request's session."""
+    if req.session_id is None:
+        return result
+    store = get_session_store()
+    session = store.get(req.session_id)
+    session.remember(req.question, result["answer"])
+    store.record(CACHED, 0)
+    return {**result, "session": session.info(CACHED)}
 
 
 @app.post("/query", response_model=QueryResponse)
-def query(req: QueryRequest):
+async def query(req: QueryRequest, x_deadline_ms: Optional[float] = Header(None)):
     _metrics["total"] += 1
+    deadline = _request_deadline(req.deadline_ms, x_deadline_ms)
     cache_key = _make_cache_key(req.question, req.top_k, req.filters)
 
-    # Check cache first
-    with _cache_lock:
-        entry = _cache.get(cache_key)
-        if entry and (time.time() - entry.created_at) < CACHE_TTL_SECONDS:
-            _metrics["cache_hits"] += 1
-            logger.info("Cache HIT | key=%s | question=%s", cache_key[:12], req.question[:60])
-            cached = dict(entry.result)
-            cached["latency_ms"] = 0.0
-            return cached
+    cacheable = _uses_answer_cache(req.session_id)
+    cached = _cache_get(cache_key) if cacheable else None
+    if cached is not None:
+        logger.info("Cache HIT | key=%s | question=%s", cache_key[:12], req.question[:60])
+        return _cached_turn(cached, req)
+
+    qvec = None
+    if ENABLE_SEMANTIC_CACHE and cacheable:
+        vectors, found = await _semantic_lookup([req.question], req.top_k, req.filters)
+        if found[0] is not None:
+            return _cached_turn(found[0], req)
+        qvec = vectors[0]
 
     logger.info(
         "Cache MISS | question=%s | top_k=%s | filters=%s",
@@ -131,29 +321,39 @@ def query(req: QueryRequest):
 
     t0 = time.perf_counter()
     try:
-        result = rag_query(req.question, top_k=req.top_k, filters=req.filters)
+        result = await rag_query_async(
+            req.question, top_k=req.top_k, filters=req.filters, deadline=deadline, session_id=req.session_id,
+            query_vector=qvec,
+        )
         latency_ms = (time.perf_counter() - t0) * 1000.0
         result["latency_ms"] = latency_ms
 
         logger.info(
-            "Query OK | latency_ms=%.2f | sources=%d",
+            "Query OK | latency_ms=%.2f | sources=%d | degraded=%s",
             latency_ms,
             len(result.get("sources", [])),
+            result.get("degraded"),
         )
 
-        # Store in cache (evict oldest if at capacity)
-        with _cache_lock:
-            if len(_cache) >= CACHE_MAX_SIZE:
-                oldest = sorted(_cache.items(), key=lambda x: x[1].created_at)
-                for k, _ in oldest[: len(_cache) - CACHE_MAX_SIZE + 1]:
-                    del _cache[k]
-            _cache[cache_key] = _CacheEntry(result=result)
+        # A degraded answer is not cached: the next request may have time for a full one
+        if result.get("degraded"):
+            _metrics["degraded"] += 1
+        elif cacheable:
+            # A first turn answers like a sessionless query; its session info is per caller
+            entry = {k: v for k, v in result.items() if k != "session"}
+            _cache_put(cache_key, entry)
+            if qvec is not None:
+                get_semantic_cache().put(qvec, req.filters, req.top_k, entry)
 
         return result
 
     except Exception as e:
         _metrics["errors"] += 1
         latency_ms = (time.perf_counter() - t0) * 1000.0
+        overloaded = _overloaded(e)
+        if overloaded is not None:
+            logger.warning("Query REJECTED | latency_ms=%.2f | error=%s", latency_ms, str(e))
+            raise overloaded
         logger.exception("Query FAILED | latency_ms=%.2f | error=%s", latency_ms, str(e))
         raise HTTPException(
             status_code=500,
@@ -161,6 +361,153 @@ def query(req: QueryRequest):
         )
 
 
+@app.post("/query/stream")
+async def query_stream(req: QueryRequest, x_deadline_ms: Optional[float] = Header(None)):
+    """Server-Sent Events: `sources` first, then one `token` event per generated
+    token, then `done` with the timing record (ttft_ms, latency_ms, stages).
+    A failure after the stream has started is sent as an `error` event."""
+    _metrics["total"] += 1
+    t0 = time.perf_counter()
+    deadline = _request_deadline(req.deadline_ms, x_deadline_ms)
+    cache_key = _make_cache_key(req.question, req.top_k, req.filters)
+
+    cacheable = _uses_answer_cache(req.session_id)
+    cached = _cache_get(cache_key) if cacheable else None
+    qvec = None
+    if cached is None and ENABLE_SEMANTIC_CACHE and cacheable:
+        vectors, found = await _semantic_lookup([req.question], req.top_k, req.filters)
+        cached, qvec = found[0], vectors[0]
+    if cached is not None:
+        cached = _cached_turn(cached, req)
+
+    async def events():
+        if cached is not None:
+            logger.info("Stream served from cache | question=%s", req.question[:60])
+            yield _sse("sources", {k: cached.get(k) for k in ("question", "sources", "filters", "top_k")})
+            ttft_ms = (time.perf_counter() - t0) * 1000.0
+            yield _sse("token", {"text": cached["answer"]})
+            latency_ms = (time.perf_counter() - t0) * 1000.0
+            done = {"ttft_ms": ttft_ms, "latency_ms": latency_ms, "tokens": 1, "cached": True}
+            if cached.get("session") is not None:
+                done["session"] = cached["session"]
+            yield _sse("done", done)
+            _record_stream(ttft_ms, latency_ms)
+            return
+
+        head: Dict[str, Any] = {}
+        parts: List[str] = []
+        token_counts = None
+        degraded: List[str] = []
+        ttft_ms = None
+        try:
+            stream = rag_query_stream_async(
+                req.question, top_k=req.top_k, filters=req.filters, deadline=deadline, session_id=req.session_id,
+                query_vector=qvec,
+            )
+            async for name, data in stream:
+                if name == "sources":
+                    head = data
+                elif name == "token":
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - t0) * 1000.0
+                    parts.append(data["text"])
+                elif name == "done":
+                    token_counts = data.get("token_counts")
+                    degraded = data.get("degraded") or []
+                    # Measured from request arrival, cache lookups included
+                    data = {**data, "ttft_ms": ttft_ms or 0.0,
+                            "latency_ms": (time.perf_counter() - t0) * 1000.0, "cached": False}
+                yield _sse(name, data)
+        except Exception as e:
+            _metrics["errors"] += 1
+            overloaded = _overloaded(e)
+            if overloaded is not None:
+                logger.warning("Stream REJECTED | error=%s", str(e))
+                yield _sse("error", {"detail": overloaded.detail, "retry_after": overloaded.headers["Retry-After"]})
+                return
+            logger.exception("Stream FAILED | latency_ms=%.2f | error=%s", (time.perf_counter() - t0) * 1000.0, str(e))
+            yield _sse("error", {"detail": "Internal server error while processing the query."})
+            return
+
+        latency_ms = (time.perf_counter() - t0) * 1000.0
+        logger.info("Stream OK | ttft_ms=%.2f | latency_ms=%.2f | sources=%d",
+                    ttft_ms or 0.0, latency_ms, len(head.get("sources", [])))
+        _record_stream(ttft_ms or 0.0, latency_ms)
+        result = {**head, "answer": "".join(parts), "latency_ms": latency_ms, "token_counts": token_counts,
+                  "degraded": degraded}
+        if degraded:
+            _metrics["degraded"] += 1
+        elif cacheable:
+            _cache_put(cache_key, result)
+            if qvec is not None:
+                get_semantic_cache().put(qvec, req.filters, req.top_k, result)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_batch(req: BatchQueryRequest, x_deadline_ms: Optional[float] = Header(None)):
+    _metrics["total"] += len(req.questions)
+    t0 = time.perf_counter()
+    deadline = _request_deadline(req.deadline_ms, x_deadline_ms)
+
+    keys = [_make_cache_key(q, req.top_k, req.filters) for q in req.questions]
+    results: List[Optional[dict]] = [_cache_get(k) for k in keys]
+    misses = [i for i, r in enumerate(results) if r is None]
+    logger.info("Batch query | questions=%d | cache_hits=%d | top_k=%s | filters=%s",
+                len(req.questions), len(req.questions) - len(misses), req.top_k, req.filters)
+
+    qvecs: Dict[int, List[float]] = {}
+    if ENABLE_SEMANTIC_CACHE and misses:
+        vectors, found = await _semantic_lookup([req.questions[i] for i in misses], req.top_k, req.filters)
+        for i, qvec, result in zip(misses, vectors, found):
+            results[i] = result
+            qvecs[i] = qvec
+        misses = [i for i in misses if results[i] is None]
+
+    if misses:
+        try:
+            answered = await rag_query_batch_async(
+                [req.questions[i] for i in misses], top_k=req.top_k, filters=req.filters, deadline=deadline,
+                query_vectors=[qvecs[i] for i in misses] if qvecs else None,
+            )
+        except Exception as e:
+            overloaded = _overloaded(e)
+            if overloaded is not None and len(misses) == len(results):
+                _metrics["errors"] += len(misses)
+                logger.warning("Batch query REJECTED | error=%s", str(e))
+                raise overloaded
+            # Keep the cached answers; only the unanswered items fail
+            logger.exception("Batch query FAILED | error=%s", str(e))
+            detail = overloaded.detail if overloaded is not None else "Internal server error."
+            answered = [{"question": req.questions[i], "error": detail} for i in misses]
+        for i, result in zip(misses, answered):
+            results[i] = result
+            if "error" in result:
+                _metrics["errors"] += 1
+            elif result.get("degraded"):
+                _metrics["degraded"] += 1
+            else:
+                _cache_put(keys[i], result)
+                if i in qvecs:
+                    get_semantic_cache().put(qvecs[i], req.filters, req.top_k, result)
+
+    latency_ms = (time.perf_counter() - t0) * 1000.0
+    errors = sum(1 for r in results if "error" in r)
+    logger.info("Batch query OK | latency_ms=%.2f | errors=%d", latency_ms, errors)
+    return {
+        "results": results,
+        "filters": req.filters or {},
+        "top_k": req.top_k,
+        "errors": errors,
+        "latency_ms": latency_ms,
+    }
+
+
 @app.get("/cache/stats")
 def cache_stats():
     with _cache_lock:
@@ -171,6 +518,10 @@ def cache_stats():
         "live_entries": live,
         "ttl_seconds": CACHE_TTL_SECONDS,
         "max_size": CACHE_MAX_SIZE,
+        "retrieval": get_retrieval_cache().stats(),
+        "semantic": {"enabled": ENABLE_SEMANTIC_CACHE, **get_semantic_cache().stats()},
+        "rerank": reranker_stats(),
+        "completion": {"enabled": completion_cache_enabled(), **get_completion_cache().stats()},
     }
 
 
@@ -178,13 +529,33 @@ def cache_stats():
 def cache_clear():
     with _cache_lock:
         _cache.clear()
+    get_retrieval_cache().clear()
+    get_semantic_cache().clear()
+    clear_rerank_cache()
+    if completion_cache_enabled():
+        get_completion_cache().clear()
     logger.info("Cache cleared via API")
     return {"status": "cleared"}
 
 
+@app.delete("/sessions/{session_id}")
+def session_delete(session_id: str):
+    """End a conversation; its next query starts a fresh session."""
+    if not get_session_store().drop(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session.")
+    logger.info("Session %s ended via API", session_id)
+    return {"status": "deleted", "session_id": session_id}
+
+
 @app.get("/metrics")
 def metrics_endpoint():
     return {
         **_metrics,
         "cache_entries": len(_cache),
+        "adaptive_fetch": {"enabled": ADAPTIVE_FETCH, **adaptive_fetch_stats()},
+        "streaming": _stream_stats(),
+        "llm_scheduler": scheduler_stats(),
+        "llm_hedging": hedge_stats(),
+        "circuit_breakers": breaker_stats(),
+        "sessions": get_session_store().stats(),
     }
@@ -0,0 +1,156 @@
+"""
+OpenAI-compatible stub LLM server for offline load tests.
+
+Serves POST /v1/chat/completions (plain or `"stream": true` Server-Sent
+Events) with a deterministic answer built from the prompt: the first
+sentences of the first context block, cited with its [chunk_id], or the
+"I don't know" reply when the prompt has no context.
+Latency is simulated as a fixed time to first token plus a token rate, so the
+whole pipeline (retrieval, reranking, generation, API) can be load-tested
+without a provider account or network access.
+
+Usage:
+    python -m api.llm_stub_server --port 8001 --latency-ms 300 --tokens-per-sec 80
+    LLM_PROVIDER=local LOCAL_LLM_URL=http://localhost:8001/v1 uvicorn api.fastapi_app:app
+
+Enable via: LLM_PROVIDER=local in .env (STUB_LATENCY_MS, STUB_TOKENS_PER_SEC, STUB_ANSWER_TOKENS)
+"""
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "200"))        # time to first token
+STUB_TOKENS_PER_SEC = float(os.getenv("STUB_TOKENS_PER_SEC", "100"))  # 0 = instant
+STUB_ANSWER_TOKENS = int(os.getenv("STUB_ANSWER_TOKENS", "60"))
+
+NO_ANSWER = "I don't know based on the provided documents."
+
+# Context blocks: "[chunk_id] doc_id | department ...", then the text
+_CHUNK_RE = re.compile(r"^\[([^\]\s]+)\][^\n]*\n(.*?)(?=\n---\n|\n\nRULES:|\Z)", re.M | re.S)
+
+app = FastAPI(title="Stub LLM", version="1.0")
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+
+
+class ChatRequest(BaseModel):
+    model: str = "stub"
+    messages: List[ChatMessage]
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    stream: bool = False
+
+
+def _count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+def stub_answer(prompt: str, max_tokens: int = STUB_ANSWER_TOKENS) -> str:
+    match = _CHUNK_RE.search(prompt)
+    if not match or not match.group(2).strip():
+        return NO_ANSWER
+    chunk_id, text = match.group(1), " ".join(match.group(2).split())
+    words = text.split()[:max_tokens]
+    return f"{' '.join(words).rstrip('.')}. [{chunk_id}]"
+
+
+async def _simulate(n_tokens: int) -> None:
+    delay = STUB_LATENCY_MS / 1000.0
+    if STUB_TOKENS_PER_SEC > 0:
+        delay += n_tokens / STUB_TOKENS_PER_SEC
+    await asyncio.sleep(delay)
+
+
+def _usage(req: ChatRequest, answer: str) -> Dict[str, int]:
+    prompt_tokens = sum(_count_tokens(m.content) for m in req.messages)
+    completion_tokens = _count_tokens(answer)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+async def _stream(req: ChatRequest, answer: str):
+    """OpenAI chunk format: one delta per word, paced by STUB_TOKENS_PER_SEC."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    await asyncio.sleep(STUB_LATENCY_MS / 1000.0)
+    words = answer.split(" ")
+    for i, word in enumerate(words):
+        if i and STUB_TOKENS_PER_SEC > 0:
+            await asyncio.sleep(1.0 / STUB_TOKENS_PER_SEC)
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "model": req.model,
+            "choices": [{"index": 0, "delta": {"content": word if i == 0 else f" {word}"}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    final = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "model": req.model,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        "usage": _usage(req, answer),
+    }
+    yield f"data: {json.dumps(final)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(req: ChatRequest):
+    prompt = "\n".join(m.content for m in req.messages if m.role == "user")
+    answer = stub_answer(prompt, min(req.max_tokens or STUB_ANSWER_TOKENS, STUB_ANSWER_TOKENS))
+    if req.stream:
+        return StreamingResponse(_stream(req, answer), media_type="text/event-stream")
+    await _simulate(_count_tokens(answer))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": req.model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": answer},
+            "finish_reason": "stop",
+        }],
+        "usage": _usage(req, answer),
+    }
+
+
+@app.get("/v1/models")
+def models() -> Dict[str, Any]:
+    return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "local"}]}
+
+
+def main():
+    global STUB_LATENCY_MS, STUB_TOKENS_PER_SEC, STUB_ANSWER_TOKENS
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=STUB_LATENCY_MS, help="time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=STUB_TOKENS_PER_SEC, help="0 = no generation delay")
+    parser.add_argument("--answer-tokens", type=int, default=STUB_ANSWER_TOKENS)
+    args = parser.parse_args()
+    STUB_LATENCY_MS, STUB_TOKENS_PER_SEC, STUB_ANSWER_TOKENS = args.latency_ms, args.tokens_per_sec, args.answer_tokens
+
+    import uvicorn
+    print(f"Stub LLM on http://{args.host}:{args.port}/v1 "
+          f"(latency={STUB_LATENCY_MS:.0f} ms, {STUB_TOKENS_PER_SEC:.0f} tok/s, {STUB_ANSWER_TOKENS} tokens)")
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Load test for POST /query/stream with time to first token as the headline metric.
+
+Replays questions from a queries file at a fixed concurrency and reports
+TTFT (first `token` event seen by the client) and total stream latency.
+Pair it with api/llm_stub_server.py to load-test the pipeline offline.
+
+Usage:
+    python -m api.stream_load_test --url http://localhost:8000 --concurrency 16 --requests 200
+
+Enable via: LLM_PROVIDER=local for an offline run (see api/llm_stub_server.py)
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from typing import Any, Dict, List
+
+import httpx
+
+QUERIES_PATH = "evaluation/queries.jsonl"
+
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+async def one_stream(client: httpx.AsyncClient, url: str, query: Dict[str, Any], top_k: int) -> Dict[str, Any]:
+    body = {"question": query["query"], "top_k": top_k, "filters": query.get("filters") or None}
+    t0 = time.perf_counter()
+    ttft = None
+    event = ""
+    async with client.stream("POST", f"{url}/query/stream", json=body) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif event == "token" and ttft is None and line.startswith("data:"):
+                ttft = (time.perf_counter() - t0) * 1000.0
+            elif event == "error" and line.startswith("data:"):
+                raise RuntimeError(line[len("data:"):].strip())
+    return {"ttft_ms": ttft or 0.0, "latency_ms": (time.perf_counter() - t0) * 1000.0}
+
+
+async def run(url: str, queries: List[Dict[str, Any]], n_requests: int, concurrency: int, top_k: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0, connect=5.0), limits=limits) as client:
+
+        async def worker(i: int):
+            async with semaphore:
+                try:
+                    return await one_stream(client, url, queries[i % len(queries)], top_k)
+                except Exception as e:
+                    return {"error": str(e) or type(e).__name__}
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*[worker(i) for i in range(n_requests)])
+        return results, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test of the streaming endpoint (TTFT first)")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--queries", default=QUERIES_PATH)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0, help="shuffle the questions (0 = file order)")
+    args = parser.parse_args()
+
+    queries = load_questions(args.queries)
+    if args.seed:
+        random.Random(args.seed).shuffle(queries)
+
+    results, wall_s = asyncio.run(run(args.url, queries, args.requests, args.concurrency, args.top_k))
+    ok = [r for r in results if "error" not in r]
+    ttft = [r["ttft_ms"] for r in ok]
+    latency = [r["latency_ms"] for r in ok]
+
+    print(f"Requests: {len(results)} | errors: {len(results) - len(ok)} | concurrency: {args.concurrency} "
+          f"| throughput: {len(ok) / wall_s:.1f} req/s")
+    if ok:
+        print(f"TTFT     p50={pct(ttft, 50):.0f} ms  p95={pct(ttft, 95):.0f} ms  avg={statistics.mean(ttft):.0f} ms")
+        print(f"Complete p50={pct(latency, 50):.0f} ms  p95={pct(latency, 95):.0f} ms  "
+              f"avg={statistics.mean(latency):.0f} ms")
+    for r in [r for r in results if "error" in r][:5]:
+        print(f"  error: {r['error']}")
+
+
+if __name__ == "__main__":
+    main()
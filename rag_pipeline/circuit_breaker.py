@@ -0,0 +1,284 @@
+"""
+Circuit breakers around Qdrant and the LLM providers.
+
+When Qdrant or an LLM provider is slow or down, every query waits out the
+full client timeout, worker threads pile up and the whole API stalls. A
+breaker watches the outcome and latency of the last BREAKER_WINDOW calls to
+one dependency ("qdrant", "llm:<provider>"):
+
+  - closed:    calls go through. Once BREAKER_MIN_CALLS have been seen, the
+               breaker opens if BREAKER_ERROR_RATE of them failed, or if
+               BREAKER_SLOW_CALL_RATE of them were slower than the slow-call
+               threshold (BREAKER_QDRANT_SLOW_MS, BREAKER_LLM_SLOW_MS);
+  - open:      calls fail at once with CircuitOpenError for
+               BREAKER_OPEN_SECONDS;
+  - half_open: up to BREAKER_HALF_OPEN_PROBES calls are let through as
+               probes. If they all succeed in time the breaker closes; one
+               failed or slow probe opens it again.
+
+Callers fall back instead of failing: retrieval answers from an in-process
+search over the vector snapshot (vectorstore/fallback_index.py) and
+generation returns the top retrieved passages as an extractive answer
+(`extractive_answer`). Breaker states are reported by `breaker_stats()`
+(GET /metrics).
+
+Usage:
+    from rag_pipeline.circuit_breaker import qdrant_breaker, guard
+    breaker = qdrant_breaker()
+    with guard(breaker):
+        hits = client.query_points(...)
+
+Enable via: ENABLE_CIRCUIT_BREAKERS=true in .env
+"""
+import time
+import logging
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, List
+
+from rag_pipeline.configs.settings import (
+    ENABLE_CIRCUIT_BREAKERS, BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE,
+    BREAKER_SLOW_CALL_RATE, BREAKER_QDRANT_SLOW_MS, BREAKER_LLM_SLOW_MS, BREAKER_OPEN_SECONDS,
+    BREAKER_HALF_OPEN_PROBES, EXTRACTIVE_PASSAGES, EXTRACTIVE_PASSAGE_CHARS, LLM_PROVIDER,
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+EXTRACTIVE_HEADER = (
+    "The answer service is currently unavailable, so no answer was generated. "
+    "The most relevant passages from the documents are:"
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """The breaker of a dependency is open; `retry_after` is in seconds."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit breaker '{name}' is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        slow_call_ms: float,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        error_rate: float = BREAKER_ERROR_RATE,
+        slow_call_rate: float = BREAKER_SLOW_CALL_RATE,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        half_open_probes: int = BREAKER_HALF_OPEN_PROBES,
+    ):
+        self.name = name
+        self.slow_call_s = slow_call_ms / 1000.0
+        self.min_calls = max(1, min_calls)
+        self.error_rate = error_rate
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self.state = CLOSED
+        self._calls: deque = deque(maxlen=max(1, window))  # (failed, slow) per call
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+
+    # ── State ────────────────────────────────────────────────────────────────
+    def _open(self, now: float, reason: str) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._stats["opened"] += 1
+        logger.warning("Circuit breaker %s opened: %s", self.name, reason)
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._calls.clear()
+        self._probes_in_flight = 0
+        logger.info("Circuit breaker %s closed", self.name)
+
+    def _retry_after(self, now: float) -> float:
+        return max(0.0, self._opened_at + self.open_seconds - now)
+
+    def _check(self, now: float, reserve: bool) -> bool:
+        """Raise CircuitOpenError if the call may not go through; True if it
+        goes through as a half-open probe (only reserved when `reserve`)."""
+        if self.state == OPEN:
+            if now < self._opened_at + self.open_seconds:
+                self._stats["rejected"] += 1
+                raise CircuitOpenError(self.name, self._retry_after(now))
+            self.state = HALF_OPEN
+            logger.info("Circuit breaker %s half-open, probing", self.name)
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                self._stats["rejected"] += 1
+                raise CircuitOpenError(self.name, 1.0)
+            if reserve:
+                self._probes_in_flight += 1
+            return True
+        return False
+
+    def raise_if_open(self) -> None:
+        """Fail fast before queueing for a call that would be rejected anyway."""
+        with self._lock:
+            self._check(time.monotonic(), reserve=False)
+
+    def admit(self) -> bool:
+        """Let one call through; True if it is a half-open probe."""
+        with self._lock:
+            return self._check(time.monotonic(), reserve=True)
+
+    def record(self, elapsed_s: float, ok: bool, probe: bool) -> None:
+        slow = elapsed_s >= self.slow_call_s
+        now = time.monotonic()
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["failures"] += not ok
+            self._stats["slow_calls"] += slow
+            if probe:
+                if self.state != HALF_OPEN:
+                    return
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if not ok or slow:
+                    self._open(now, f"half-open probe {'failed' if not ok else 'was slow'}")
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._close()
+                return
+            # Calls admitted before the breaker opened do not count afterwards
+            if self.state != CLOSED:
+                return
+            self._calls.append((not ok, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            failed = sum(f for f, _ in self._calls) / len(self._calls)
+            slowed = sum(s for _, s in self._calls) / len(self._calls)
+            if failed >= self.error_rate:
+                self._open(now, f"error rate {failed:.0%} over {len(self._calls)} calls")
+            elif slowed >= self.slow_call_rate:
+                self._open(now, f"slow-call rate {slowed:.0%} over {len(self._calls)} calls")
+
+    def release(self, probe: bool) -> None:
+        """A call ended without an outcome (cancelled): free its probe slot."""
+        if probe:
+            with self._lock:
+                if self.state == HALF_OPEN:
+                    self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = list(self._calls)
+            out: Dict[str, Any] = {
+                "name": self.name,
+                "state": self.state,
+                "window_calls": len(calls),
+                "error_rate": round(sum(f for f, _ in calls) / len(calls), 4) if calls else 0.0,
+                "slow_call_rate": round(sum(s for _, s in calls) / len(calls), 4) if calls else 0.0,
+                "slow_call_ms": self.slow_call_s * 1000.0,
+                **self._stats,
+            }
+            if self.state == OPEN:
+                out["retry_after_s"] = round(self._retry_after(time.monotonic()), 1)
+        return out
+
+
+class _Call:
+    """Context manager timing one call; records its outcome on exit.
+
+    The latency is taken at exit unless `mark()` fixed it earlier (streams
+    mark their first token). Cancellation records nothing.
+    """
+
+    def __init__(self, breaker: Optional[CircuitBreaker]):
+        self.breaker = breaker
+        self.probe = False
+        self.latency: Optional[float] = None
+
+    def __enter__(self) -> "_Call":
+        if self.breaker is not None:
+            self.probe = self.breaker.admit()
+        self.t0 = time.monotonic()
+        return self
+
+    def mark(self) -> None:
+        if self.latency is None:
+            self.latency = time.monotonic() - self.t0
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self.breaker is None:
+            return False
+        if exc_type is None or issubclass(exc_type, Exception):
+            self.mark()
+            self.breaker.record(self.latency, ok=exc_type is None, probe=self.probe)
+        else:
+            self.breaker.release(self.probe)
+        return False
+
+
+def guard(breaker: Optional[CircuitBreaker]) -> _Call:
+    """`with guard(breaker):` around one call; a no-op for `None`."""
+    return _Call(breaker)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, slow_call_ms: float) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name, slow_call_ms)
+    return breaker
+
+
+def breakers_enabled() -> bool:
+    return ENABLE_CIRCUIT_BREAKERS
+
+
+def qdrant_breaker() -> Optional[CircuitBreaker]:
+    """The Qdrant breaker, or None when breakers are disabled."""
+    return get_breaker("qdrant", BREAKER_QDRANT_SLOW_MS) if ENABLE_CIRCUIT_BREAKERS else None
+
+
+def llm_breaker(provider: Optional[str] = None) -> Optional[CircuitBreaker]:
+    """The breaker of one LLM provider, or None when breakers are disabled."""
+    if not ENABLE_CIRCUIT_BREAKERS:
+        return None
+    return get_breaker(f"llm:{(provider or LLM_PROVIDER).lower()}", BREAKER_LLM_SLOW_MS)
+
+
+def breaker_stats() -> Dict[str, Any]:
+    return {
+        "enabled": ENABLE_CIRCUIT_BREAKERS,
+        "breakers": [b.stats() for b in list(_breakers.values())],
+    }
+
+
+# ── LLM fallback ──────────────────────────────────────────────────────────────
+def extractive_answer(
+    retrieved: List[Dict[str, Any]],
+    passages: int = EXTRACTIVE_PASSAGES,
+    max_chars: int = EXTRACTIVE_PASSAGE_CHARS,
+) -> str:
+    """The top retrieved passages, cited like generated answers ([chunk_id])."""
+    from rag_pipeline.context_packer import leading_sentences
+    lines = [EXTRACTIVE_HEADER, ""]
+    for r in retrieved:
+        if len(lines) - 2 >= passages:
+            break
+        p = r.get("payload") or {}
+        text = leading_sentences(p.get("text") or "", max_chars)
+        if text:
+            lines.append(f"{len(lines) - 1}. {text} [{p.get('chunk_id', 'unknown_chunk')}]")
+    return "\n".join(lines)
@@ -0,0 +1,205 @@
+"""
+Persistent LLM completion cache.
+
+Different questions, or one question under different filters, often retrieve
+the same chunks and build the same prompt. The API answer caches are keyed by
+the question, so they miss, and they are lost on restart. This cache sits
+right in front of the provider: completions are stored in SQLite
+(COMPLETION_CACHE_PATH) under a SHA-256 of (provider, model, temperature,
+system prompt, user prompt), so any identical prompt is answered from disk,
+across restarts and across API workers (WAL mode).
+
+  - Bounded: beyond COMPLETION_CACHE_MAX_ENTRIES the least recently used rows
+    are deleted; rows older than COMPLETION_CACHE_TTL_SECONDS are ignored
+    (0 = keep until evicted).
+  - A hit skips the rate-limit scheduler as well, it costs no provider quota.
+  - Hits, misses, writes and evictions are in `stats()` (GET /cache/stats).
+
+The week 5 eval turns it on, so re-running it after a change that does not
+touch the prompts makes no LLM calls.
+
+Usage:
+    from rag_pipeline.completion_cache import get_completion_cache
+    cache = get_completion_cache()
+    key = cache.key(provider, system_prompt, user_prompt)
+    answer = cache.get(key)
+
+Enable via: ENABLE_COMPLETION_CACHE=true in .env
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import Optional, Dict, Any
+
+from rag_pipeline.configs.settings import (
+    ENABLE_COMPLETION_CACHE, COMPLETION_CACHE_PATH, COMPLETION_CACHE_MAX_ENTRIES,
+    COMPLETION_CACHE_TTL_SECONDS, TEMPERATURE,
+)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key        TEXT PRIMARY KEY,
+    provider   TEXT NOT NULL,
+    model      TEXT NOT NULL,
+    answer     TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at    REAL NOT NULL,
+    hits       INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS completions_used_at ON completions (used_at);
+"""
+
+_enabled = ENABLE_COMPLETION_CACHE
+
+
+def completion_cache_enabled() -> bool:
+    return _enabled
+
+
+def set_completion_cache_enabled(enabled: bool) -> None:
+    """Override ENABLE_COMPLETION_CACHE for this process (eval scripts)."""
+    global _enabled
+    _enabled = enabled
+
+
+class CompletionCache:
+    def __init__(
+        self,
+        path: str = COMPLETION_CACHE_PATH,
+        max_entries: int = COMPLETION_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = COMPLETION_CACHE_TTL_SECONDS,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._count: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per process, shared by threads under the lock."""
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+            self._count = conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        return self._conn
+
+    @staticmethod
+    def key(provider, system_prompt: str, user_prompt: str) -> str:
+        return hashlib.sha256(json.dumps(
+            {
+                "provider": provider.name,
+                "model": provider.model,
+                "temperature": TEMPERATURE,
+                "system": system_prompt,
+                "user": user_prompt,
+            },
+            sort_keys=True,
+        ).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute("SELECT answer, created_at FROM completions WHERE key = ?", (key,)).fetchone()
+                if row is None or (self.ttl_seconds and now - row[1] >= self.ttl_seconds):
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE completions SET used_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+        except sqlite3.Error as exc:
+            # A broken cache must never fail the query
+            logger.warning("Completion cache read failed: %s", exc)
+            return None
+
+    def put(self, key: str, provider, answer: str) -> None:
+        if not answer:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connection()
+                cur = conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, provider, model, answer, created_at, used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, provider.name, provider.model, answer, now, now),
+                )
+                self.writes += 1
+                self._count += cur.rowcount
+                if self._count > self.max_entries:
+                    self._evict(conn)
+        except sqlite3.Error as exc:
+            logger.warning("Completion cache write failed: %s", exc)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        # Other workers share the file: recount before deleting
+        count = conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        # Trim 10% below the bound so eviction does not run on every write
+        excess = count - int(self.max_entries * 0.9)
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM completions WHERE key IN "
+                "(SELECT key FROM completions ORDER BY used_at LIMIT ?)",
+                (excess,),
+            )
+            self.evictions += excess
+            count -= excess
+        self._count = count
+
+    def clear(self) -> None:
+        try:
+            with self._lock:
+                self._connection().execute("DELETE FROM completions")
+                self._count = 0
+                self.hits = self.misses = self.writes = self.evictions = 0
+        except sqlite3.Error as exc:
+            logger.warning("Completion cache clear failed: %s", exc)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            try:
+                entries = self._connection().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            except sqlite3.Error:
+                entries = None
+            return {
+                "path": self.path,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+
+_completion_cache: Optional[CompletionCache] = None
+_completion_cache_lock = threading.Lock()
+
+
+def get_completion_cache() -> CompletionCache:
+    global _completion_cache
+    if _completion_cache is None:
+        with _completion_cache_lock:
+            if _completion_cache is None:
+                _completion_cache = CompletionCache()
+    return _completion_cache
@@ -6,9 +6,91 @@ load_dotenv()
 # Qdrant
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "hr_chunks")
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10"))
+QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "16"))
 
 # Retrieval
 TOP_K_DEFAULT = int(os.getenv("TOP_K_DEFAULT", "5"))
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+
+# Retrieval backend: "qdrant" (server), "local" (in-process exact search)
+# or "hnsw" (in-process approximate search)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "qdrant").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join("data", "local_index"))
+
+# HNSW backend
+HNSW_INDEX_DIR = os.getenv("HNSW_INDEX_DIR", os.path.join("data", "hnsw_index"))
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+# Retrieval mode: "dense" (vectors), "lexical" (BM25 only) or "hybrid" (RRF of both)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense").lower()
+BM25_INDEX_DIR = os.getenv("BM25_INDEX_DIR", os.path.join("data", "bm25_index"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# BM25 scores are unbounded, so lexical mode has its own "insufficient context" floor (0 = any match)
+BM25_SCORE_THRESHOLD = float(os.getenv("BM25_SCORE_THRESHOLD", "0"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Two-stage retrieval: pick candidate documents first, then search their chunks
+ENABLE_TWO_STAGE = os.getenv("ENABLE_TWO_STAGE", "false").lower() == "true"
+TWO_STAGE_DOCS = int(os.getenv("TWO_STAGE_DOCS", "5"))
+DOC_COLLECTION_NAME = os.getenv("QDRANT_DOC_COLLECTION", f"{COLLECTION_NAME}_docs")
+DOC_INDEX_DIR = os.getenv("DOC_INDEX_DIR", os.path.join("data", "doc_index"))
+
+# Retrieval-stage cache, invalidated when the index version changes
+ENABLE_RETRIEVAL_CACHE = os.getenv("ENABLE_RETRIEVAL_CACHE", "true").lower() == "true"
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_TTL_SECONDS = int(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "3600"))
+INDEX_VERSION_PATH = os.getenv("INDEX_VERSION_PATH", os.path.join("data", "index_version.json"))
+
+# Snapshot export / import
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join("data", "snapshot"))
+
+# Bounded thread pool for CPU-bound work (embedding, reranking) on the async path
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Semantic answer cache (serves answers to paraphrased questions)
+ENABLE_SEMANTIC_CACHE = os.getenv("ENABLE_SEMANTIC_CACHE", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+
+# Persistent LLM completion cache (SQLite, keyed by a hash of the full prompt)
+ENABLE_COMPLETION_CACHE = os.getenv("ENABLE_COMPLETION_CACHE", "false").lower() == "true"
+COMPLETION_CACHE_PATH = os.getenv("COMPLETION_CACHE_PATH", os.path.join("data", "completion_cache.sqlite3"))
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "20000"))
+COMPLETION_CACHE_TTL_SECONDS = int(os.getenv("COMPLETION_CACHE_TTL_SECONDS", "0"))  # 0 = until evicted
+
+# Per-request deadline (0 = none; requests may set deadline_ms or X-Deadline-Ms) and the
+# remaining budget (ms) below which each stage is degraded, in this order
+REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "0"))
+DEADLINE_SKIP_RERANK_MS = float(os.getenv("DEADLINE_SKIP_RERANK_MS", "4000"))
+DEADLINE_SHRINK_CONTEXT_MS = float(os.getenv("DEADLINE_SHRINK_CONTEXT_MS", "3000"))
+DEADLINE_CONTEXT_FRACTION = float(os.getenv("DEADLINE_CONTEXT_FRACTION", "0.5"))
+DEADLINE_FAST_MODEL_MS = float(os.getenv("DEADLINE_FAST_MODEL_MS", "2000"))
+DEADLINE_FAST_PROVIDER = os.getenv("DEADLINE_FAST_PROVIDER", "").lower()  # empty = no model switch
+DEADLINE_SOURCES_ONLY_MS = float(os.getenv("DEADLINE_SOURCES_ONLY_MS", "800"))
+
+# Multi-turn sessions (session_id): last retrieval set and condensed history kept per session.
+# A follow-up whose best cosine to the cached chunks reaches REUSE is answered from them alone,
+# one reaching EXTEND adds a small retrieval to them; below that the context is rebuilt
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_REUSE_THRESHOLD = float(os.getenv("SESSION_REUSE_THRESHOLD", "0.55"))
+SESSION_EXTEND_THRESHOLD = float(os.getenv("SESSION_EXTEND_THRESHOLD", "0.35"))
+SESSION_MAX_CHUNKS = int(os.getenv("SESSION_MAX_CHUNKS", "20"))  # cached retrieval set per session
+SESSION_FOLLOWUP_CONTEXT_FRACTION = float(os.getenv("SESSION_FOLLOWUP_CONTEXT_FRACTION", "0.6"))
+SESSION_HISTORY_TURNS = int(os.getenv("SESSION_HISTORY_TURNS", "3"))
+SESSION_ANSWER_CHARS = int(os.getenv("SESSION_ANSWER_CHARS", "300"))  # per answer in the condensed history
+
+# Batch query API
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "200"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
 
 # LLM provider
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq").lower()
@@ -16,18 +98,98 @@ LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq").lower()
 # OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 
 # Ollama 
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+
+# OpenAI-compatible local server (api/llm_stub_server.py, vLLM, llama.cpp ...)
+LOCAL_LLM_URL = os.getenv("LOCAL_LLM_URL", "http://localhost:8001/v1")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "stub")
 
 # Groq
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile")
 
-# Prompt limits
-MAX_CONTEXT_CHARS = int(os.getenv("MAX_CONTEXT_CHARS", "12000"))
+# LLM HTTP clients: long-lived per provider, pooled, retried with jittered backoff
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))  # seconds, doubled per attempt
+LLM_RETRY_MAX_BACKOFF = float(os.getenv("LLM_RETRY_MAX_BACKOFF", "8"))
+
+# LLM admission control: per-provider token buckets in front of every call (0 = no limit)
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))
+LLM_RATE_HEADROOM = float(os.getenv("LLM_RATE_HEADROOM", "0.9"))  # stay this fraction under the limits
+LLM_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", "300"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))  # seconds a call may wait for admission
+
+# Hedged LLM requests: a slow call is duplicated on LLM_HEDGE_PROVIDER, the first answer wins
+ENABLE_LLM_HEDGING = os.getenv("ENABLE_LLM_HEDGING", "false").lower() == "true"
+LLM_HEDGE_PROVIDER = os.getenv("LLM_HEDGE_PROVIDER", "").lower()  # empty = LLM_PROVIDER
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))  # of recent primary latencies
+LLM_HEDGE_DELAY_MS = float(os.getenv("LLM_HEDGE_DELAY_MS", "2000"))  # until enough latencies are known
+LLM_HEDGE_BUDGET_PER_MIN = int(os.getenv("LLM_HEDGE_BUDGET_PER_MIN", "20"))
+
+# Circuit breakers around Qdrant and each LLM provider: a breaker opens on a high error or
+# slow-call rate over its last BREAKER_WINDOW calls and fails fast to the fallbacks below
+ENABLE_CIRCUIT_BREAKERS = os.getenv("ENABLE_CIRCUIT_BREAKERS", "false").lower() == "true"
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))  # calls seen before the rates are trusted
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.8"))
+BREAKER_QDRANT_SLOW_MS = float(os.getenv("BREAKER_QDRANT_SLOW_MS", "2000"))
+BREAKER_LLM_SLOW_MS = float(os.getenv("BREAKER_LLM_SLOW_MS", "20000"))  # time to first token on streams
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))  # before half-open probing
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "3"))  # successes needed to close
+FALLBACK_SNAPSHOT_DIR = os.getenv("FALLBACK_SNAPSHOT_DIR", SNAPSHOT_DIR)  # in-process search while Qdrant is open
+EXTRACTIVE_PASSAGES = int(os.getenv("EXTRACTIVE_PASSAGES", "3"))  # top passages answered while the LLM is open
+EXTRACTIVE_PASSAGE_CHARS = int(os.getenv("EXTRACTIVE_PASSAGE_CHARS", "400"))
+
+# Prompt limits: context is packed to a token budget (tiktoken encoding)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "cl100k_base")
+
+# Merge retrieved neighbours of the same document into one de-overlapped block
+MERGE_ADJACENT_CHUNKS = os.getenv("MERGE_ADJACENT_CHUNKS", "true").lower() == "true"
+
+# Extractive compression: keep only the context sentences closest to the question
+ENABLE_CONTEXT_COMPRESSION = os.getenv("ENABLE_CONTEXT_COMPRESSION", "false").lower() == "true"
+COMPRESSION_MIN_SIMILARITY = float(os.getenv("COMPRESSION_MIN_SIMILARITY", "0.25"))
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.2"))
 
 # Retrieval quality
 SCORE_THRESHOLD = float(os.getenv("SCORE_THRESHOLD", "0.25"))
-ENABLE_RERANKING = os.getenv("ENABLE_RERANKING", "false").lower() == "true"
\ No newline at end of file
+ENABLE_RERANKING = os.getenv("ENABLE_RERANKING", "false").lower() == "true"
+
+# Reranker service: score cache, input truncation, cross-request batching
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+RERANK_MAX_TOKENS = int(os.getenv("RERANK_MAX_TOKENS", "512"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "64"))
+RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS", "5"))
+RERANK_WORKERS = int(os.getenv("RERANK_WORKERS", "1"))
+
+# Cascade reranking: skip the cross-encoder when the dense order is decisive
+RERANK_CASCADE = os.getenv("RERANK_CASCADE", "false").lower() == "true"
+RERANK_SKIP_MIN_SCORE = float(os.getenv("RERANK_SKIP_MIN_SCORE", "0.5"))  # top score needed to trust dense order
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.05"))  # gap between rank k and k+1
+RERANK_BAND = float(os.getenv("RERANK_BAND", "0.03"))  # candidates within this of rank k are reranked
+
+# Adaptive fetch: small first page, cut at a relative score drop-off, widen on demand
+ADAPTIVE_FETCH = os.getenv("ADAPTIVE_FETCH", "false").lower() == "true"
+ADAPTIVE_FIRST_PAGE = int(os.getenv("ADAPTIVE_FIRST_PAGE", "8"))
+ADAPTIVE_DROP_RATIO = float(os.getenv("ADAPTIVE_DROP_RATIO", "0.75"))  # keep hits >= ratio * best score
+
+# Dimensionality reduction: "none", "pca" (fitted artifact) or "matryoshka" (truncation)
+VECTOR_REDUCTION = os.getenv("VECTOR_REDUCTION", "none").lower()
+REDUCED_DIM = int(os.getenv("REDUCED_DIM", "128"))
+PROJECTION_PATH = os.getenv("PROJECTION_PATH", os.path.join("data", "projection.npz"))
+
+# Partitioned layout: one Qdrant collection per value of PARTITION_FIELD ("" = single collection)
+PARTITION_FIELD = os.getenv("PARTITION_FIELD", "").strip()
+PARTITION_FANOUT_WORKERS = int(os.getenv("PARTITION_FANOUT_WORKERS", "8"))
+# How long the cached partition list is used before the index version is checked again
+PARTITION_REFRESH_SECONDS = float(os.getenv("PARTITION_REFRESH_SECONDS", "2"))
\ No newline at end of file
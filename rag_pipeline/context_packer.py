@@ -0,0 +1,283 @@
+"""
+Token-budgeted context packing with extractive compression.
+
+The retrieved chunks are packed into CONTEXT_TOKEN_BUDGET tokens, counted
+exactly with the PROMPT_TOKENIZER tiktoken encoding (cl100k_base by default,
+close to the Llama 3 / GPT-4 tokenizers). Each block gets a one-line header
+(`[chunk_id] doc_id | department | ...`) instead of a metadata dict.
+
+  - Default: chunks are added whole in retrieval order; the chunk that does
+    not fit is cut at a sentence boundary, so no budget is left unused.
+  - ENABLE_CONTEXT_COMPRESSION=true: every sentence of every chunk is embedded
+    in one batched call and scored against the question. Sentences are added
+    by similarity (above COMPRESSION_MIN_SIMILARITY) until the budget is full,
+    then rendered per chunk in their original order, keeping the citations.
+
+Before packing, hits that are consecutive chunks of the same document
+(`..._chunk_0003`, `..._chunk_0004`) are merged into one block: the
+CHUNK_OVERLAP_CHARS the chunker repeats between neighbours is sent once, under
+one header listing every source chunk_id, so citations to either stay valid.
+
+Token counts (packed context, context before packing, whole prompt) and the
+bytes saved by merging are returned with the context and reported in the
+query response.
+
+Usage:
+    from rag_pipeline.context_packer import pack_context, count_tokens
+    context, counts = pack_context(question, retrieved)
+
+Enable via: CONTEXT_TOKEN_BUDGET=1500 and ENABLE_CONTEXT_COMPRESSION=true in .env
+            (MERGE_ADJACENT_CHUNKS=true by default)
+"""
+import re
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from ingestion.chunker import CHUNK_OVERLAP_CHARS
+from rag_pipeline.configs.settings import (
+    CONTEXT_TOKEN_BUDGET, PROMPT_TOKENIZER, ENABLE_CONTEXT_COMPRESSION, COMPRESSION_MIN_SIMILARITY,
+    MERGE_ADJACENT_CHUNKS,
+)
+
+SEPARATOR = "\n---\n"
+META_FIELDS = ("doc_id", "department", "category", "document_type", "region")
+MAX_SENTENCE_CHARS = 600  # run-on legal text is cut at whitespace
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?;])\s+(?=[A-Z0-9(\"'])|\n\s*\n")
+_CHUNK_INDEX_RE = re.compile(r"_chunk_(\d+)$")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(PROMPT_TOKENIZER)
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    return len(_get_encoding().encode_ordinary(text))
+
+
+def _count_batch(texts: List[str]) -> List[int]:
+    return [len(t) for t in _get_encoding().encode_ordinary_batch(texts)] if texts else []
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences: List[str] = []
+    for part in _SENTENCE_RE.split(text or ""):
+        part = " ".join(part.split())
+        while len(part) > MAX_SENTENCE_CHARS:
+            cut = part.rfind(" ", 0, MAX_SENTENCE_CHARS)
+            cut = cut if cut > 0 else MAX_SENTENCE_CHARS
+            sentences.append(part[:cut])
+            part = part[cut:].strip()
+        if part:
+            sentences.append(part)
+    return sentences
+
+
+def leading_sentences(text: str, limit: int) -> str:
+    """Leading whole sentences of `text` up to `limit` characters."""
+    out = ""
+    for sentence in split_sentences(text):
+        if out and len(out) + 1 + len(sentence) > limit:
+            break
+        out = f"{out} {sentence}".strip()
+    if len(out) > limit:
+        out = out[:limit].rsplit(" ", 1)[0] + " ..."
+    return out
+
+
+def chunk_header(payload: Dict[str, Any], chunk_ids: Optional[List[str]] = None) -> str:
+    ids = chunk_ids or [payload.get("chunk_id", "unknown_chunk")]
+    meta = " | ".join(str(payload[k]) for k in META_FIELDS if payload.get(k))
+    return f"{' '.join(f'[{c}]' for c in ids)} {meta}".rstrip()
+
+
+# ── Adjacent chunk merging ────────────────────────────────────────────────────
+def _chunk_index(payload: Dict[str, Any]) -> Optional[int]:
+    idx = payload.get("chunk_index")
+    if idx not in (None, ""):
+        return int(idx)
+    match = _CHUNK_INDEX_RE.search(str(payload.get("chunk_id") or ""))
+    return int(match.group(1)) if match else None
+
+
+def _overlap(a: str, b: str, max_overlap: int = CHUNK_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of `a` that is also a prefix of `b`."""
+    tail = a[-(max_overlap + 64):]  # chunk edges are strip()ped, allow some slack
+    probe = b[:32]
+    pos = tail.find(probe) if probe else -1
+    while pos != -1:
+        if b.startswith(tail[pos:]):
+            return len(tail) - pos
+        pos = tail.find(probe, pos + 1)
+    return 0
+
+
+def _block_bytes(header: str, text: str) -> int:
+    return len(header.encode("utf-8")) + len(text.encode("utf-8")) + len(SEPARATOR) + 2
+
+
+def merge_adjacent(retrieved: List[Dict[str, Any]]) -> Tuple[List[Tuple[str, str]], Dict[str, int]]:
+    """(header, text) blocks in retrieval order, with runs of consecutive
+    chunks of one document merged at the position of their best-ranked hit."""
+    entries = []  # (rank, doc_id, chunk_index, payload)
+    for rank, r in enumerate(retrieved):
+        payload = r.get("payload", {}) or {}
+        if (payload.get("text") or "").strip():
+            entries.append((rank, payload.get("doc_id"), _chunk_index(payload), payload))
+
+    runs: List[List[Tuple]] = []
+    by_doc = sorted(
+        (e for e in entries if e[1] and e[2] is not None),
+        key=lambda e: (str(e[1]), e[2]),
+    )
+    for e in by_doc:
+        last = runs[-1][-1] if runs else None
+        if last is not None and last[1] == e[1] and e[2] == last[2] + 1:
+            runs[-1].append(e)
+        elif last is not None and last[1] == e[1] and e[2] == last[2]:
+            continue  # same chunk retrieved twice
+        else:
+            runs.append([e])
+    runs += [[e] for e in entries if not (e[1] and e[2] is not None)]
+    runs.sort(key=lambda run: min(e[0] for e in run))
+
+    blocks: List[Tuple[str, str]] = []
+    raw_bytes = 0
+    for run in runs:
+        text = run[0][3]["text"].strip()
+        raw_bytes += _block_bytes(chunk_header(run[0][3]), text)
+        for e in run[1:]:
+            nxt = e[3]["text"].strip()
+            raw_bytes += _block_bytes(chunk_header(e[3]), nxt)
+            k = _overlap(text, nxt)
+            text = text + nxt[k:] if k else f"{text}\n{nxt}"
+        payload = run[0][3]
+        blocks.append((chunk_header(payload, [e[3].get("chunk_id", "unknown_chunk") for e in run]), text))
+
+    merged_bytes = sum(_block_bytes(h, t) for h, t in blocks)
+    return blocks, {"merged": len(entries) - len(blocks), "bytes_saved": max(0, raw_bytes - merged_bytes)}
+
+
+class _Chunks:
+    """Sentences and token costs of the retrieved chunks, in retrieval order."""
+
+    def __init__(self, blocks: List[Tuple[str, str]]):
+        self.headers: List[str] = []
+        self.sentences: List[List[str]] = []
+        for header, text in blocks:
+            sentences = split_sentences(text)
+            if sentences:
+                self.headers.append(header)
+                self.sentences.append(sentences)
+        flat = [s for ss in self.sentences for s in ss]
+        costs = iter(_count_batch(flat))
+        self.sentence_tokens = [[next(costs) + 1 for _ in ss] for ss in self.sentences]
+        self.header_tokens = [t + 2 for t in _count_batch(self.headers)]  # header + separator
+
+    def render(self, selected: List[Tuple[int, int]]) -> str:
+        kept: Dict[int, List[int]] = {}
+        for i, j in selected:
+            kept.setdefault(i, []).append(j)
+        blocks = []
+        for i in sorted(kept):
+            text = " ".join(self.sentences[i][j] for j in sorted(kept[i]))
+            blocks.append(f"{self.headers[i]}\n{text}\n")
+        return SEPARATOR.join(blocks)
+
+    def raw(self) -> str:
+        return self.render([(i, j) for i, ss in enumerate(self.sentences) for j in range(len(ss))])
+
+
+def _select_in_order(chunks: _Chunks, budget: int) -> List[Tuple[int, int]]:
+    selected: List[Tuple[int, int]] = []
+    used = 0
+    for i, costs in enumerate(chunks.sentence_tokens):
+        for j, cost in enumerate(costs):
+            cost += chunks.header_tokens[i] if j == 0 else 0
+            if used + cost > budget:
+                return selected
+            selected.append((i, j))
+            used += cost
+    return selected
+
+
+def _select_by_similarity(
+    question: str, chunks: _Chunks, budget: int, min_similarity: float,
+) -> List[Tuple[int, int]]:
+    from vectorstore.embedding_generator import embed_texts
+
+    index = [(i, j) for i, ss in enumerate(chunks.sentences) for j in range(len(ss))]
+    vectors = np.asarray(
+        embed_texts([question] + [chunks.sentences[i][j] for i, j in index], normalize=True),
+        dtype=np.float32,
+    )
+    sims = vectors[1:] @ vectors[0]
+
+    selected: List[Tuple[int, int]] = []
+    opened: set = set()
+    used = 0
+    for k in np.argsort(-sims):
+        if sims[k] < min_similarity and selected:
+            break
+        i, j = index[k]
+        cost = chunks.sentence_tokens[i][j] + (0 if i in opened else chunks.header_tokens[i])
+        if used + cost > budget:
+            continue  # a shorter, less similar sentence may still fit
+        selected.append((i, j))
+        opened.add(i)
+        used += cost
+    return selected
+
+
+def pack_context(
+    question: str,
+    retrieved: List[Dict[str, Any]],
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    compress: Optional[bool] = None,
+    min_similarity: float = COMPRESSION_MIN_SIMILARITY,
+) -> Tuple[str, Dict[str, int]]:
+    """(context, token counts) with the context at most `budget` tokens."""
+    compress = ENABLE_CONTEXT_COMPRESSION if compress is None else compress
+    if MERGE_ADJACENT_CHUNKS:
+        blocks, merge_stats = merge_adjacent(retrieved)
+    else:
+        blocks = [
+            (chunk_header(r.get("payload") or {}), (r.get("payload") or {}).get("text") or "")
+            for r in retrieved
+        ]
+        merge_stats = {"merged": 0, "bytes_saved": 0}
+    chunks = _Chunks(blocks)
+    n_sentences = sum(len(ss) for ss in chunks.sentences)
+
+    if compress and n_sentences:
+        selected = _select_by_similarity(question, chunks, budget, min_similarity)
+    else:
+        selected = _select_in_order(chunks, budget)
+
+    # Per-piece costs are estimates at the joins; the final count is exact
+    context = chunks.render(selected)
+    tokens = count_tokens(context)
+    while tokens > budget and selected:
+        selected.pop()
+        context = chunks.render(selected)
+        tokens = count_tokens(context)
+
+    return context, {
+        "context": tokens,
+        "context_raw": count_tokens(chunks.raw()),
+        "chunks": len({i for i, _ in selected}),
+        "sentences": len(selected),
+        "sentences_total": n_sentences,
+        **merge_stats,
+    }
@@ -0,0 +1,112 @@
+"""
+Per-request deadlines with graceful stage degradation.
+
+A request may carry a latency budget (`deadline_ms` in the body, the
+X-Deadline-Ms header, or REQUEST_DEADLINE_MS by default). The budget is
+turned into an absolute deadline when the request arrives, and the
+remaining time is checked between pipeline stages. When it runs low, the
+stages are degraded in a fixed order, each below its own threshold of
+remaining milliseconds:
+
+  1. skip_rerank     (DEADLINE_SKIP_RERANK_MS)     use the retrieval order
+  2. shrink_context  (DEADLINE_SHRINK_CONTEXT_MS)  pack DEADLINE_CONTEXT_FRACTION
+                                                    of CONTEXT_TOKEN_BUDGET
+  3. fast_model      (DEADLINE_FAST_MODEL_MS)      generate on DEADLINE_FAST_PROVIDER
+  4. sources_only    (DEADLINE_SOURCES_ONLY_MS)    no LLM call, return the sources
+
+The deadline also bounds the LLM: it is the rate-limit admission deadline,
+and on the async path the call itself is cancelled when the deadline
+passes. Either way the request ends as sources_only instead of timing out.
+The degradations applied are returned in the response (`degraded`).
+
+Usage:
+    from rag_pipeline.deadline import Deadline
+    out = await rag_query_async(question, deadline=Deadline.from_ms(2500))
+    out["degraded"]  # e.g. ["skip_rerank", "shrink_context"]
+
+Enable via: REQUEST_DEADLINE_MS=5000 in .env, or deadline_ms per request
+"""
+import time
+import logging
+from typing import Optional, List
+
+from rag_pipeline.configs.settings import (
+    CONTEXT_TOKEN_BUDGET,
+    DEADLINE_SKIP_RERANK_MS, DEADLINE_SHRINK_CONTEXT_MS, DEADLINE_CONTEXT_FRACTION,
+    DEADLINE_FAST_MODEL_MS, DEADLINE_FAST_PROVIDER, DEADLINE_SOURCES_ONLY_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+SOURCES_ONLY_ANSWER = (
+    "No answer could be generated within the request deadline. "
+    "The most relevant sources are listed below."
+)
+
+
+class Deadline:
+    def __init__(self, budget_ms: float):
+        self.budget_ms = budget_ms
+        self.at = time.monotonic() + budget_ms / 1000.0  # time.monotonic() scale
+
+    @classmethod
+    def from_ms(cls, budget_ms: Optional[float]) -> Optional["Deadline"]:
+        return cls(budget_ms) if budget_ms and budget_ms > 0 else None
+
+    def remaining_ms(self) -> float:
+        return max(0.0, (self.at - time.monotonic()) * 1000.0)
+
+    def remaining_s(self) -> float:
+        return self.remaining_ms() / 1000.0
+
+
+class Degradation:
+    """Stage decisions for one request; `applied` lists what was degraded."""
+
+    def __init__(self, deadline: Optional[Deadline] = None):
+        self.deadline = deadline
+        self.applied: List[str] = []
+
+    @property
+    def at(self) -> Optional[float]:
+        return self.deadline.at if self.deadline else None
+
+    def _below(self, threshold_ms: float, step: str) -> bool:
+        if self.deadline is None:
+            return False
+        remaining = self.deadline.remaining_ms()
+        if remaining >= threshold_ms:
+            return False
+        if step not in self.applied:
+            self.applied.append(step)
+            logger.info("Deadline: %s (%.0f ms left of %.0f)", step, remaining, self.deadline.budget_ms)
+        return True
+
+    def skip_rerank(self) -> bool:
+        return self._below(DEADLINE_SKIP_RERANK_MS, "skip_rerank")
+
+    def context_budget(self) -> Optional[int]:
+        """Reduced context token budget, or None for the configured one."""
+        if self._below(DEADLINE_SHRINK_CONTEXT_MS, "shrink_context"):
+            return max(1, int(CONTEXT_TOKEN_BUDGET * DEADLINE_CONTEXT_FRACTION))
+        return None
+
+    def llm_provider(self) -> Optional[str]:
+        """DEADLINE_FAST_PROVIDER when time is short, else None (the default)."""
+        if DEADLINE_FAST_PROVIDER and self._below(DEADLINE_FAST_MODEL_MS, "fast_model"):
+            return DEADLINE_FAST_PROVIDER
+        return None
+
+    def sources_only(self) -> bool:
+        return self._below(DEADLINE_SOURCES_ONLY_MS, "sources_only")
+
+    def note(self, step: str) -> None:
+        """Record a degradation that is not deadline-driven (circuit breaker fallbacks)."""
+        if step not in self.applied:
+            self.applied.append(step)
+
+    def timed_out(self) -> None:
+        """The LLM did not answer (or was not admitted) before the deadline."""
+        if "sources_only" not in self.applied:
+            self.applied.append("sources_only")
+        logger.warning("Deadline: LLM did not finish in %.0f ms, returning sources only", self.deadline.budget_ms)
@@ -3,21 +3,29 @@ Week 5 Enhanced RAG Evaluation
 ================================
 Improvements over Week 4:
   - Proper latency tracking (latency_ms now in rag_query() response)
-  - Token counting per query (tiktoken, cl100k_base encoding)
+  - Token counting per query (tiktoken, cl100k_base encoding): question,
+    packed prompt and context before/after packing
   - Category-level breakdown of citation rates
   - Score threshold trigger detection (latency_ms near 0 → threshold hit)
   - Structured markdown report with baselines comparison
+  - Cascade reranking: skip rate, pairs saved and agreement with full rerank
+  - Opt-in persistent completion cache (--completion-cache): re-running after
+    a change that leaves the prompts untouched makes no LLM calls. Cached and
+    uncached latencies are reported separately so hits do not hide LLM time
 """
 import json
+import argparse
 import time
 from collections import defaultdict
 from pathlib import Path
 
-import tiktoken
-
 from rag_pipeline.rag_orchestrator import rag_query
-
-ENCODING = tiktoken.get_encoding("cl100k_base")
+from rag_pipeline.context_packer import count_tokens
+from rag_pipeline.completion_cache import get_completion_cache, set_completion_cache_enabled
+from rag_pipeline.configs.settings import (
+    ENABLE_RERANKING, RETRIEVAL_MODE, RERANK_SKIP_MIN_SCORE, RERANK_SKIP_MARGIN, RERANK_BAND,
+    CONTEXT_TOKEN_BUDGET, ENABLE_CONTEXT_COMPRESSION,
+)
 
 QPATH = Path("rag_pipeline/evaluation/queries_week5.jsonl")
 OUTPATH = Path("rag_pipeline/evaluation/report_week5.md")
@@ -27,10 +35,6 @@ def has_citation(answer: str) -> bool:
     return "[" in answer and "]" in answer
 
 
-def count_tokens(text: str) -> int:
-    return len(ENCODING.encode(text))
-
-
 def avg(xs):
     return sum(xs) / len(xs) if xs else 0.0
 
@@ -43,7 +47,110 @@ def p95(xs):
     return xs_sorted[idx]
 
 
+def _chunk_ids(results):
+    return [(r.get("payload") or {}).get("chunk_id") or r.get("id") for r in results]
+
+
+def cascade_eval(queries):
+    """Compare cascade reranking against a full rerank of the same candidates.
+
+    Both runs start with an empty score cache so latencies are comparable.
+    Quality cost is measured against the full rerank as reference:
+    overlap@k of the returned chunk ids and top-1 agreement.
+    """
+    from vectorstore.retriever import retrieve
+    from vectorstore.reranker import rerank, cascade_rerank, cascade_plan, clear_rerank_cache
+
+    rows = []
+    for q in queries:
+        question = q["question"]
+        top_k = int(q.get("top_k", 5))
+        try:
+            cands = retrieve(question, top_k=top_k * 3, filters=q.get("filters"), with_payload=True)
+            if not cands:
+                continue
+            decision, _, todo = cascade_plan(cands, top_k)
+
+            clear_rerank_cache()
+            t0 = time.perf_counter()
+            full = rerank(question, [dict(c) for c in cands], top_k)
+            full_ms = (time.perf_counter() - t0) * 1000.0
+
+            clear_rerank_cache()
+            t0 = time.perf_counter()
+            casc = cascade_rerank(question, [dict(c) for c in cands], top_k)
+            cascade_ms = (time.perf_counter() - t0) * 1000.0
+        except Exception as e:
+            rows.append({"question": question, "error": str(e)})
+            continue
+
+        full_ids, casc_ids = _chunk_ids(full), _chunk_ids(casc)
+        rows.append({
+            "question": question,
+            "decision": decision,
+            "candidates": len(cands),
+            "pairs": len(todo),
+            "full_ms": full_ms,
+            "cascade_ms": cascade_ms,
+            "overlap": len(set(full_ids) & set(casc_ids)) / max(len(full_ids), 1),
+            "top1_agree": bool(full_ids) and bool(casc_ids) and full_ids[0] == casc_ids[0],
+        })
+    return rows
+
+
+def cascade_section(rows):
+    md = ["\n## Cascade Reranking\n"]
+    md.append(
+        f"- Policy: skip if top score >= {RERANK_SKIP_MIN_SCORE} and rank k leads rank k+1 by "
+        f">= {RERANK_SKIP_MARGIN}; otherwise rerank the band within {RERANK_BAND} of rank k\n"
+    )
+    ok = [r for r in rows if "error" not in r]
+    if not ok:
+        md.append("- No successful comparisons\n")
+        return md
+
+    n = len(ok)
+    counts = {d: sum(1 for r in ok if r["decision"] == d) for d in ("skip", "band", "full")}
+    pairs_full = sum(r["candidates"] for r in ok)
+    pairs_cascade = sum(r["pairs"] for r in ok)
+    md.append(
+        f"- Decisions: skip **{counts['skip']}** / band **{counts['band']}** / full **{counts['full']}** "
+        f"(skip rate **{counts['skip'] / n:.2f}**)\n"
+    )
+    md.append(
+        f"- Cross-encoder pairs: **{pairs_cascade}** vs **{pairs_full}** full "
+        f"({1 - pairs_cascade / max(pairs_full, 1):.0%} saved)\n"
+    )
+    md.append(
+        f"- Rerank latency: avg **{avg([r['cascade_ms'] for r in ok]):.1f} ms** cascade vs "
+        f"**{avg([r['full_ms'] for r in ok]):.1f} ms** full\n"
+    )
+    md.append(
+        f"- Quality vs full rerank: overlap@k **{avg([r['overlap'] for r in ok]):.2f}**, "
+        f"top-1 agreement **{sum(r['top1_agree'] for r in ok) / n:.2f}**\n\n"
+    )
+
+    md.append("| Question | Decision | Pairs | Full (ms) | Cascade (ms) | Overlap@k | Top-1 |\n")
+    md.append("|---|:---:|---:|---:|---:|---:|:---:|\n")
+    for r in rows:
+        if "error" in r:
+            md.append(f"| {r['question'][:50]} | ERROR: {r['error'][:60]} | | | | | |\n")
+            continue
+        md.append(
+            f"| {r['question'][:50]} | {r['decision']} | {r['pairs']}/{r['candidates']} "
+            f"| {r['full_ms']:.0f} | {r['cascade_ms']:.0f} | {r['overlap']:.2f} "
+            f"| {'✅' if r['top1_agree'] else '❌'} |\n"
+        )
+    return md
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Week 5 RAG evaluation")
+    parser.add_argument("--completion-cache", action="store_true",
+                        help="reuse cached completions (hit latencies are reported apart)")
+    args = parser.parse_args()
+    set_completion_cache_enabled(args.completion_cache)
+
     if not QPATH.exists():
         raise FileNotFoundError(f"Missing {QPATH}")
 
@@ -55,6 +162,7 @@ def main():
 
     rows = []
     total_latencies = []
+    cached_latencies = []
     citation_hits = 0
     threshold_hits = 0
     total_tokens = 0
@@ -71,15 +179,19 @@ def main():
         total_tokens += q_tokens
 
         try:
+            hits_before = get_completion_cache().stats()["hits"] if args.completion_cache else 0
             t0 = time.perf_counter()
             res = rag_query(question, top_k=top_k, filters=filters)
             wall_ms = (time.perf_counter() - t0) * 1000.0
+            completion_cached = args.completion_cache and get_completion_cache().stats()["hits"] > hits_before
 
             # latency_ms is now properly set in rag_orchestrator
             pipeline_ms = float(res.get("latency_ms", 0.0))
             answer = res.get("answer", "") or ""
             sources = res.get("sources", []) or []
 
+            token_counts = res.get("token_counts") or {}
+
             answer_preview = " ".join(answer.split())[:400]
             top_sources = [
                 {
@@ -109,15 +221,21 @@ def main():
                 "citations": cit,
                 "n_sources": len(sources),
                 "threshold_triggered": threshold_triggered,
+                "completion_cached": completion_cached,
                 "q_tokens": q_tokens,
+                "token_counts": token_counts,
                 "answer_preview": answer_preview,
                 "top_sources": top_sources,
             }
             rows.append(row)
 
-            total_latencies.append(pipeline_ms)
+            # Cached answers skip the LLM: keep them out of the pipeline latency
+            if completion_cached:
+                cached_latencies.append(pipeline_ms)
+            else:
+                total_latencies.append(pipeline_ms)
+                cat_results[category]["latencies"].append(pipeline_ms)
             cat_results[category]["total"] += 1
-            cat_results[category]["latencies"].append(pipeline_ms)
             if cit:
                 cat_results[category]["citations"] += 1
 
@@ -142,9 +260,38 @@ def main():
     md.append(f"- Score threshold triggers: **{threshold_hits}** (queries answered without LLM)\n")
     md.append(f"- Total question tokens: **{total_tokens}** (~{total_tokens / n:.1f} avg/query)\n\n")
 
+    packed = [r["token_counts"] for r in rows if r.get("token_counts")]
+    md.append("## Prompt Tokens\n")
+    md.append(f"- Budget: **{CONTEXT_TOKEN_BUDGET}** context tokens | "
+              f"extractive compression: **{'on' if ENABLE_CONTEXT_COMPRESSION else 'off'}**\n")
+    if packed:
+        raw_ctx = avg([t["context_raw"] for t in packed])
+        ctx = avg([t["context"] for t in packed])
+        md.append(f"- Avg prompt tokens (system + user): **{avg([t['prompt'] for t in packed]):.0f}** "
+                  f"(P95 {p95([t['prompt'] for t in packed]):.0f})\n")
+        md.append(f"- Avg context tokens: **{ctx:.0f}** packed vs {raw_ctx:.0f} retrieved "
+                  f"(**{(1 - ctx / raw_ctx) * 100 if raw_ctx else 0.0:.1f}%** fewer)\n")
+        md.append(f"- Avg sentences kept: {avg([t['sentences'] for t in packed]):.1f} "
+                  f"of {avg([t['sentences_total'] for t in packed]):.1f}\n")
+        md.append(f"- Adjacent chunks merged: avg **{avg([t['merged'] for t in packed]):.2f}**/query, "
+                  f"**{avg([t['bytes_saved'] for t in packed]):.0f}** bytes of overlap saved per prompt\n\n")
+    else:
+        md.append("- No LLM calls (all queries below the score threshold)\n\n")
+
+    if args.completion_cache:
+        cc = get_completion_cache().stats()
+        md.append(f"- Completion cache: **{cc['hits']}** hits / {cc['misses']} misses "
+                  f"(cached queries are excluded from the latencies below)\n\n")
+    else:
+        md.append("- Completion cache: **off**\n\n")
+
     md.append("## Latency (pipeline)\n")
     md.append(f"- Avg: **{avg(total_latencies):.2f} ms**\n")
-    md.append(f"- P95: **{p95(total_latencies):.2f} ms**\n\n")
+    md.append(f"- P95: **{p95(total_latencies):.2f} ms**\n")
+    if cached_latencies:
+        md.append(f"- Completion cache hits ({len(cached_latencies)}): avg {avg(cached_latencies):.2f} ms, "
+                  f"P95 {p95(cached_latencies):.2f} ms\n")
+    md.append("\n")
 
     md.append("## Baseline Comparison\n")
     md.append("| Week | Queries | Citation Rate | Avg Latency |\n")
@@ -163,19 +310,20 @@ def main():
     md.append("\n")
 
     md.append("## Detailed Results\n")
-    md.append("| Question | Category | Filters | Top-K | Pipeline (ms) | Citations? | #Sources | Threshold? |\n")
-    md.append("|---|---|---|---:|---:|:---:|---:|:---:|\n")
+    md.append("| Question | Category | Filters | Top-K | Pipeline (ms) | Prompt tokens | Citations? | #Sources | Threshold? |\n")
+    md.append("|---|---|---|---:|---:|---:|:---:|---:|:---:|\n")
 
     for r in rows:
         if "error" in r:
             md.append(
                 f"| {r['question'][:50]} | {r['category']} | {r['filters']} | {r['top_k']} "
-                f"| - | | - | - | ERROR: {r['error'][:60]} |\n"
+                f"| - | - | | - | - | ERROR: {r['error'][:60]} |\n"
             )
         else:
             md.append(
                 f"| {r['question'][:50]} | {r['category']} | {r['filters']} | {r['top_k']} "
-                f"| {r['pipeline_ms']:.0f} | {'✅' if r['citations'] else '❌'} "
+                f"| {r['pipeline_ms']:.0f} | {r['token_counts'].get('prompt', '-')} "
+                f"| {'✅' if r['citations'] else '❌'} "
                 f"| {r['n_sources']} | {'⚡' if r['threshold_triggered'] else ''} |\n"
             )
 
@@ -184,12 +332,19 @@ def main():
         if "error" in r:
             continue
         md.append(f"\n### [{r['category']}] {r['question']}\n")
-        md.append(f"- Filters: `{r['filters']}` | Top-K: `{r['top_k']}` | Tokens: `{r.get('q_tokens', '?')}`\n")
+        md.append(f"- Filters: `{r['filters']}` | Top-K: `{r['top_k']}` | Tokens: `{r.get('q_tokens', '?')}` "
+                  f"| Prompt tokens: `{r['token_counts'].get('prompt', '-')}`\n")
         if r.get("threshold_triggered"):
             md.append("- **Score threshold triggered** — answered without LLM call\n")
         md.append(f"- Answer: {r.get('answer_preview', '')}\n")
         md.append(f"- Top sources: `{r.get('top_sources', [])}`\n")
 
+    # Cascade thresholds are on the dense cosine scale (see rag_orchestrator)
+    if ENABLE_RERANKING and RETRIEVAL_MODE == "dense":
+        md.extend(cascade_section(cascade_eval(queries)))
+    else:
+        md.append("\n## Cascade Reranking\n- Skipped (needs ENABLE_RERANKING=true and RETRIEVAL_MODE=dense)\n")
+
     OUTPATH.write_text("".join(md), encoding="utf-8")
     print(f"Wrote {OUTPATH}")
     print(f"Citation rate: {citation_rate:.2f} | Avg latency: {avg(total_latencies):.0f} ms | Threshold hits: {threshold_hits}/{n}")
@@ -0,0 +1,235 @@
+"""
+Hedged LLM requests for tail-latency control.
+
+LLM latency dominates the p95/p99 of a query. With hedging, a call to the
+primary provider (LLM_PROVIDER) that has not answered within the
+LLM_HEDGE_PERCENTILE of its recent latencies is sent a second time to
+LLM_HEDGE_PROVIDER (another provider, or another model registered under its
+own name). Whichever answers first is used and the other call is cancelled.
+
+  - `agenerate`: the threshold applies to the whole completion.
+  - `astream`: the threshold applies to the first token; once a stream has
+    produced a token, the other one is closed.
+  - Until MIN_SAMPLES latencies have been seen, LLM_HEDGE_DELAY_MS is used.
+  - Hedges are limited to LLM_HEDGE_BUDGET_PER_MIN per minute (token bucket),
+    and a hedge is only sent if the secondary's rate-limit scheduler admits it
+    at once, so hedging never queues behind its own traffic.
+  - Hedge rate, secondary wins and the latency percentiles seen by callers are
+    reported by `hedge_stats()` (GET /metrics).
+  - The provider that answered is returned with the result, so callers can
+    attribute (and cache) the answer to the model that produced it.
+
+Only the async API paths are hedged; scripts calling the sync `generate`
+keep a single request.
+
+Usage:
+    from rag_pipeline.llm_hedging import get_hedger
+    provider, answer = await get_hedger().run(lambda provider, is_hedge: call(provider), kind="generate")
+
+Enable via: ENABLE_LLM_HEDGING=true LLM_HEDGE_PROVIDER=openai in .env
+"""
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, List, Callable, Awaitable, AsyncIterator, Tuple, TypeVar
+
+from rag_pipeline.llm_scheduler import TokenBucket
+from rag_pipeline.configs.settings import (
+    ENABLE_LLM_HEDGING, LLM_PROVIDER, LLM_HEDGE_PROVIDER, LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_DELAY_MS, LLM_HEDGE_BUDGET_PER_MIN,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+MIN_SAMPLES = 20     # primary latencies needed before the percentile is trusted
+LATENCY_WINDOW = 500  # recent latencies kept per call kind
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class _Kind:
+    """Latency windows and counters for one call kind (generate / stream)."""
+
+    def __init__(self):
+        self.primary: deque = deque(maxlen=LATENCY_WINDOW)   # primary alone, when it finished first
+        self.observed: deque = deque(maxlen=LATENCY_WINDOW)  # what the caller waited
+        self.calls = 0
+        self.hedged = 0
+        self.secondary_wins = 0
+        self.budget_denied = 0
+
+
+class Hedger:
+    def __init__(
+        self,
+        primary: str = LLM_PROVIDER,
+        secondary: str = LLM_HEDGE_PROVIDER,
+        percentile: float = LLM_HEDGE_PERCENTILE,
+        budget_per_min: int = LLM_HEDGE_BUDGET_PER_MIN,
+    ):
+        self.primary = primary
+        self.secondary = secondary or primary
+        self.percentile = percentile
+        self.budget = TokenBucket(budget_per_min) if budget_per_min > 0 else None
+        self._kinds: Dict[str, _Kind] = {"generate": _Kind(), "stream": _Kind()}
+        self._lock = threading.Lock()
+
+    def threshold_s(self, kind: str) -> float:
+        with self._lock:
+            samples = list(self._kinds[kind].primary)
+        if len(samples) < MIN_SAMPLES:
+            return LLM_HEDGE_DELAY_MS / 1000.0
+        return _pct(samples, self.percentile)
+
+    def _take_budget(self, kind: str) -> bool:
+        with self._lock:
+            if self.budget is None or self.budget.wait_time(1, time.monotonic()) > 0:
+                self._kinds[kind].budget_denied += 1
+                return False
+            self.budget.take(1)
+            self._kinds[kind].hedged += 1
+            return True
+
+    def _record(self, kind: str, elapsed: float, winner: str, hedged: bool) -> None:
+        with self._lock:
+            k = self._kinds[kind]
+            k.calls += 1
+            k.observed.append(elapsed * 1000.0)
+            if winner == "primary":
+                k.primary.append(elapsed)
+            elif hedged:
+                k.secondary_wins += 1
+
+    @staticmethod
+    async def _cancel(tasks) -> None:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _first_success(tasks: Dict[asyncio.Future, str]):
+        """(task, label) of the first task to succeed; raises if all fail."""
+        pending = set(tasks)
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                exc = task.exception()
+                if exc is None or isinstance(exc, StopAsyncIteration):
+                    await Hedger._cancel(pending)
+                    return task, tasks[task]
+                logger.warning("Hedged LLM %s call failed: %s", tasks[task], exc)
+                first_error = first_error or exc
+        raise first_error
+
+    def _provider(self, label: str) -> str:
+        return self.primary if label == "primary" else self.secondary
+
+    async def run(self, call: Callable[[str, bool], Awaitable[T]], kind: str = "generate") -> Tuple[str, T]:
+        """`call(provider_name, is_hedge)` on the primary, hedged on the secondary
+        if slow; returns (name of the provider that answered, result)."""
+        t0 = time.monotonic()
+        primary = asyncio.ensure_future(call(self.primary, False))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.threshold_s(kind))
+            if done or not self._take_budget(kind):
+                result = await primary
+                self._record(kind, time.monotonic() - t0, "primary", hedged=False)
+                return self.primary, result
+            logger.info("Hedging slow LLM call on %s after %.0f ms", self.secondary, (time.monotonic() - t0) * 1000)
+            secondary = asyncio.ensure_future(call(self.secondary, True))
+            winner, label = await self._first_success({primary: "primary", secondary: "secondary"})
+            self._record(kind, time.monotonic() - t0, label, hedged=True)
+            return self._provider(label), winner.result()
+        except BaseException:
+            await self._cancel([primary])
+            raise
+
+    async def stream(
+        self, open_stream: Callable[[str, bool], AsyncIterator[str]], kind: str = "stream",
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """(provider name, token) from whichever stream produces its first token first."""
+        t0 = time.monotonic()
+        streams = {"primary": open_stream(self.primary, False)}
+        tasks: Dict[asyncio.Future, str] = {asyncio.ensure_future(streams["primary"].__anext__()): "primary"}
+        try:
+            done, _ = await asyncio.wait(set(tasks), timeout=self.threshold_s(kind))
+            hedged = not done and self._take_budget(kind)
+            if hedged:
+                logger.info("Hedging slow LLM stream on %s after %.0f ms",
+                            self.secondary, (time.monotonic() - t0) * 1000)
+                streams["secondary"] = open_stream(self.secondary, True)
+                tasks[asyncio.ensure_future(streams["secondary"].__anext__())] = "secondary"
+            winner, label = await self._first_success(tasks)
+        except BaseException:
+            await self._cancel(tasks)
+            for s in streams.values():
+                await s.aclose()
+            raise
+        for other, s in streams.items():
+            if other != label:
+                await s.aclose()
+
+        self._record(kind, time.monotonic() - t0, label, hedged=hedged)
+        if isinstance(winner.exception(), StopAsyncIteration):
+            return
+        provider = self._provider(label)
+        try:
+            yield provider, winner.result()
+            async for token in streams[label]:
+                yield provider, token
+        finally:
+            await streams[label].aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"primary": self.primary, "secondary": self.secondary}
+            if self.budget is not None:
+                self.budget._refill(time.monotonic())
+                out["budget_per_min"] = round(self.budget.capacity)
+                out["budget_available"] = round(self.budget.level, 1)
+            kinds = {name: (k, list(k.primary), list(k.observed)) for name, k in self._kinds.items()}
+        for name, (k, primary, observed) in kinds.items():
+            out[name] = {
+                "calls": k.calls,
+                "hedged": k.hedged,
+                "hedge_rate": round(k.hedged / k.calls, 4) if k.calls else 0.0,
+                "secondary_wins": k.secondary_wins,
+                "budget_denied": k.budget_denied,
+                "threshold_ms": round(self.threshold_s(name) * 1000.0, 1),
+                # What callers waited vs the primary alone (when it won)
+                "latency_ms": {f"p{p}": round(_pct(observed, p), 1) for p in (50, 95, 99)},
+                "primary_latency_ms": {f"p{p}": round(_pct([x * 1000.0 for x in primary], p), 1)
+                                       for p in (50, 95, 99)},
+            }
+        return out
+
+
+_hedger: Optional[Hedger] = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Hedger:
+    global _hedger
+    if _hedger is None:
+        with _hedger_lock:
+            if _hedger is None:
+                _hedger = Hedger()
+    return _hedger
+
+
+def hedging_enabled() -> bool:
+    return ENABLE_LLM_HEDGING
+
+
+def hedge_stats() -> Dict[str, Any]:
+    return {"enabled": ENABLE_LLM_HEDGING, **(get_hedger().stats() if ENABLE_LLM_HEDGING else {})}
@@ -1,61 +1,181 @@
-from rag_pipeline.configs.settings import (
-    LLM_PROVIDER, GROQ_API_KEY, GROQ_MODEL,
-    OPENAI_API_KEY, OPENAI_MODEL, OLLAMA_MODEL, TEMPERATURE
-)
+import time
+from typing import AsyncIterator, Iterator, Optional, Tuple
 
+from rag_pipeline.llm_providers import get_provider, LLMError  # noqa: F401  (re-exported)
+from rag_pipeline.llm_scheduler import get_scheduler, LLMQueueTimeout  # noqa: F401  (re-exported)
+from rag_pipeline.completion_cache import get_completion_cache, completion_cache_enabled
+from rag_pipeline.llm_hedging import get_hedger, hedging_enabled
+from rag_pipeline.circuit_breaker import llm_breaker, guard, CircuitOpenError  # noqa: F401  (re-exported)
 
-class LLMError(RuntimeError):
-    pass
 
+def _messages(system_prompt: str, user_prompt: str):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
 
-def generate(system_prompt: str, user_prompt: str) -> str:
-    if LLM_PROVIDER != "groq":
-        raise LLMError(f"LLM_PROVIDER must be 'groq' for this setup, got: {LLM_PROVIDER}")
 
-    if not GROQ_API_KEY:
-        raise LLMError("Missing GROQ_API_KEY. Put it in your .env file.")
+def _cached(system_prompt: str, user_prompt: str, provider: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """(cache key, cached answer); (None, None) when the cache is off."""
+    if not completion_cache_enabled():
+        return None, None
+    key = get_completion_cache().key(get_provider(provider), system_prompt, user_prompt)
+    return key, get_completion_cache().get(key)
 
-    from langchain_groq import ChatGroq
 
-    llm = ChatGroq(
-        groq_api_key=GROQ_API_KEY,
-        model_name=GROQ_MODEL,
-        temperature=TEMPERATURE,
-    )
+def _store(key: Optional[str], answer: str, provider: Optional[str]) -> None:
+    if key is not None:
+        get_completion_cache().put(key, get_provider(provider), answer)
 
-    resp = llm.invoke([
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt},
-    ])
-    return resp.content
-
-
-def _openai_generate(system_prompt: str, user_prompt: str) -> str:
-    if not OPENAI_API_KEY:
-        raise LLMError("Missing OPENAI_API_KEY. Set it as an environment variable.")
-
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
-
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=TEMPERATURE,
-    )
-    return resp.choices[0].message.content
-
-
-def _ollama_generate(system_prompt: str, user_prompt: str) -> str:
-    import ollama
-    resp = ollama.chat(
-        model=OLLAMA_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        options={"temperature": TEMPERATURE},
-    )
-    return resp["message"]["content"]
+
+def _winner_key(
+    key: Optional[str], provider: Optional[str], winner: str, system_prompt: str, user_prompt: str,
+) -> Optional[str]:
+    """Cache key for an answer produced by `winner`: a hedge that won is
+    stored under its own provider and model, not the primary's."""
+    if key is None or get_provider(winner).name == get_provider(provider).name:
+        return key
+    return get_completion_cache().key(get_provider(winner), system_prompt, user_prompt)
+
+
+def generate(
+    system_prompt: str, user_prompt: str, deadline: Optional[float] = None, provider: Optional[str] = None,
+) -> str:
+    """`deadline` (time.monotonic()) bounds the wait for rate-limit admission;
+    `provider` overrides LLM_PROVIDER for this call."""
+    key, answer = _cached(system_prompt, user_prompt, provider)
+    if answer is not None:
+        return answer
+    messages = _messages(system_prompt, user_prompt)
+    breaker = llm_breaker(provider)
+    if breaker is not None:
+        breaker.raise_if_open()
+    scheduler = get_scheduler(provider)
+    charged = scheduler.acquire(messages, deadline)
+    try:
+        with guard(breaker):
+            answer = get_provider(provider).generate(messages)
+    except Exception as exc:
+        scheduler.penalize(exc)
+        raise
+    scheduler.settle(charged, answer)
+    _store(key, answer, provider)
+    return answer
+
+
+async def _agenerate_on(name: str, messages, deadline: Optional[float]) -> str:
+    # An open breaker fails before queueing for admission
+    breaker = llm_breaker(name)
+    if breaker is not None:
+        breaker.raise_if_open()
+    scheduler = get_scheduler(name)
+    charged = await scheduler.aacquire(messages, deadline)
+    try:
+        with guard(breaker):
+            answer = await get_provider(name).agenerate(messages)
+    except Exception as exc:
+        scheduler.penalize(exc)
+        raise
+    scheduler.settle(charged, answer)
+    return answer
+
+
+def _hedge_deadline(is_hedge: bool, deadline: Optional[float]) -> Optional[float]:
+    # A hedge is only worth sending if it is admitted at once
+    return time.monotonic() if is_hedge else deadline
+
+
+async def agenerate(
+    system_prompt: str, user_prompt: str, deadline: Optional[float] = None, provider: Optional[str] = None,
+) -> str:
+    """Non-blocking `generate` for the async API path, hedged when enabled
+    (and no `provider` override is given)."""
+    key, answer = _cached(system_prompt, user_prompt, provider)
+    if answer is not None:
+        return answer
+    messages = _messages(system_prompt, user_prompt)
+    if hedging_enabled() and provider is None:
+        winner, answer = await get_hedger().run(
+            lambda name, is_hedge: _agenerate_on(name, messages, _hedge_deadline(is_hedge, deadline)),
+            kind="generate",
+        )
+    else:
+        winner = get_provider(provider).name
+        answer = await _agenerate_on(winner, messages, deadline)
+    _store(_winner_key(key, provider, winner, system_prompt, user_prompt), answer, winner)
+    return answer
+
+
+def generate_stream(
+    system_prompt: str, user_prompt: str, deadline: Optional[float] = None, provider: Optional[str] = None,
+) -> Iterator[str]:
+    """Answer tokens as the provider produces them. A cached completion is
+    yielded as one token."""
+    key, answer = _cached(system_prompt, user_prompt, provider)
+    if answer is not None:
+        yield answer
+        return
+    messages = _messages(system_prompt, user_prompt)
+    breaker = llm_breaker(provider)
+    if breaker is not None:
+        breaker.raise_if_open()
+    scheduler = get_scheduler(provider)
+    charged = scheduler.acquire(messages, deadline)
+    parts = []
+    try:
+        with guard(breaker) as call:
+            for token in get_provider(provider).stream(messages):
+                call.mark()  # a stream is slow by its first token
+                parts.append(token)
+                yield token
+    except Exception as exc:
+        scheduler.penalize(exc)
+        raise
+    finally:
+        scheduler.settle(charged, "".join(parts))
+    _store(key, "".join(parts), provider)
+
+
+async def _astream_on(name: str, messages, deadline: Optional[float]) -> AsyncIterator[str]:
+    breaker = llm_breaker(name)
+    if breaker is not None:
+        breaker.raise_if_open()
+    scheduler = get_scheduler(name)
+    charged = await scheduler.aacquire(messages, deadline)
+    parts = []
+    try:
+        with guard(breaker) as call:
+            async for token in get_provider(name).astream(messages):
+                call.mark()
+                parts.append(token)
+                yield token
+    except Exception as exc:
+        scheduler.penalize(exc)
+        raise
+    finally:
+        scheduler.settle(charged, "".join(parts))
+
+
+async def agenerate_stream(
+    system_prompt: str, user_prompt: str, deadline: Optional[float] = None, provider: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """Async `generate_stream` for the streaming API endpoint, hedged on the
+    first token when enabled."""
+    key, answer = _cached(system_prompt, user_prompt, provider)
+    if answer is not None:
+        yield answer
+        return
+    messages = _messages(system_prompt, user_prompt)
+    winner = get_provider(provider).name
+    if hedging_enabled() and provider is None:
+        tokens = get_hedger().stream(
+            lambda name, is_hedge: _astream_on(name, messages, _hedge_deadline(is_hedge, deadline)),
+            kind="stream",
+        )
+    else:
+        tokens = ((winner, t) async for t in _astream_on(winner, messages, deadline))
+    parts = []
+    async for winner, token in tokens:
+        parts.append(token)
+        yield token
+    _store(_winner_key(key, provider, winner, system_prompt, user_prompt), "".join(parts), winner)
@@ -0,0 +1,356 @@
+"""
+LLM provider registry with long-lived, pooled HTTP clients.
+
+Each provider keeps one httpx.Client (and one httpx.AsyncClient per event
+loop) for the life of the process, so connections are kept alive between
+calls instead of being rebuilt for every generation. Requests use the
+configured timeouts and are retried on connection errors, 429 and 5xx with
+exponential backoff and full jitter (honouring Retry-After when given).
+
+Providers:
+  - groq    Groq OpenAI-compatible endpoint (GROQ_API_KEY, GROQ_MODEL)
+  - openai  OpenAI or any compatible API (OPENAI_API_KEY, OPENAI_MODEL, OPENAI_BASE_URL)
+  - local   OpenAI-compatible local server such as api/llm_stub_server.py
+            (LOCAL_LLM_URL, LOCAL_LLM_MODEL)
+  - ollama  Ollama /api/chat (OLLAMA_URL, OLLAMA_MODEL)
+
+Usage:
+    from rag_pipeline.llm_providers import get_provider
+    answer = get_provider().generate(messages)
+    answer = await get_provider("local").agenerate(messages)
+    async for token in get_provider().astream(messages): ...
+
+Enable via: LLM_PROVIDER=groq|openai|local|ollama in .env
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Callable, Tuple, Iterator, AsyncIterator
+
+import httpx
+
+from rag_pipeline.configs.settings import (
+    LLM_PROVIDER, TEMPERATURE,
+    GROQ_API_KEY, GROQ_MODEL,
+    OPENAI_API_KEY, OPENAI_MODEL, OPENAI_BASE_URL,
+    LOCAL_LLM_URL, LOCAL_LLM_MODEL,
+    OLLAMA_URL, OLLAMA_MODEL,
+    LLM_TIMEOUT, LLM_CONNECT_TIMEOUT, LLM_POOL_SIZE,
+    LLM_MAX_RETRIES, LLM_RETRY_BACKOFF, LLM_RETRY_MAX_BACKOFF,
+)
+
+logger = logging.getLogger(__name__)
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+
+Messages = List[Dict[str, str]]
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+def _retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return False
+
+
+def _backoff(attempt: int, exc: Exception) -> float:
+    if isinstance(exc, httpx.HTTPStatusError):
+        retry_after = exc.response.headers.get("retry-after", "")
+        try:
+            return min(float(retry_after), LLM_RETRY_MAX_BACKOFF)
+        except ValueError:
+            pass
+    # Full jitter: spread retries of concurrent callers instead of syncing them
+    return random.uniform(0, min(LLM_RETRY_MAX_BACKOFF, LLM_RETRY_BACKOFF * (2 ** attempt)))
+
+
+class LLMProvider:
+    """Base class: subclasses build the request and parse the response."""
+
+    name = "base"
+
+    def __init__(self, base_url: str, model: str, headers: Optional[Dict[str, str]] = None):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.headers = headers or {}
+        self._client: Optional[httpx.Client] = None
+        # A client's connections belong to the loop that opened them: one per loop
+        self._async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+
+    # ── Clients ──────────────────────────────────────────────────────────────
+    def _client_kwargs(self) -> Dict[str, Any]:
+        return dict(
+            base_url=self.base_url,
+            headers=self.headers,
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE),
+        )
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(**self._client_kwargs())
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """Async client for the running event loop. Only call from a coroutine."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            with self._lock:
+                client = self._async_clients.get(loop)
+                if client is None:
+                    # A closed loop took its client's connections with it
+                    for old in [l for l in self._async_clients if l.is_closed()]:
+                        del self._async_clients[old]
+                    client = self._async_clients[loop] = httpx.AsyncClient(**self._client_kwargs())
+        return client
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self) -> None:
+        """Close every async client, each on the loop it belongs to."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients, self._async_clients = self._async_clients, {}
+        for owner, client in clients.items():
+            if owner is loop:
+                await client.aclose()
+            elif owner.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), owner)
+
+    # ── Requests ─────────────────────────────────────────────────────────────
+    def _request(self, messages: Messages) -> tuple:
+        """(path, json body) for one completion."""
+        raise NotImplementedError
+
+    def _parse(self, data: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def _parse_line(self, line: str) -> Tuple[str, bool]:
+        """(token text, done) for one line of a streamed response."""
+        raise NotImplementedError
+
+    def _retry_delay(self, attempt: int, exc: Exception) -> Optional[float]:
+        """Backoff before the next attempt, or None if `exc` must be raised."""
+        if attempt >= LLM_MAX_RETRIES or not _retryable(exc):
+            return None
+        delay = _backoff(attempt, exc)
+        logger.warning("LLM %s call failed (%s) — retry %d in %.2fs", self.name, exc, attempt + 1, delay)
+        return delay
+
+    def generate(self, messages: Messages) -> str:
+        path, body = self._request(messages)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                resp = self.client.post(path, json=body)
+                resp.raise_for_status()
+                return self._parse(resp.json())
+            except Exception as exc:
+                delay = self._retry_delay(attempt, exc)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def agenerate(self, messages: Messages) -> str:
+        path, body = self._request(messages)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                resp = await self.async_client.post(path, json=body)
+                resp.raise_for_status()
+                return self._parse(resp.json())
+            except Exception as exc:
+                delay = self._retry_delay(attempt, exc)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    def stream(self, messages: Messages) -> Iterator[str]:
+        """Yield answer tokens as the provider produces them. Failures are
+        retried only until the first token has been yielded."""
+        path, body = self._request(messages)
+        body = {**body, "stream": True}
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            started = False
+            try:
+                with self.client.stream("POST", path, json=body) as resp:
+                    resp.raise_for_status()
+                    for line in resp.iter_lines():
+                        text, done = self._parse_line(line)
+                        if text:
+                            started = True
+                            yield text
+                        if done:
+                            break
+                return
+            except Exception as exc:
+                delay = None if started else self._retry_delay(attempt, exc)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def astream(self, messages: Messages) -> AsyncIterator[str]:
+        path, body = self._request(messages)
+        body = {**body, "stream": True}
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            started = False
+            try:
+                async with self.async_client.stream("POST", path, json=body) as resp:
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        text, done = self._parse_line(line)
+                        if text:
+                            started = True
+                            yield text
+                        if done:
+                            break
+                return
+            except Exception as exc:
+                delay = None if started else self._retry_delay(attempt, exc)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """POST {base_url}/chat/completions (OpenAI, Groq, vLLM, the local stub)."""
+
+    def __init__(self, name: str, base_url: str, model: str, api_key: str = ""):
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        super().__init__(base_url, model, headers)
+        self.name = name
+
+    def _request(self, messages: Messages) -> tuple:
+        return "/chat/completions", {"model": self.model, "messages": messages, "temperature": TEMPERATURE}
+
+    def _parse(self, data: Dict[str, Any]) -> str:
+        return data["choices"][0]["message"]["content"]
+
+    def _parse_line(self, line: str) -> Tuple[str, bool]:
+        # Server-Sent Events: "data: {chunk}" lines, then "data: [DONE]"
+        if not line.startswith("data:"):
+            return "", False
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return "", True
+        choices = json.loads(data).get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content") or "", False
+
+
+class OllamaProvider(LLMProvider):
+    """POST {OLLAMA_URL}/api/chat."""
+
+    name = "ollama"
+
+    def _request(self, messages: Messages) -> tuple:
+        return "/api/chat", {
+            "model": self.model,
+            "messages": messages,
+            "stream": False,
+            "options": {"temperature": TEMPERATURE},
+        }
+
+    def _parse(self, data: Dict[str, Any]) -> str:
+        return data["message"]["content"]
+
+    def _parse_line(self, line: str) -> Tuple[str, bool]:
+        # One JSON object per line, the last one has "done": true
+        if not line.strip():
+            return "", False
+        data = json.loads(line)
+        return (data.get("message") or {}).get("content") or "", bool(data.get("done"))
+
+
+# ── Registry ──────────────────────────────────────────────────────────────────
+def _groq() -> LLMProvider:
+    if not GROQ_API_KEY:
+        raise LLMError("Missing GROQ_API_KEY. Put it in your .env file.")
+    return OpenAICompatibleProvider("groq", GROQ_BASE_URL, GROQ_MODEL, GROQ_API_KEY)
+
+
+def _openai() -> LLMProvider:
+    if not OPENAI_API_KEY:
+        raise LLMError("Missing OPENAI_API_KEY. Set it as an environment variable.")
+    return OpenAICompatibleProvider("openai", OPENAI_BASE_URL, OPENAI_MODEL, OPENAI_API_KEY)
+
+
+def _local() -> LLMProvider:
+    return OpenAICompatibleProvider("local", LOCAL_LLM_URL, LOCAL_LLM_MODEL)
+
+
+def _ollama() -> LLMProvider:
+    return OllamaProvider(OLLAMA_URL, OLLAMA_MODEL)
+
+
+_factories: Dict[str, Callable[[], LLMProvider]] = {
+    "groq": _groq,
+    "openai": _openai,
+    "local": _local,
+    "ollama": _ollama,
+}
+
+_providers: Dict[str, LLMProvider] = {}
+_providers_pid: Optional[int] = None
+_providers_lock = threading.Lock()
+
+
+def register_provider(name: str, factory: Callable[[], LLMProvider]) -> None:
+    """Add or replace a provider factory (e.g. a custom gateway)."""
+    with _providers_lock:
+        _factories[name] = factory
+        _providers.pop(name, None)
+
+
+def get_provider(name: Optional[str] = None) -> LLMProvider:
+    """Long-lived provider for `name` (default LLM_PROVIDER), one per process."""
+    global _providers_pid
+    name = (name or LLM_PROVIDER).lower()
+    pid = os.getpid()
+    provider = _providers.get(name) if _providers_pid == pid else None
+    if provider is None:
+        with _providers_lock:
+            if _providers_pid != pid:
+                # Forked child: never reuse the parent's sockets
+                _providers.clear()
+                _providers_pid = pid
+            provider = _providers.get(name)
+            if provider is None:
+                factory = _factories.get(name)
+                if factory is None:
+                    raise LLMError(f"Unknown LLM_PROVIDER: {name} (available: {', '.join(sorted(_factories))})")
+                provider = _providers[name] = factory()
+                logger.info("LLM provider %s ready (%s, model=%s)", name, provider.base_url, provider.model)
+    return provider
+
+
+def close_providers() -> None:
+    with _providers_lock:
+        for provider in _providers.values():
+            try:
+                provider.close()
+            except Exception as exc:
+                logger.warning("Error closing LLM provider %s: %s", provider.name, exc)
+
+
+async def aclose_providers() -> None:
+    for provider in list(_providers.values()):
+        try:
+            await provider.aclose()
+        except Exception as exc:
+            logger.warning("Error closing async LLM provider %s: %s", provider.name, exc)
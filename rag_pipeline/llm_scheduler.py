@@ -0,0 +1,290 @@
+"""
+Rate-limit-aware admission for LLM calls.
+
+Groq and OpenAI enforce requests-per-minute and tokens-per-minute limits.
+Without admission control, concurrent traffic fires calls until the provider
+answers 429. Every call through `llm_integration` now goes through the
+scheduler of its provider first:
+
+  - two token buckets, LLM_RPM_LIMIT requests and LLM_TPM_LIMIT tokens per
+    minute (LLM_RPM_LIMIT_<PROVIDER> / LLM_TPM_LIMIT_<PROVIDER> override them
+    for one provider), scaled by LLM_RATE_HEADROOM so throughput stays just
+    under the provider limits. A call is charged one request and its prompt tokens
+    (tiktoken estimate) plus LLM_COMPLETION_TOKEN_ESTIMATE; the charge is
+    corrected with the real completion length once it is known;
+  - a FIFO queue: a call is admitted only when it is at the head of the queue
+    and both buckets can pay for it, so large prompts are not starved by a
+    stream of small ones;
+  - a deadline per call (LLM_QUEUE_TIMEOUT by default). A call that cannot be
+    admitted in time fails fast with LLMQueueTimeout, which the API returns
+    as 503 with Retry-After instead of a 500;
+  - a provider 429 that survives the retries empties the buckets for its
+    Retry-After, so queued calls wait instead of hitting the limit again.
+
+Queue depth, wait times, rejections and 429s are in `scheduler_stats()`.
+
+Usage:
+    from rag_pipeline.llm_scheduler import get_scheduler
+    charged = await get_scheduler().aacquire(messages, deadline=time.monotonic() + 5)
+    ...
+    get_scheduler().settle(charged, answer)
+
+Enable via: LLM_RPM_LIMIT=30 LLM_TPM_LIMIT=6000 in .env (0 = unlimited),
+            LLM_TPM_LIMIT_GROQ=6000 for one provider
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, List
+
+import httpx
+
+from rag_pipeline.llm_providers import LLMError
+from rag_pipeline.context_packer import count_tokens
+from rag_pipeline.configs.settings import (
+    LLM_PROVIDER, LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_RATE_HEADROOM,
+    LLM_COMPLETION_TOKEN_ESTIMATE, LLM_QUEUE_TIMEOUT, LLM_RETRY_MAX_BACKOFF,
+)
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators per chat message
+POLL_S = 0.005               # re-check interval for calls behind the queue head
+WAIT_WINDOW = 1000           # recent waits kept for the percentiles
+
+
+class LLMQueueTimeout(LLMError):
+    """The call could not be admitted before its deadline."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """`per_minute` units refilled continuously; holds at most one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` (capped at capacity) can be taken."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        wait = 0.0 if self.level >= amount else (amount - self.level) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+    def block(self, seconds: float, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    prompt = sum(count_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
+    return prompt + LLM_COMPLETION_TOKEN_ESTIMATE
+
+
+def provider_limit(kind: str, provider: str, default: int) -> int:
+    """LLM_<kind>_LIMIT_<PROVIDER> (e.g. LLM_TPM_LIMIT_GROQ), else `default`."""
+    value = os.getenv(f"LLM_{kind}_LIMIT_{provider.upper()}", "").strip()
+    return int(value) if value else default
+
+
+class RateLimitScheduler:
+    def __init__(self, name: str, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 headroom: float = LLM_RATE_HEADROOM):
+        """`rpm` / `tpm` default to the provider's limits (see provider_limit)."""
+        rpm = provider_limit("RPM", name, LLM_RPM_LIMIT) if rpm is None else rpm
+        tpm = provider_limit("TPM", name, LLM_TPM_LIMIT) if tpm is None else tpm
+        self.name = name
+        self.requests = TokenBucket(rpm * headroom) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm * headroom) if tpm > 0 else None
+        self._queue: deque = deque()
+        self._lock = threading.Lock()
+        self._head_ready = 0.0  # when the queue head expects to be admitted
+        self._waits: deque = deque(maxlen=WAIT_WINDOW)
+        self._stats = {"admitted": 0, "rejected": 0, "rate_limited": 0, "max_depth": 0,
+                       "tokens_charged": 0, "tokens_settled": 0}
+
+    @property
+    def limited(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    # ── Admission ────────────────────────────────────────────────────────────
+    def _try_admit(self, ticket: object, cost: int) -> float:
+        """0 if `ticket` was admitted, else seconds to wait before retrying."""
+        now = time.monotonic()
+        with self._lock:
+            if self._queue[0] is not ticket:
+                return max(POLL_S, self._head_ready - now)
+            wait = 0.0
+            if self.requests is not None:
+                wait = self.requests.wait_time(1, now)
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.wait_time(cost, now))
+            if wait > 0:
+                self._head_ready = now + wait
+                return wait
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(cost)
+            self._queue.popleft()
+            self._head_ready = now
+            self._stats["admitted"] += 1
+            self._stats["tokens_charged"] += cost
+            return 0.0
+
+    def _enqueue(self) -> object:
+        ticket = object()
+        with self._lock:
+            self._queue.append(ticket)
+            self._stats["max_depth"] = max(self._stats["max_depth"], len(self._queue))
+        return ticket
+
+    def _leave(self, ticket: object) -> None:
+        with self._lock:
+            try:
+                self._queue.remove(ticket)
+            except ValueError:
+                pass
+
+    def _reject(self, ticket: object, wait: float) -> LLMQueueTimeout:
+        self._leave(ticket)
+        with self._lock:
+            self._stats["rejected"] += 1
+            depth = len(self._queue)
+        return LLMQueueTimeout(
+            f"LLM provider {self.name} is at its rate limit ({depth} calls queued)",
+            retry_after=max(1.0, wait),
+        )
+
+    def acquire(self, messages: List[Dict[str, str]], deadline: Optional[float] = None) -> int:
+        """Block until the call is admitted; returns the tokens charged."""
+        if not self.limited:
+            with self._lock:
+                self._stats["admitted"] += 1
+            return 0
+        cost = estimate_tokens(messages)
+        deadline = deadline or time.monotonic() + LLM_QUEUE_TIMEOUT
+        t0 = time.monotonic()
+        ticket = self._enqueue()
+        try:
+            while True:
+                wait = self._try_admit(ticket, cost)
+                if wait <= 0:
+                    self._waits.append((time.monotonic() - t0) * 1000.0)
+                    return cost
+                if time.monotonic() + wait > deadline:
+                    raise self._reject(ticket, wait)
+                time.sleep(wait)
+        except BaseException:
+            self._leave(ticket)
+            raise
+
+    async def aacquire(self, messages: List[Dict[str, str]], deadline: Optional[float] = None) -> int:
+        if not self.limited:
+            with self._lock:
+                self._stats["admitted"] += 1
+            return 0
+        cost = estimate_tokens(messages)
+        deadline = deadline or time.monotonic() + LLM_QUEUE_TIMEOUT
+        t0 = time.monotonic()
+        ticket = self._enqueue()
+        try:
+            while True:
+                wait = self._try_admit(ticket, cost)
+                if wait <= 0:
+                    self._waits.append((time.monotonic() - t0) * 1000.0)
+                    return cost
+                if time.monotonic() + wait > deadline:
+                    raise self._reject(ticket, wait)
+                await asyncio.sleep(wait)
+        except BaseException:
+            # Cancelled (client gone) or rejected: free the queue slot
+            self._leave(ticket)
+            raise
+
+    # ── After the call ───────────────────────────────────────────────────────
+    def settle(self, charged: int, completion: str) -> None:
+        """Correct the token charge with the real completion length."""
+        if not self.limited:
+            return
+        actual = charged - LLM_COMPLETION_TOKEN_ESTIMATE + count_tokens(completion or "")
+        with self._lock:
+            self._stats["tokens_settled"] += actual
+            if self.tokens is not None:
+                if actual < charged:
+                    self.tokens.give(charged - actual)
+                else:
+                    self.tokens.take(actual - charged)
+
+    def penalize(self, exc: Exception) -> None:
+        """Pause admissions after a 429 that outlived the provider's retries."""
+        if not (isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429):
+            return
+        try:
+            pause = float(exc.response.headers.get("retry-after", ""))
+        except ValueError:
+            pause = LLM_RETRY_MAX_BACKOFF
+        now = time.monotonic()
+        with self._lock:
+            self._stats["rate_limited"] += 1
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.block(pause, now)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = {"provider": self.name, "queue_depth": len(self._queue), **self._stats}
+            waits = sorted(self._waits)
+            now = time.monotonic()
+            for label, bucket in (("rpm", self.requests), ("tpm", self.tokens)):
+                if bucket is not None:
+                    bucket._refill(now)
+                    stats[f"{label}_limit"] = round(bucket.capacity, 1)
+                    stats[f"{label}_available"] = round(bucket.level, 1)
+        stats["wait_ms"] = {
+            "avg": round(sum(waits) / len(waits), 2) if waits else 0.0,
+            "p50": round(waits[int(0.50 * (len(waits) - 1))], 2) if waits else 0.0,
+            "p95": round(waits[int(0.95 * (len(waits) - 1))], 2) if waits else 0.0,
+        }
+        return stats
+
+
+_schedulers: Dict[str, RateLimitScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(name: Optional[str] = None) -> RateLimitScheduler:
+    name = (name or LLM_PROVIDER).lower()
+    scheduler = _schedulers.get(name)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.get(name)
+            if scheduler is None:
+                scheduler = _schedulers[name] = RateLimitScheduler(name)
+    return scheduler
+
+
+def scheduler_stats() -> Dict[str, Any]:
+    return {
+        "rpm_limit": LLM_RPM_LIMIT,
+        "tpm_limit": LLM_TPM_LIMIT,
+        "providers": [s.stats() for s in list(_schedulers.values())],
+    }
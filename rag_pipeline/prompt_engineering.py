@@ -1,5 +1,5 @@
-from typing import List, Dict, Any
-from rag_pipeline.configs.settings import MAX_CONTEXT_CHARS
+from typing import List, Dict, Any, Optional, Tuple
+from rag_pipeline.context_packer import pack_context, count_tokens
 
 SYSTEM_PROMPT = """You are an HR & Compliance assistant.
 You MUST answer using ONLY the provided context.
@@ -9,43 +9,27 @@ Do NOT invent policies, laws, or facts.
 
 CITATION RULES (mandatory):
 - Every sentence that states a fact or policy MUST end with [chunk_id].
-- The chunk_id is shown at the top of each context block (e.g. [pile_of_law_0000000_chunk_0000]).
+- The chunk_id is shown at the start of each context block (e.g. [pile_of_law_0000000_chunk_0000]).
 - Example: "Employees must provide 30 days notice before resignation. [pile_of_law_0000000_chunk_0000]"
 - Never write a factual sentence without a citation.
 
 Use clear, concise language. Do not mention system internals or metadata.
 """
 
-def _format_chunk(payload: Dict[str, Any]) -> str:
-    chunk_id = payload.get("chunk_id", "unknown_chunk")
-    doc_id = payload.get("doc_id", "")
-    meta = {
-        "doc_id": doc_id,
-        "dataset_name": payload.get("dataset_name", ""),
-        "department": payload.get("department", ""),
-        "category": payload.get("category", ""),
-        "document_type": payload.get("document_type", ""),
-        "region": payload.get("region", ""),
-    }
-    text = (payload.get("text") or "").strip()
-    return f"[{chunk_id}]\nMETA: {meta}\nTEXT:\n{text}\n"
+def build_prompt(
+    question: str, retrieved: List[Dict[str, Any]], budget: Optional[int] = None, history: str = "",
+) -> Tuple[str, Dict[str, int]]:
+    """(user prompt, token counts): the context is packed to `budget` tokens
+    (default CONTEXT_TOKEN_BUDGET), see rag_pipeline/context_packer.py.
+    `history` is the condensed conversation of a session, sent before the
+    question so follow-ups can be resolved."""
+    context, counts = pack_context(question, retrieved, budget) if budget else pack_context(question, retrieved)
 
-def build_user_prompt(question: str, retrieved: List[Dict[str, Any]]) -> str:
-    blocks: List[str] = []
-    total = 0
-
-    for r in retrieved:
-        payload = r.get("payload", {}) or {}
-        block = _format_chunk(payload)
-
-        if total + len(block) > MAX_CONTEXT_CHARS:
-            break
-        blocks.append(block)
-        total += len(block)
-
-    context = "\n---\n".join(blocks)
+    conversation = f"""CONVERSATION SO FAR (only to understand the question, not a source):
+{history}
 
-    return f"""QUESTION:
+""" if history else ""
+    user_prompt = f"""{conversation}QUESTION:
 {question}
 
 CONTEXT:
@@ -56,4 +40,10 @@ RULES:
 - If missing info, say you don't know based on provided documents.
 - Add citations like [chunk_id] after each key sentence.
 - Do not mention system internals.
-"""
\ No newline at end of file
+"""
+    counts["prompt"] = count_tokens(SYSTEM_PROMPT) + count_tokens(user_prompt)
+    return user_prompt, counts
+
+
+def build_user_prompt(question: str, retrieved: List[Dict[str, Any]]) -> str:
+    return build_prompt(question, retrieved)[0]
@@ -1,113 +1,442 @@
 import time
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Iterator, AsyncIterator
 
-from rag_pipeline.prompt_engineering import SYSTEM_PROMPT, build_user_prompt
-from rag_pipeline.llm_integration import generate
-from rag_pipeline.configs.settings import TOP_K_DEFAULT, SCORE_THRESHOLD, ENABLE_RERANKING
+import httpx
 
-from vectorstore.retriever import retrieve
+from rag_pipeline.prompt_engineering import SYSTEM_PROMPT, build_prompt
+from rag_pipeline.llm_integration import (
+    generate, agenerate, generate_stream, agenerate_stream, LLMQueueTimeout, CircuitOpenError,
+)
+from rag_pipeline.deadline import Deadline, Degradation, SOURCES_ONLY_ANSWER
+from rag_pipeline.circuit_breaker import breakers_enabled, extractive_answer
+from rag_pipeline.sessions import (
+    Session, get_session_store, choose_context, followup_budget, FRESH, EXTENDED, REUSED,
+)
+from rag_pipeline.configs.settings import (
+    TOP_K_DEFAULT, SCORE_THRESHOLD, ENABLE_RERANKING, BATCH_LLM_CONCURRENCY,
+    RERANK_CASCADE, RETRIEVAL_MODE, ADAPTIVE_FETCH, BM25_SCORE_THRESHOLD,
+)
+
+from vectorstore.retriever import retrieve, aretrieve, retrieve_batch, afetch_vectors
+from vectorstore.embedding_generator import embed_text
+from vectorstore.adaptive_fetch import adaptive_retrieve, aadaptive_retrieve
+from vectorstore.cpu_pool import run_cpu
 
 
 # Logging
 logger = logging.getLogger("rag_pipeline")
 
+NO_ANSWER = "I don't know based on the provided documents."
+
+
+# ── Shared stages (used by rag_query and rag_query_async) ────────────────────
+def _fetch_k(top_k: int) -> int:
+    # Fetch more candidates when reranking is enabled
+    return top_k * 3 if ENABLE_RERANKING else top_k
+
+
+def _use_adaptive() -> bool:
+    # The drop-off is relative to the best cosine score, so dense mode only
+    return ADAPTIVE_FETCH and RETRIEVAL_MODE == "dense"
+
+
+def _retrieve(question: str, top_k: int, filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if _use_adaptive():
+        return adaptive_retrieve(question, top_k=top_k, max_k=_fetch_k(top_k), filters=filters)
+    return retrieve(question, top_k=_fetch_k(top_k), filters=filters, with_payload=True)
+
+
+async def _aretrieve(
+    question: str,
+    top_k: int,
+    filters: Optional[Dict[str, Any]],
+    query_vector: Optional[Sequence[float]] = None,
+) -> List[Dict[str, Any]]:
+    if _use_adaptive():
+        return await aadaptive_retrieve(
+            question, top_k=top_k, max_k=_fetch_k(top_k), filters=filters, query_vector=query_vector,
+        )
+    return await aretrieve(
+        question, top_k=_fetch_k(top_k), filters=filters, with_payload=True, query_vector=query_vector,
+    )
+
+
+def _score_threshold() -> float:
+    # Lexical hits carry raw BM25 scores, which the cosine threshold does not fit
+    return BM25_SCORE_THRESHOLD if RETRIEVAL_MODE == "lexical" else SCORE_THRESHOLD
+
+
+def _below_threshold(retrieved: List[Dict[str, Any]]) -> bool:
+    return not retrieved or max(r["score"] for r in retrieved) < _score_threshold()
+
+
+def _use_cascade() -> bool:
+    # Cascade thresholds are on the dense cosine scale; lexical and hybrid
+    # hits are ordered by BM25 / RRF, so they always get the full rerank
+    return RERANK_CASCADE and RETRIEVAL_MODE == "dense"
+
+
+def _rerank(question: str, retrieved: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    from vectorstore.reranker import rerank, cascade_rerank
+    t_rerank_start = time.perf_counter()
+    retrieved = (cascade_rerank if _use_cascade() else rerank)(question, retrieved, top_k)
+    rerank_ms = (time.perf_counter() - t_rerank_start) * 1000
+    logger.info("Re-ranking completed | chunks=%s | latency=%.2f ms",
+                len(retrieved), rerank_ms)
+    return retrieved
+
+
+async def _arerank(question: str, retrieved: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    from vectorstore.reranker import arerank, acascade_rerank
+    t_rerank_start = time.perf_counter()
+    retrieved = await (acascade_rerank if _use_cascade() else arerank)(question, retrieved, top_k)
+    rerank_ms = (time.perf_counter() - t_rerank_start) * 1000
+    logger.info("Re-ranking completed | chunks=%s | latency=%.2f ms",
+                len(retrieved), rerank_ms)
+    return retrieved
+
+
+def _should_rerank(plan: Degradation) -> bool:
+    # skip_rerank is only recorded when reranking is enabled
+    return ENABLE_RERANKING and not plan.skip_rerank()
+
+
+def _without_rerank(retrieved: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    # The fetch was widened for the reranker; keep the dense order's top_k
+    return retrieved[:top_k]
+
+
+def _build_sources(retrieved: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    sources = []
+    for r in retrieved:
+        p = r.get("payload", {}) or {}
+
+        sources.append({
+            "chunk_id": p.get("chunk_id"),
+            "doc_id": p.get("doc_id"),
+            "score": r.get("score"),
+            "dataset_name": p.get("dataset_name"),
+            "department": p.get("department"),
+            "category": p.get("category"),
+            "document_type": p.get("document_type"),
+            "region": p.get("region"),
+        })
+    return sources
+
+
+def _build_prompt(
+    question: str, retrieved: List[Dict[str, Any]], budget: Optional[int] = None, history: str = "",
+) -> Tuple[str, Dict[str, int]]:
+    user_prompt, counts = build_prompt(question, retrieved, budget, history)
+    logger.info("Prompt packed | prompt_tokens=%d | context_tokens=%d/%d | sentences=%d/%d "
+                "| chunks_merged=%d | bytes_saved=%d",
+                counts["prompt"], counts["context"], counts["context_raw"],
+                counts["sentences"], counts["sentences_total"], counts["merged"], counts["bytes_saved"])
+    return user_prompt, counts
+
+
+async def _abuild_prompt(
+    question: str, retrieved: List[Dict[str, Any]], budget: Optional[int] = None, history: str = "",
+) -> Tuple[str, Dict[str, int]]:
+    # Tokenizing (and compression's sentence embedding) runs on the CPU pool
+    return await run_cpu(_build_prompt, question, retrieved, budget, history)
+
+
+def _response(
+    question: str,
+    answer: str,
+    sources: List[Dict[str, Any]],
+    filters: Optional[Dict[str, Any]],
+    top_k: int,
+    t0: float,
+    token_counts: Optional[Dict[str, int]] = None,
+    degraded: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    return {
+        "question": question,
+        "answer": answer,
+        "sources": sources,
+        "filters": filters or {},
+        "top_k": top_k,
+        "latency_ms": (time.perf_counter() - t0) * 1000,
+        "token_counts": token_counts,
+        "degraded": list(degraded or []),
+    }
+
+
+def _no_answer(question: str, filters: Optional[Dict[str, Any]], top_k: int, t0: float) -> Dict[str, Any]:
+    out = _response(question, NO_ANSWER, [], filters, top_k, t0)
+    logger.info(
+        "Score below threshold (%.2f) — skipping LLM | latency=%.2f ms",
+        _score_threshold(), out["latency_ms"],
+    )
+    return out
+
+
+def _sources_only(
+    question: str,
+    retrieved: List[Dict[str, Any]],
+    filters: Optional[Dict[str, Any]],
+    top_k: int,
+    t0: float,
+    plan: Degradation,
+    token_counts: Optional[Dict[str, int]] = None,
+) -> Dict[str, Any]:
+    out = _response(question, SOURCES_ONLY_ANSWER, _build_sources(retrieved), filters, top_k, t0,
+                    token_counts, plan.applied)
+    logger.info("Deadline reached — returning sources only | latency=%.2f ms", out["latency_ms"])
+    return out
+
+
+def _note_fallback(plan: Degradation, retrieved: List[Dict[str, Any]]) -> None:
+    # Hits from the in-process snapshot index while Qdrant's breaker is open
+    if any(r.get("fallback") for r in retrieved):
+        plan.note("retrieval_fallback")
+
+
+def _llm_unavailable(exc: Exception) -> bool:
+    """With circuit breakers on, an LLM that is unreachable, failing (5xx),
+    throttling (429) or behind an open breaker is answered extractively.
+    Bad requests, auth and config errors propagate; rate-limit queue
+    timeouts keep their 503."""
+    if not breakers_enabled():
+        return False
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return isinstance(exc, (CircuitOpenError, httpx.TransportError))
+
+
+def _extractive(
+    question: str,
+    retrieved: List[Dict[str, Any]],
+    filters: Optional[Dict[str, Any]],
+    top_k: int,
+    t0: float,
+    plan: Degradation,
+    token_counts: Optional[Dict[str, int]],
+    exc: Exception,
+) -> Dict[str, Any]:
+    plan.note("extractive_answer")
+    out = _response(question, extractive_answer(retrieved), _build_sources(retrieved), filters, top_k, t0,
+                    token_counts, plan.applied)
+    logger.warning("LLM unavailable (%s) — returning top passages | latency=%.2f ms", exc, out["latency_ms"])
+    return out
+
+
+# ── Sessions (async API paths) ───────────────────────────────────────────────
+async def _asession_rank(
+    session: Session, question: str, query_vector: Optional[Sequence[float]],
+) -> List[Dict[str, Any]]:
+    # Chunk vectors come from the index, so only the question is ever encoded
+    session.add_vectors(await afetch_vectors(session.missing_vectors(), session.filters))
+    return await run_cpu(session.rank, question, query_vector)
+
+
+async def _asession_retrieve(
+    question: str, top_k: int, filters: Optional[Dict[str, Any]], session: Session,
+    query_vector: Optional[Sequence[float]] = None,
+) -> Tuple[List[Dict[str, Any]], str]:
+    """(retrieved, context policy) for a session turn: the cached set is
+    reused or extended when the question is close to it, see sessions.py."""
+    if query_vector is None and session.retrieved:
+        # Encoded once for ranking the cached set and for a fresh retrieval
+        query_vector = await run_cpu(embed_text, question)
+    ranked = await _asession_rank(session, question, query_vector)
+    context = choose_context(session, ranked, filters, top_k)
+    if context == EXTENDED:
+        added = session.extend(
+            await aretrieve(session.followup_query(question), top_k=top_k, filters=filters, with_payload=True)
+        )
+        logger.info("Session context extended | new_chunks=%d", added)
+        ranked = await _asession_rank(session, question, query_vector)
+    if context != FRESH:
+        logger.info("Session %s turn %d | context=%s | cached_chunks=%d | best_score=%.3f",
+                    session.session_id, session.turn, context, len(ranked), ranked[0]["score"])
+        return ranked[:top_k], context
+
+    retrieved = await _aretrieve(question, top_k, filters, query_vector)
+    session.reset(question, retrieved, filters)
+    return retrieved, FRESH
+
+
+def _session_budget(plan: Degradation, context: Optional[str]) -> Optional[int]:
+    budget = plan.context_budget()
+    if context in (REUSED, EXTENDED):
+        budget = min(budget, followup_budget()) if budget else followup_budget()
+    return budget
 
+
+def _in_session(out: Dict[str, Any], session: Optional[Session], context: Optional[str]) -> Dict[str, Any]:
+    if session is not None:
+        out["session"] = session.info(context)
+    return out
+
+
+# ── Query paths ───────────────────────────────────────────────────────────────
 def rag_query(
     question: str,
     top_k: int = TOP_K_DEFAULT,
     filters: Optional[Dict[str, Any]] = None,
+    deadline: Optional[Deadline] = None,
 ) -> Dict[str, Any]:
+    """`deadline` degrades the later stages when time runs short, see
+    rag_pipeline/deadline.py; `degraded` in the response lists what was cut."""
 
     logger.info("RAG query started | question=%s | top_k=%s | filters=%s",
                 question, top_k, filters)
 
     t0 = time.perf_counter()
+    plan = Degradation(deadline)
 
     try:
         # Retrieval
         t_retrieval_start = time.perf_counter()
 
-        # Fetch more candidates when reranking is enabled
-        fetch_k = top_k * 3 if ENABLE_RERANKING else top_k
-
-        retrieved = retrieve(
-            question,
-            top_k=fetch_k,
-            filters=filters,
-            with_payload=True,
-        )
+        retrieved = _retrieve(question, top_k, filters)
 
         retrieval_ms = (time.perf_counter() - t_retrieval_start) * 1000
 
         logger.info("Retrieval completed | chunks=%s | latency=%.2f ms",
                     len(retrieved), retrieval_ms)
+        _note_fallback(plan, retrieved)
 
         # Score threshold check
-        if not retrieved or max(r["score"] for r in retrieved) < SCORE_THRESHOLD:
-            total_ms = (time.perf_counter() - t0) * 1000
-            logger.info(
-                "Score below threshold (%.2f) — skipping LLM | latency=%.2f ms",
-                SCORE_THRESHOLD, total_ms,
-            )
-            return {
-                "question": question,
-                "answer": "I don't know based on the provided documents.",
-                "sources": [],
-                "filters": filters or {},
-                "top_k": top_k,
-                "latency_ms": total_ms,
-            }
+        if _below_threshold(retrieved):
+            return _no_answer(question, filters, top_k, t0)
 
         # Re-ranking (optional)
-        if ENABLE_RERANKING and retrieved:
-            from vectorstore.reranker import rerank
-            t_rerank_start = time.perf_counter()
-            retrieved = rerank(question, retrieved, top_k)
-            rerank_ms = (time.perf_counter() - t_rerank_start) * 1000
-            logger.info("Re-ranking completed | chunks=%s | latency=%.2f ms",
-                        len(retrieved), rerank_ms)
+        if _should_rerank(plan):
+            retrieved = _rerank(question, retrieved, top_k)
+        elif ENABLE_RERANKING:
+            retrieved = _without_rerank(retrieved, top_k)
 
         # Prompt building
-        user_prompt = build_user_prompt(question, retrieved)
+        user_prompt, token_counts = _build_prompt(question, retrieved, plan.context_budget())
+        provider = plan.llm_provider()
+        if plan.sources_only():
+            return _sources_only(question, retrieved, filters, top_k, t0, plan, token_counts)
 
         # LLM generation
         t_llm_start = time.perf_counter()
 
-        answer = generate(SYSTEM_PROMPT, user_prompt)
+        try:
+            answer = generate(SYSTEM_PROMPT, user_prompt, deadline=plan.at, provider=provider)
+        except LLMQueueTimeout:
+            if deadline is None:
+                raise
+            plan.timed_out()
+            return _sources_only(question, retrieved, filters, top_k, t0, plan, token_counts)
+        except Exception as exc:
+            if not _llm_unavailable(exc):
+                raise
+            return _extractive(question, retrieved, filters, top_k, t0, plan, token_counts, exc)
+
+        llm_ms = (time.perf_counter() - t_llm_start) * 1000
+
+        logger.info("LLM generation completed | latency=%.2f ms", llm_ms)
+
+        out = _response(question, answer, _build_sources(retrieved), filters, top_k, t0, token_counts,
+                        plan.applied)
+
+        logger.info("RAG query finished | total_latency=%.2f ms", out["latency_ms"])
+
+        return out
+
+    except Exception as e:
+
+        logger.exception("RAG query failed | error=%s", str(e))
+        raise
+
+
+async def rag_query_async(
+    question: str,
+    top_k: int = TOP_K_DEFAULT,
+    filters: Optional[Dict[str, Any]] = None,
+    deadline: Optional[Deadline] = None,
+    session_id: Optional[str] = None,
+    query_vector: Optional[Sequence[float]] = None,
+) -> Dict[str, Any]:
+    """Same pipeline as `rag_query` without blocking the event loop: Qdrant, the
+    LLM and the reranker service are awaited; embedding runs on the bounded
+    CPU pool. Here the LLM call itself is also cancelled at the deadline.
+    With `session_id` the turn reuses the session's retrieved context and
+    conversation (rag_pipeline/sessions.py); `session` in the response says how.
+    `query_vector` is the question's embedding when the caller already has
+    it (the API's semantic cache lookup), so it is not encoded twice."""
+
+    logger.info("RAG query (async) started | question=%s | top_k=%s | filters=%s | session=%s",
+                question, top_k, filters, session_id)
+
+    t0 = time.perf_counter()
+    plan = Degradation(deadline)
+    session = get_session_store().get(session_id) if session_id else None
+    context: Optional[str] = None
+
+    try:
+        t_retrieval_start = time.perf_counter()
+
+        if session is not None:
+            retrieved, context = await _asession_retrieve(question, top_k, filters, session, query_vector)
+        else:
+            retrieved = await _aretrieve(question, top_k, filters, query_vector)
+
+        retrieval_ms = (time.perf_counter() - t_retrieval_start) * 1000
+
+        logger.info("Retrieval completed | chunks=%s | latency=%.2f ms",
+                    len(retrieved), retrieval_ms)
+        _note_fallback(plan, retrieved)
+
+        if _below_threshold(retrieved):
+            return _in_session(_no_answer(question, filters, top_k, t0), session, context)
+
+        # Reused and extended session sets are already ranked for this question
+        if context not in (REUSED, EXTENDED):
+            if _should_rerank(plan):
+                retrieved = await _arerank(question, retrieved, top_k)
+            elif ENABLE_RERANKING:
+                retrieved = _without_rerank(retrieved, top_k)
+
+        user_prompt, token_counts = await _abuild_prompt(
+            question, retrieved, _session_budget(plan, context), session.history() if session else "",
+        )
+        if session is not None:
+            get_session_store().record(context, token_counts["prompt"])
+        provider = plan.llm_provider()
+        if plan.sources_only():
+            out = _sources_only(question, retrieved, filters, top_k, t0, plan, token_counts)
+            return _in_session(out, session, context)
+
+        t_llm_start = time.perf_counter()
+
+        call = agenerate(SYSTEM_PROMPT, user_prompt, deadline=plan.at, provider=provider)
+        try:
+            answer = await (asyncio.wait_for(call, deadline.remaining_s()) if deadline else call)
+        except (asyncio.TimeoutError, LLMQueueTimeout):
+            if deadline is None:
+                raise
+            plan.timed_out()
+            out = _sources_only(question, retrieved, filters, top_k, t0, plan, token_counts)
+            return _in_session(out, session, context)
+        except Exception as exc:
+            if not _llm_unavailable(exc):
+                raise
+            out = _extractive(question, retrieved, filters, top_k, t0, plan, token_counts, exc)
+            return _in_session(out, session, context)
 
         llm_ms = (time.perf_counter() - t_llm_start) * 1000
 
         logger.info("LLM generation completed | latency=%.2f ms", llm_ms)
 
-        # Sources extraction
-        sources = []
-        for r in retrieved:
-            p = r.get("payload", {}) or {}
-
-            sources.append({
-                "chunk_id": p.get("chunk_id"),
-                "doc_id": p.get("doc_id"),
-                "score": r.get("score"),
-                "dataset_name": p.get("dataset_name"),
-                "department": p.get("department"),
-                "category": p.get("category"),
-                "document_type": p.get("document_type"),
-                "region": p.get("region"),
-            })
-
-        total_ms = (time.perf_counter() - t0) * 1000
-
-        logger.info("RAG query finished | total_latency=%.2f ms", total_ms)
-
-        return {
-            "question": question,
-            "answer": answer,
-            "sources": sources,
-            "filters": filters or {},
-            "top_k": top_k,
-            "latency_ms": total_ms,
-        }
+        out = _response(question, answer, _build_sources(retrieved), filters, top_k, t0, token_counts,
+                        plan.applied)
+        if session is not None:
+            session.remember(question, answer)
+
+        logger.info("RAG query finished | total_latency=%.2f ms", out["latency_ms"])
+
+        return _in_session(out, session, context)
 
     except Exception as e:
 
@@ -115,6 +444,325 @@ def rag_query(
         raise
 
 
+# ── Streaming ─────────────────────────────────────────────────────────────────
+StreamEvent = Tuple[str, Dict[str, Any]]
+
+
+def _sources_event(
+    question: str, retrieved: List[Dict[str, Any]], filters: Optional[Dict[str, Any]], top_k: int,
+) -> StreamEvent:
+    return "sources", {
+        "question": question,
+        "sources": _build_sources(retrieved),
+        "filters": filters or {},
+        "top_k": top_k,
+    }
+
+
+def _done_event(
+    t0: float, t_first: Optional[float], tokens: int, retrieval_ms: float, rerank_ms: float, llm_ms: float,
+    token_counts: Optional[Dict[str, int]] = None, degraded: Optional[List[str]] = None,
+    session: Optional[Dict[str, Any]] = None,
+) -> StreamEvent:
+    now = time.perf_counter()
+    timing = {
+        "ttft_ms": ((t_first or now) - t0) * 1000,
+        "retrieval_ms": retrieval_ms,
+        "rerank_ms": rerank_ms,
+        "llm_ms": llm_ms,
+        "latency_ms": (now - t0) * 1000,
+        "tokens": tokens,
+        "token_counts": token_counts,
+        "degraded": list(degraded or []),
+    }
+    if session is not None:
+        timing["session"] = session
+    logger.info("RAG stream finished | ttft=%.2f ms | tokens=%d | total_latency=%.2f ms",
+                timing["ttft_ms"], tokens, timing["latency_ms"])
+    return "done", timing
+
+
+def rag_query_stream(
+    question: str,
+    top_k: int = TOP_K_DEFAULT,
+    filters: Optional[Dict[str, Any]] = None,
+    deadline: Optional[Deadline] = None,
+) -> Iterator[StreamEvent]:
+    """`rag_query` as events: ("sources", {...}) once retrieval and reranking
+    are done, ("token", {"text"}) per generated token, then ("done", timing)
+    with time to first token (ttft_ms), the stage latencies and the
+    degradations applied. The deadline is checked between stages; a stream
+    that has started is not cut."""
+
+    logger.info("RAG stream started | question=%s | top_k=%s | filters=%s",
+                question, top_k, filters)
+
+    t0 = time.perf_counter()
+    plan = Degradation(deadline)
+    retrieved = _retrieve(question, top_k, filters)
+    retrieval_ms = (time.perf_counter() - t0) * 1000
+    _note_fallback(plan, retrieved)
+
+    if _below_threshold(retrieved):
+        yield _sources_event(question, [], filters, top_k)
+        t_first = time.perf_counter()
+        yield "token", {"text": NO_ANSWER}
+        yield _done_event(t0, t_first, 1, retrieval_ms, 0.0, 0.0)
+        return
+
+    rerank_ms = 0.0
+    if _should_rerank(plan):
+        t_rerank = time.perf_counter()
+        retrieved = _rerank(question, retrieved, top_k)
+        rerank_ms = (time.perf_counter() - t_rerank) * 1000
+    elif ENABLE_RERANKING:
+        retrieved = _without_rerank(retrieved, top_k)
+
+    yield _sources_event(question, retrieved, filters, top_k)
+
+    user_prompt, token_counts = _build_prompt(question, retrieved, plan.context_budget())
+    provider = plan.llm_provider()
+    t_llm = time.perf_counter()
+    t_first: Optional[float] = None
+    tokens = 0
+    if not plan.sources_only():
+        try:
+            for text in generate_stream(SYSTEM_PROMPT, user_prompt, deadline=plan.at, provider=provider):
+                if t_first is None:
+                    t_first = time.perf_counter()
+                tokens += 1
+                yield "token", {"text": text}
+        except LLMQueueTimeout:
+            if deadline is None:
+                raise
+            plan.timed_out()
+        except Exception as exc:
+            # Tokens already sent cannot be taken back
+            if tokens or not _llm_unavailable(exc):
+                raise
+            logger.warning("LLM unavailable (%s) — streaming top passages", exc)
+            plan.note("extractive_answer")
+    if "sources_only" in plan.applied:
+        t_first = time.perf_counter()
+        tokens = 1
+        yield "token", {"text": SOURCES_ONLY_ANSWER}
+    elif "extractive_answer" in plan.applied:
+        t_first = time.perf_counter()
+        tokens = 1
+        yield "token", {"text": extractive_answer(retrieved)}
+    yield _done_event(t0, t_first, tokens, retrieval_ms, rerank_ms, (time.perf_counter() - t_llm) * 1000,
+                      token_counts, plan.applied)
+
+
+async def rag_query_stream_async(
+    question: str,
+    top_k: int = TOP_K_DEFAULT,
+    filters: Optional[Dict[str, Any]] = None,
+    deadline: Optional[Deadline] = None,
+    session_id: Optional[str] = None,
+    query_vector: Optional[Sequence[float]] = None,
+) -> AsyncIterator[StreamEvent]:
+    """Non-blocking `rag_query_stream`, used by POST /query/stream. Here the
+    wait for the first token is also bounded by the deadline. `session_id`
+    and `query_vector` work as in `rag_query_async`; the done event carries
+    `session`."""
+
+    logger.info("RAG stream (async) started | question=%s | top_k=%s | filters=%s | session=%s",
+                question, top_k, filters, session_id)
+
+    t0 = time.perf_counter()
+    plan = Degradation(deadline)
+    session = get_session_store().get(session_id) if session_id else None
+    context: Optional[str] = None
+    if session is not None:
+        retrieved, context = await _asession_retrieve(question, top_k, filters, session, query_vector)
+    else:
+        retrieved = await _aretrieve(question, top_k, filters, query_vector)
+    info = session.info(context) if session is not None else None
+    retrieval_ms = (time.perf_counter() - t0) * 1000
+    _note_fallback(plan, retrieved)
+
+    if _below_threshold(retrieved):
+        yield _sources_event(question, [], filters, top_k)
+        t_first = time.perf_counter()
+        yield "token", {"text": NO_ANSWER}
+        yield _done_event(t0, t_first, 1, retrieval_ms, 0.0, 0.0, session=info)
+        return
+
+    rerank_ms = 0.0
+    # Reused and extended session sets are already ranked for this question
+    if context not in (REUSED, EXTENDED):
+        if _should_rerank(plan):
+            t_rerank = time.perf_counter()
+            retrieved = await _arerank(question, retrieved, top_k)
+            rerank_ms = (time.perf_counter() - t_rerank) * 1000
+        elif ENABLE_RERANKING:
+            retrieved = _without_rerank(retrieved, top_k)
+
+    yield _sources_event(question, retrieved, filters, top_k)
+
+    user_prompt, token_counts = await _abuild_prompt(
+        question, retrieved, _session_budget(plan, context), session.history() if session else "",
+    )
+    if session is not None:
+        get_session_store().record(context, token_counts["prompt"])
+    provider = plan.llm_provider()
+    t_llm = time.perf_counter()
+    t_first: Optional[float] = None
+    tokens = 0
+    parts: List[str] = []
+    if not plan.sources_only():
+        stream = agenerate_stream(SYSTEM_PROMPT, user_prompt, deadline=plan.at, provider=provider)
+        try:
+            first = stream.__anext__()
+            text = await (asyncio.wait_for(first, deadline.remaining_s()) if deadline else first)
+        except StopAsyncIteration:
+            text = None
+        except (asyncio.TimeoutError, LLMQueueTimeout):
+            if deadline is None:
+                raise
+            await stream.aclose()
+            plan.timed_out()
+            text = None
+        except Exception as exc:
+            if not _llm_unavailable(exc):
+                raise
+            logger.warning("LLM unavailable (%s) — streaming top passages", exc)
+            plan.note("extractive_answer")
+            text = None
+        if text is not None:
+            t_first = time.perf_counter()
+            tokens = 1
+            parts.append(text)
+            yield "token", {"text": text}
+            async for text in stream:
+                tokens += 1
+                parts.append(text)
+                yield "token", {"text": text}
+    if "sources_only" in plan.applied:
+        t_first = time.perf_counter()
+        tokens = 1
+        yield "token", {"text": SOURCES_ONLY_ANSWER}
+    elif "extractive_answer" in plan.applied:
+        t_first = time.perf_counter()
+        tokens = 1
+        yield "token", {"text": extractive_answer(retrieved)}
+    elif session is not None and parts:
+        session.remember(question, "".join(parts))
+    yield _done_event(t0, t_first, tokens, retrieval_ms, rerank_ms, (time.perf_counter() - t_llm) * 1000,
+                      token_counts, plan.applied, session=info)
+
+
+async def rag_query_batch_async(
+    questions: Sequence[str],
+    top_k: int = TOP_K_DEFAULT,
+    filters: Optional[Dict[str, Any]] = None,
+    max_concurrency: int = BATCH_LLM_CONCURRENCY,
+    deadline: Optional[Deadline] = None,
+    query_vectors: Optional[Sequence[Sequence[float]]] = None,
+) -> List[Dict[str, Any]]:
+    """Answer many questions at once. Retrieval is one batched call (one
+    encode, one Qdrant round trip); generations run concurrently, at most
+    `max_concurrency` at a time. Results keep the input order. A failed
+    item is returned as {"question", "error"} instead of failing the batch;
+    if the batched retrieval fails, each question is retrieved on its own so
+    only the failing ones error. `deadline` applies to the whole batch; each
+    item degrades on its own. `query_vectors` are the questions' embeddings,
+    when the caller has them."""
+
+    logger.info("RAG batch started | questions=%d | top_k=%s | filters=%s",
+                len(questions), top_k, filters)
+
+    t0 = time.perf_counter()
+
+    try:
+        retrieved_lists = await run_cpu(
+            retrieve_batch, list(questions), top_k=_fetch_k(top_k), filters=filters, with_payload=True,
+            query_vectors=query_vectors,
+        )
+    except Exception as exc:
+        # One batched call fails as a whole: retry each question on its own so
+        # a failure stays with the item that caused it
+        logger.warning("Batch retrieval failed, retrying per question | error=%s", exc)
+        retrieved_lists = await asyncio.gather(
+            *[
+                aretrieve(q, top_k=_fetch_k(top_k), filters=filters, with_payload=True,
+                          query_vector=query_vectors[i] if query_vectors is not None else None)
+                for i, q in enumerate(questions)
+            ],
+            return_exceptions=True,
+        )
+
+    logger.info("Batch retrieval completed | questions=%d | latency=%.2f ms",
+                len(questions), (time.perf_counter() - t0) * 1000)
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def answer_one(question: str, retrieved: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if isinstance(retrieved, Exception):
+            raise retrieved
+        t_item = time.perf_counter()
+        plan = Degradation(deadline)
+        _note_fallback(plan, retrieved)
+        if _below_threshold(retrieved):
+            return _no_answer(question, filters, top_k, t_item)
+
+        if _should_rerank(plan):
+            retrieved = await _arerank(question, retrieved, top_k)
+        elif ENABLE_RERANKING:
+            retrieved = _without_rerank(retrieved, top_k)
+
+        user_prompt, token_counts = await _abuild_prompt(question, retrieved, plan.context_budget())
+        async with semaphore:
+            # Time spent waiting for a slot counts against the deadline
+            provider = plan.llm_provider()
+            if plan.sources_only():
+                return _sources_only(question, retrieved, filters, top_k, t_item, plan, token_counts)
+            call = agenerate(SYSTEM_PROMPT, user_prompt, deadline=plan.at, provider=provider)
+            try:
+                answer = await (asyncio.wait_for(call, deadline.remaining_s()) if deadline else call)
+            except (asyncio.TimeoutError, LLMQueueTimeout):
+                if deadline is None:
+                    raise
+                plan.timed_out()
+                return _sources_only(question, retrieved, filters, top_k, t_item, plan, token_counts)
+            except Exception as exc:
+                if not _llm_unavailable(exc):
+                    raise
+                return _extractive(question, retrieved, filters, top_k, t_item, plan, token_counts, exc)
+        return _response(question, answer, _build_sources(retrieved), filters, top_k, t_item, token_counts,
+                         plan.applied)
+
+    outcomes = await asyncio.gather(
+        *[answer_one(q, r) for q, r in zip(questions, retrieved_lists)],
+        return_exceptions=True,
+    )
+
+    results: List[Dict[str, Any]] = []
+    for question, outcome in zip(questions, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error("RAG batch item failed | question=%s | error=%s", question, outcome)
+            results.append({"question": question, "error": str(outcome) or type(outcome).__name__})
+        else:
+            results.append(outcome)
+
+    logger.info("RAG batch finished | questions=%d | errors=%d | total_latency=%.2f ms",
+                len(questions), sum(1 for r in results if "error" in r),
+                (time.perf_counter() - t0) * 1000)
+    return results
+
+
+def rag_query_batch(
+    questions: Sequence[str],
+    top_k: int = TOP_K_DEFAULT,
+    filters: Optional[Dict[str, Any]] = None,
+    max_concurrency: int = BATCH_LLM_CONCURRENCY,
+    deadline: Optional[Deadline] = None,
+) -> List[Dict[str, Any]]:
+    """Blocking wrapper around `rag_query_batch_async` for scripts."""
+    return asyncio.run(rag_query_batch_async(questions, top_k, filters, max_concurrency, deadline))
+
+
 if __name__ == "__main__":
 
     out = rag_query(
@@ -0,0 +1,193 @@
+"""
+Semantic answer cache for paraphrased questions.
+
+The API answer cache is keyed on the lowercased question text, so "What is
+the notice period?" and "what's the notice period for termination?" both
+miss and each pays for a full LLM call. This cache keeps the embeddings of
+recently answered questions in a small in-memory matrix and serves a stored
+answer when a new question is close enough (cosine >= threshold) AND was
+asked with exactly the same filters and top_k, against the same index
+version (a reindex can change the answer).
+
+Entries live in a fixed-size ring buffer: one matrix product scores every
+cached question, and the oldest entry is overwritten when the buffer is full.
+A scope is forgotten once its last entry is overwritten, so the scope table
+stays as bounded as the buffer.
+
+Usage:
+    from rag_pipeline.semantic_cache import get_semantic_cache
+    cache = get_semantic_cache()
+    hit = cache.lookup(qvec, filters, top_k)      # -> (result, similarity) or None
+    cache.put(qvec, filters, top_k, result)
+
+Enable via: ENABLE_SEMANTIC_CACHE=true in .env
+"""
+import json
+import time
+import threading
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+
+from vectorstore.index_version import current_index_version
+from rag_pipeline.configs.settings import (
+    SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL_SECONDS,
+)
+
+_HIST_BINS = np.linspace(0.0, 1.0, 21)  # 0.05-wide similarity buckets
+
+
+def _scope(filters: Optional[Dict[str, Any]], top_k: int) -> str:
+    return json.dumps(
+        {"filters": filters or {}, "top_k": top_k, "index_version": current_index_version()},
+        sort_keys=True, default=str,
+    )
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        max_size: int = SEMANTIC_CACHE_SIZE,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS,
+    ):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # [max_size, dim], allocated on first put
+        self._scope_ids = np.full(max_size, -1, dtype=np.int64)
+        self._created = np.zeros(max_size, dtype=np.float64)
+        self._results: List[Optional[Dict[str, Any]]] = [None] * max_size
+        self._scopes: Dict[str, int] = {}
+        self._scope_keys: Dict[int, str] = {}
+        self._scope_rows: Dict[int, int] = {}  # scope id -> live slots
+        self._next_scope = 0
+        self._size = 0
+        self._next = 0
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self.lookups = 0
+        self.hits = 0
+        self._best_hist = np.zeros(len(_HIST_BINS) - 1, dtype=np.int64)
+        self._hit_similarities: List[float] = []
+
+    def lookup(
+        self,
+        qvec: Sequence[float],
+        filters: Optional[Dict[str, Any]],
+        top_k: int,
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        q = np.asarray(qvec, dtype=np.float32)
+        with self._lock:
+            self.lookups += 1
+            scope_id = self._scopes.get(_scope(filters, top_k))
+            if scope_id is None or self._vectors is None:
+                return None
+
+            n = self._size
+            live = (self._scope_ids[:n] == scope_id) & (self._created[:n] > time.time() - self.ttl_seconds)
+            if not live.any():
+                return None
+
+            sims = self._vectors[:n] @ q
+            sims[~live] = -np.inf
+            best = int(np.argmax(sims))
+            similarity = float(sims[best])
+            self._best_hist += np.histogram([min(max(similarity, 0.0), 1.0)], bins=_HIST_BINS)[0]
+            if similarity < self.threshold:
+                return None
+
+            self.hits += 1
+            self._hit_similarities.append(similarity)
+            if len(self._hit_similarities) > 10_000:
+                del self._hit_similarities[:5_000]
+            return dict(self._results[best]), similarity
+
+    def put(
+        self,
+        qvec: Sequence[float],
+        filters: Optional[Dict[str, Any]],
+        top_k: int,
+        result: Dict[str, Any],
+    ) -> None:
+        q = np.asarray(qvec, dtype=np.float32)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, q.shape[0]), dtype=np.float32)
+            scope = _scope(filters, top_k)
+            scope_id = self._scopes.get(scope)
+            if scope_id is None:
+                scope_id = self._scopes[scope] = self._next_scope
+                self._scope_keys[scope_id] = scope
+                self._next_scope += 1
+
+            slot = self._next
+            self._release(int(self._scope_ids[slot]))
+            self._scope_rows[scope_id] = self._scope_rows.get(scope_id, 0) + 1
+            self._vectors[slot] = q
+            self._scope_ids[slot] = scope_id
+            self._created[slot] = time.time()
+            self._results[slot] = dict(result)
+            self._next = (slot + 1) % self.max_size
+            self._size = min(self._size + 1, self.max_size)
+
+    def _release(self, scope_id: int) -> None:
+        """Drop one row of `scope_id` (an overwritten slot); forget the scope
+        with its last row."""
+        if scope_id < 0:
+            return
+        self._scope_rows[scope_id] -= 1
+        if not self._scope_rows[scope_id]:
+            del self._scope_rows[scope_id]
+            del self._scopes[self._scope_keys.pop(scope_id)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scope_ids[:] = -1
+            self._results = [None] * self.max_size
+            self._scopes.clear()
+            self._scope_keys.clear()
+            self._scope_rows.clear()
+            self._size = 0
+            self._next = 0
+            self._reset_stats()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hit_sims = np.asarray(self._hit_similarities, dtype=np.float64)
+            return {
+                "entries": self._size,
+                "scopes": len(self._scopes),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                # Best-match similarity of every lookup that had candidates
+                "best_similarity_histogram": {
+                    f"{lo:.2f}-{hi:.2f}": int(c)
+                    for lo, hi, c in zip(_HIST_BINS[:-1], _HIST_BINS[1:], self._best_hist)
+                    if c
+                },
+                "hit_similarity": {
+                    "min": round(float(hit_sims.min()), 4),
+                    "p50": round(float(np.percentile(hit_sims, 50)), 4),
+                    "p90": round(float(np.percentile(hit_sims, 90)), 4),
+                } if len(hit_sims) else {},
+            }
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    global _semantic_cache
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache()
+    return _semantic_cache
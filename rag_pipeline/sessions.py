@@ -0,0 +1,265 @@
+"""
+Multi-turn sessions that reuse retrieved context.
+
+Without sessions every follow-up ("and what about part-time staff?") runs
+the whole pipeline from scratch and the LLM never sees the earlier turns.
+A request that carries a `session_id` is answered within a server-side
+session holding:
+
+  - the last retrieval set (up to SESSION_MAX_CHUNKS candidates, before
+    reranking) and the filters it was fetched with;
+  - the condensed conversation: the last SESSION_HISTORY_TURNS questions,
+    each with the leading SESSION_ANSWER_CHARS of its answer.
+
+For a follow-up, the cached chunks are scored against the question: cosine
+with the chunks' stored vectors, fetched by id once per session (a chunk the
+index cannot return is embedded instead), in the index's projected space.
+The question's embedding is shared with the fresh retrieval, if any. The
+context policy picks one of:
+
+  reused    best score >= SESSION_REUSE_THRESHOLD: answer from the cached
+            chunks, best first. No retrieval, no reranking.
+  extended  best score >= SESSION_EXTEND_THRESHOLD: retrieve top_k more
+            chunks for "<first question> <follow-up>" (no widened fetch, no
+            reranking), merge them into the set and rank it as above.
+  fresh     otherwise, or when the filters changed: the normal pipeline,
+            whose candidates become the new session set.
+
+A session's first question does not depend on the conversation, so the API
+answers it from the answer and semantic caches when it can ("cached"): the
+answer is remembered and the next turn retrieves fresh.
+
+Reused and extended turns pack SESSION_FOLLOWUP_CONTEXT_FRACTION of
+CONTEXT_TOKEN_BUDGET, so follow-ups send smaller prompts. Every turn gets
+the condensed conversation in its prompt. Sessions expire after
+SESSION_TTL_SECONDS idle; beyond SESSION_MAX_SESSIONS the least recently
+used is dropped. Turn counts and prompt sizes per policy are in `stats()`
+(GET /metrics).
+
+Usage:
+    from rag_pipeline.sessions import get_session_store
+    from vectorstore.retriever import fetch_vectors
+    session = get_session_store().get("3f9c...")
+    session.add_vectors(fetch_vectors(session.missing_vectors(), session.filters))
+    ranked = session.rank(question, qvec)    # cached chunks, best first
+    mode = choose_context(session, ranked, filters, top_k)
+
+Enable via: "session_id" in the POST /query or /query/stream body
+"""
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Optional, Dict, Any, List, Sequence
+
+import numpy as np
+
+from rag_pipeline.context_packer import leading_sentences
+from rag_pipeline.configs.settings import (
+    CONTEXT_TOKEN_BUDGET, SESSION_TTL_SECONDS, SESSION_MAX_SESSIONS, SESSION_REUSE_THRESHOLD,
+    SESSION_EXTEND_THRESHOLD, SESSION_MAX_CHUNKS, SESSION_FOLLOWUP_CONTEXT_FRACTION,
+    SESSION_HISTORY_TURNS, SESSION_ANSWER_CHARS,
+)
+
+FRESH, EXTENDED, REUSED, CACHED = "fresh", "extended", "reused", "cached"
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm > 0 else v
+
+
+class Session:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.turn = 0
+        self.anchor = ""  # question the retrieval set was first fetched for
+        self.filters: Dict[str, Any] = {}
+        self.retrieved: List[Dict[str, Any]] = []
+        self.turns: deque = deque(maxlen=max(1, SESSION_HISTORY_TURNS))  # (question, condensed answer)
+        self.updated_at = time.time()
+        self._vectors: Dict[Any, np.ndarray] = {}  # chunk id -> normalised vector, index space
+        self._lock = threading.Lock()
+
+    # ── Context ──────────────────────────────────────────────────────────────
+    def missing_vectors(self) -> List[Dict[str, Any]]:
+        """Cached chunks whose vector has not been fetched yet."""
+        with self._lock:
+            return [h for h in self.retrieved if h["id"] not in self._vectors]
+
+    def add_vectors(self, vectors: Dict[Any, Sequence[float]]) -> None:
+        """Stored vectors of cached chunks (see retriever.fetch_vectors)."""
+        with self._lock:
+            ids = {h["id"] for h in self.retrieved}
+            for pid, v in vectors.items():
+                if pid in ids:
+                    self._vectors[pid] = _unit(v)
+
+    def _chunk_vectors(self, hits: List[Dict[str, Any]]) -> np.ndarray:
+        with self._lock:
+            missing = [h for h in hits if h["id"] not in self._vectors]
+        if missing:
+            from vectorstore.embedding_generator import embed_texts
+            from vectorstore.projection import project_queries
+            texts = [(h.get("payload") or {}).get("text") or "" for h in missing]
+            vectors = project_queries(embed_texts(texts, batch_size=64, show_progress=False, normalize=True))
+            with self._lock:
+                for h, v in zip(missing, vectors):
+                    self._vectors[h["id"]] = _unit(v)
+        with self._lock:
+            return np.stack([self._vectors[h["id"]] for h in hits])
+
+    def rank(self, question: str, query_vector: Optional[Sequence[float]] = None) -> List[Dict[str, Any]]:
+        """Cached chunks by cosine to `question`, best first, with that cosine
+        as "score". `query_vector` is the question's embedding if the caller
+        has it. CPU-bound, run it on the CPU pool."""
+        from vectorstore.projection import project_query
+        with self._lock:
+            hits = list(self.retrieved)
+        if not hits:
+            return []
+        if query_vector is None:
+            from vectorstore.embedding_generator import embed_text
+            query_vector = embed_text(question)
+        q = _unit(project_query(query_vector))
+        scores = self._chunk_vectors(hits) @ q
+        return [{**hits[i], "score": float(scores[i])} for i in np.argsort(-scores, kind="stable")]
+
+    def reset(self, question: str, retrieved: List[Dict[str, Any]], filters: Optional[Dict[str, Any]]) -> None:
+        """A fresh retrieval replaces the cached set."""
+        with self._lock:
+            self.anchor = question
+            self.filters = dict(filters or {})
+            self.retrieved = [dict(h) for h in retrieved[:SESSION_MAX_CHUNKS]]
+            ids = {h["id"] for h in self.retrieved}
+            self._vectors = {k: v for k, v in self._vectors.items() if k in ids}
+
+    def extend(self, hits: List[Dict[str, Any]]) -> int:
+        """Merge new hits into the set (oldest dropped beyond SESSION_MAX_CHUNKS); returns how many were new."""
+        with self._lock:
+            known = {h["id"] for h in self.retrieved}
+            new = [dict(h) for h in hits if h["id"] not in known]
+            self.retrieved = (self.retrieved + new)[-SESSION_MAX_CHUNKS:]
+            ids = {h["id"] for h in self.retrieved}
+            self._vectors = {k: v for k, v in self._vectors.items() if k in ids}
+        return len(new)
+
+    def followup_query(self, question: str) -> str:
+        # Follow-ups are often elliptical; retrieve for them in the thread's context
+        return f"{self.anchor} {question}".strip()
+
+    # ── Conversation ─────────────────────────────────────────────────────────
+    def history(self) -> str:
+        with self._lock:
+            turns = list(self.turns)
+        return "\n".join(f"Q: {q}\nA: {a}" for q, a in turns)
+
+    def remember(self, question: str, answer: str) -> None:
+        with self._lock:
+            self.turns.append((question, leading_sentences(answer, SESSION_ANSWER_CHARS)))
+
+    def is_new(self) -> bool:
+        """No answered turn and no retrieval set yet."""
+        with self._lock:
+            return not self.turns and not self.retrieved
+
+    def info(self, context: str) -> Dict[str, Any]:
+        return {"session_id": self.session_id, "turn": self.turn, "context": context}
+
+
+def choose_context(
+    session: Session, ranked: List[Dict[str, Any]], filters: Optional[Dict[str, Any]], top_k: int,
+) -> str:
+    """FRESH, EXTENDED or REUSED for a follow-up (see module doc)."""
+    if not ranked or (filters or {}) != session.filters:
+        return FRESH
+    best = ranked[0]["score"]
+    if best >= SESSION_REUSE_THRESHOLD and len(ranked) >= top_k:
+        return REUSED
+    if best >= SESSION_EXTEND_THRESHOLD:
+        return EXTENDED
+    return FRESH
+
+
+def followup_budget() -> int:
+    return max(1, int(CONTEXT_TOKEN_BUDGET * SESSION_FOLLOWUP_CONTEXT_FRACTION))
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = SESSION_MAX_SESSIONS, ttl_seconds: int = SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._turns = {FRESH: 0, EXTENDED: 0, REUSED: 0, CACHED: 0}
+        self._prompt_tokens = {FRESH: 0, EXTENDED: 0, REUSED: 0, CACHED: 0}
+        self.expired = 0
+        self.evicted = 0
+
+    def _expire(self, now: float) -> None:
+        stale = [sid for sid, s in self._sessions.items() if now - s.updated_at >= self.ttl_seconds]
+        for sid in stale:
+            del self._sessions[sid]
+        self.expired += len(stale)
+
+    def get(self, session_id: str) -> Session:
+        """The session for `session_id`, created on first use; starts a new turn."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            self._sessions.move_to_end(session_id)
+            session.updated_at = now
+            session.turn += 1
+            return session
+
+    def first_turn(self, session_id: str) -> bool:
+        """True if the next turn of `session_id` starts its conversation (an
+        unknown, expired or still empty session). Does not start a turn."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or time.time() - session.updated_at >= self.ttl_seconds:
+                return True
+        return session.is_new()
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def record(self, context: str, prompt_tokens: int) -> None:
+        with self._lock:
+            self._turns[context] += 1
+            self._prompt_tokens[context] += prompt_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expire(time.time())
+            return {
+                "active": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "turns": dict(self._turns),
+                "avg_prompt_tokens": {
+                    k: round(self._prompt_tokens[k] / n, 1) if n else 0.0 for k, n in self._turns.items()
+                },
+            }
+
+
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStore()
+    return _session_store
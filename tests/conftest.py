@@ -0,0 +1,11 @@
+import pytest
+
+from vectorstore import index_version
+
+
+@pytest.fixture
+def version_file(tmp_path, monkeypatch):
+    """Point the index version at a fresh file for the test."""
+    path = tmp_path / "index_version.json"
+    monkeypatch.setattr(index_version, "INDEX_VERSION_PATH", str(path))
+    return path
@@ -0,0 +1,50 @@
+import numpy as np
+
+from rag_pipeline.semantic_cache import SemanticCache
+from vectorstore import reranker
+from vectorstore.index_version import bump_index_version, current_index_version
+from vectorstore.retrieval_cache import RetrievalCache
+
+QVEC = [0.6, 0.8, 0.0]
+HITS = [{"id": 1, "score": 0.9, "payload": {"chunk_id": "c1", "text": "Four weeks notice."}}]
+
+
+def test_version_counts_every_bump(version_file):
+    assert current_index_version() == 0
+    bump_index_version("test")
+    bump_index_version("test")
+
+    assert current_index_version() == 2
+
+
+def test_retrieval_cache_misses_after_bump(version_file):
+    cache = RetrievalCache(max_size=8, ttl_seconds=60)
+    cache.put(cache.key(QVEC, 5, None, True, False), HITS)
+    assert cache.get(cache.key(QVEC, 5, None, True, False)) == HITS
+
+    bump_index_version("test")
+
+    assert cache.get(cache.key(QVEC, 5, None, True, False)) is None
+
+
+def test_semantic_cache_misses_after_bump(version_file):
+    cache = SemanticCache(max_size=8, threshold=0.9, ttl_seconds=60)
+    cache.put(np.asarray(QVEC), None, 5, {"answer": "Four weeks."})
+
+    bump_index_version("test")
+
+    assert cache.lookup(np.asarray(QVEC), None, 5) is None
+
+
+def test_rerank_scores_recomputed_after_bump(version_file, monkeypatch):
+    monkeypatch.setattr(reranker, "_score_cache", reranker._ScoreCache(8))
+    monkeypatch.setattr(reranker, "_get_cross_encoder", lambda: object())
+    monkeypatch.setattr(reranker, "truncate_pair", lambda encoder, query, text: text)
+
+    scores, todo = reranker._prepare("notice period", HITS)
+    reranker._finish([dict(h) for h in HITS], scores, todo, [3.5], top_k=1)
+    assert reranker._prepare("notice period", HITS)[1] == []
+
+    bump_index_version("test")
+
+    assert len(reranker._prepare("notice period", HITS)[1]) == 1
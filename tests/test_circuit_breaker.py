@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from rag_pipeline.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, guard
+
+
+def _breaker(**kwargs):
+    defaults = dict(window=4, min_calls=2, error_rate=0.5, slow_call_rate=1.0, open_seconds=0.05,
+                    half_open_probes=1)
+    return CircuitBreaker("test", slow_call_ms=1000, **{**defaults, **kwargs})
+
+
+def _fail(breaker):
+    with pytest.raises(ConnectionError):
+        with guard(breaker):
+            raise ConnectionError("down")
+
+
+def test_opens_after_the_error_rate_is_reached():
+    breaker = _breaker()
+    _fail(breaker)
+    assert breaker.state == CLOSED
+
+    _fail(breaker)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as err:
+        with guard(breaker):
+            pass
+    assert err.value.retry_after > 0
+
+
+def test_half_open_probe_success_closes():
+    breaker = _breaker()
+    _fail(breaker)
+    _fail(breaker)
+    time.sleep(0.06)
+
+    with guard(breaker) as call:
+        assert call.probe
+        assert breaker.state == HALF_OPEN
+        # Only one probe at a time
+        with pytest.raises(CircuitOpenError):
+            breaker.admit()
+
+    assert breaker.state == CLOSED
+    assert breaker.stats()["opened"] == 1
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = _breaker()
+    _fail(breaker)
+    _fail(breaker)
+    time.sleep(0.06)
+
+    _fail(breaker)
+
+    assert breaker.state == OPEN
+    assert breaker.stats()["opened"] == 2
+
+
+def test_slow_calls_open_the_breaker():
+    breaker = _breaker(slow_call_rate=0.5)
+    breaker.record(2.0, ok=True, probe=False)
+    breaker.record(2.0, ok=True, probe=False)
+
+    assert breaker.state == OPEN
@@ -0,0 +1,76 @@
+import numpy as np
+
+from vectorstore import bm25_index, local_index
+from vectorstore.bm25_index import BM25Index
+from vectorstore.index_version import VersionedSingleton, bump_index_version
+from vectorstore.local_index import LocalIndex
+
+
+def _chunks(n):
+    return [{"chunk_id": f"c{i}", "text": f"policy number {i} covers topic{i}"} for i in range(n)]
+
+
+def test_local_index_reloads_after_bump(tmp_path, version_file, monkeypatch):
+    index_dir = str(tmp_path / "local")
+    monkeypatch.setattr(local_index, "_local_index", VersionedSingleton(lambda: LocalIndex.load(index_dir)))
+    vectors = np.eye(4, dtype=np.float32)
+
+    index = LocalIndex.empty(4)
+    index.add([0, 1], vectors[:2], _chunks(2))
+    index.save(index_dir)
+    bump_index_version("test")
+    assert len(local_index.get_local_index()) == 2
+
+    index = LocalIndex.empty(4)
+    index.add([0, 1, 2], vectors[:3], _chunks(3))
+    index.save(index_dir)
+    bump_index_version("test")
+
+    hits = local_index.get_local_index().search(vectors[2], top_k=1)
+    assert hits[0]["id"] == 2
+    assert hits[0]["payload"]["chunk_id"] == "c2"
+
+
+def test_local_index_kept_without_bump(tmp_path, version_file, monkeypatch):
+    index_dir = str(tmp_path / "local")
+    monkeypatch.setattr(local_index, "_local_index", VersionedSingleton(lambda: LocalIndex.load(index_dir)))
+
+    index = LocalIndex.empty(4)
+    index.add([0], np.eye(4, dtype=np.float32)[:1], _chunks(1))
+    index.save(index_dir)
+    bump_index_version("test")
+    first = local_index.get_local_index()
+
+    assert local_index.get_local_index() is first
+
+
+def test_bm25_index_reloads_after_bump(tmp_path, version_file, monkeypatch):
+    index_dir = str(tmp_path / "bm25")
+    monkeypatch.setattr(bm25_index, "_bm25_index", VersionedSingleton(lambda: BM25Index.load(index_dir)))
+
+    BM25Index.build([0, 1], _chunks(2)).save(index_dir)
+    bump_index_version("test")
+    assert bm25_index.get_bm25_index().search("topic2", top_k=1) == []
+
+    BM25Index.build([0, 1, 2], _chunks(3)).save(index_dir)
+    bump_index_version("test")
+
+    hits = bm25_index.get_bm25_index().search("topic2", top_k=1)
+    assert [h["payload"]["chunk_id"] for h in hits] == ["c2"]
+
+
+def test_missing_fallback_is_cached_until_bump(version_file):
+    calls = []
+
+    def load():
+        calls.append(1)
+        return None if len(calls) == 1 else "index"
+
+    singleton = VersionedSingleton(load)
+    assert singleton.get() is None
+    assert singleton.get() is None
+    assert len(calls) == 1
+
+    bump_index_version("test")
+    assert singleton.get() == "index"
+    assert len(calls) == 2
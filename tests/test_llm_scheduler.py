@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import pytest
+
+from rag_pipeline import llm_scheduler
+from rag_pipeline.llm_scheduler import LLMQueueTimeout, RateLimitScheduler
+
+MESSAGES = [{"role": "user", "content": "How many days of annual leave do I get?"}]
+
+
+def test_call_past_its_deadline_is_rejected():
+    scheduler = RateLimitScheduler("test", rpm=1, tpm=0, headroom=1.0)
+    scheduler.acquire(MESSAGES)
+
+    t0 = time.monotonic()
+    with pytest.raises(LLMQueueTimeout) as err:
+        scheduler.acquire(MESSAGES, deadline=time.monotonic() + 0.05)
+
+    # Rejected up front: the bucket refills in ~60 s, far past the deadline
+    assert time.monotonic() - t0 < 0.05
+    assert err.value.retry_after >= 1.0
+    stats = scheduler.stats()
+    assert stats["rejected"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_async_call_past_its_deadline_is_rejected():
+    scheduler = RateLimitScheduler("test", rpm=1, tpm=0, headroom=1.0)
+
+    async def run():
+        await scheduler.aacquire(MESSAGES)
+        await scheduler.aacquire(MESSAGES, deadline=time.monotonic() + 0.05)
+
+    with pytest.raises(LLMQueueTimeout):
+        asyncio.run(run())
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_call_within_its_deadline_is_admitted():
+    # 600 rpm refills one request every 0.1 s
+    scheduler = RateLimitScheduler("test", rpm=600, tpm=0, headroom=1.0)
+    scheduler.requests.level = 0.0
+
+    scheduler.acquire(MESSAGES, deadline=time.monotonic() + 1.0)
+
+    assert scheduler.stats()["admitted"] == 1
+
+
+def test_unlimited_scheduler_skips_the_token_estimate(monkeypatch):
+    def estimate(messages):
+        raise AssertionError("estimate_tokens called for an unlimited provider")
+
+    monkeypatch.setattr(llm_scheduler, "estimate_tokens", estimate)
+    scheduler = RateLimitScheduler("test", rpm=0, tpm=0)
+
+    assert not scheduler.limited
+    assert scheduler.acquire(MESSAGES) == 0
+    assert asyncio.run(scheduler.aacquire(MESSAGES)) == 0
+
+
+def test_provider_limit_overrides_the_global(monkeypatch):
+    monkeypatch.setenv("LLM_TPM_LIMIT_GROQ", "6000")
+
+    assert llm_scheduler.provider_limit("TPM", "groq", 100) == 6000
+    assert llm_scheduler.provider_limit("TPM", "openai", 100) == 100
+    assert RateLimitScheduler("groq", rpm=0, headroom=1.0).tokens.capacity == 6000
@@ -0,0 +1,48 @@
+import numpy as np
+
+from rag_pipeline.semantic_cache import SemanticCache
+
+ANSWER = {"question": "What is the notice period?", "answer": "Four weeks.", "sources": []}
+
+
+def _unit(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_close_question_hits(version_file):
+    cache = SemanticCache(max_size=8, threshold=0.9, ttl_seconds=60)
+    cache.put(_unit(1, 0, 0), {"department": "HR"}, 5, ANSWER)
+
+    hit = cache.lookup(_unit(1, 0.1, 0), {"department": "HR"}, 5)
+
+    assert hit is not None
+    result, similarity = hit
+    assert result["answer"] == "Four weeks."
+    assert similarity >= 0.9
+
+
+def test_question_below_threshold_misses(version_file):
+    cache = SemanticCache(max_size=8, threshold=0.9, ttl_seconds=60)
+    cache.put(_unit(1, 0, 0), None, 5, ANSWER)
+
+    assert cache.lookup(_unit(1, 1, 0), None, 5) is None  # cosine 0.71
+
+
+def test_other_filters_or_top_k_miss(version_file):
+    cache = SemanticCache(max_size=8, threshold=0.9, ttl_seconds=60)
+    cache.put(_unit(1, 0, 0), {"department": "HR"}, 5, ANSWER)
+
+    assert cache.lookup(_unit(1, 0, 0), {"department": "Legal"}, 5) is None
+    assert cache.lookup(_unit(1, 0, 0), None, 5) is None
+    assert cache.lookup(_unit(1, 0, 0), {"department": "HR"}, 3) is None
+
+
+def test_scope_is_dropped_with_its_last_entry(version_file):
+    cache = SemanticCache(max_size=2, threshold=0.9, ttl_seconds=60)
+    for department in ("HR", "Legal", "Finance"):
+        cache.put(_unit(1, 0, 0), {"department": department}, 5, ANSWER)
+
+    assert cache.stats()["scopes"] == 2
+    assert cache.lookup(_unit(1, 0, 0), {"department": "HR"}, 5) is None
+    assert cache.lookup(_unit(1, 0, 0), {"department": "Finance"}, 5) is not None
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from rag_pipeline.sessions import CACHED, Session, SessionStore
+from vectorstore import embedding_generator, projection
+
+
+@pytest.fixture
+def no_encoder(monkeypatch):
+    """Fail the test if anything is encoded; no projection configured."""
+    def encode(*args, **kwargs):
+        raise AssertionError("encoder called")
+
+    monkeypatch.setattr(embedding_generator, "embed_texts", encode)
+    monkeypatch.setattr(embedding_generator, "embed_text", encode)
+    monkeypatch.setattr(projection, "get_projection", lambda: None)
+
+
+def _hits(n):
+    return [{"id": i, "score": 0.0, "payload": {"text": f"chunk {i}"}} for i in range(n)]
+
+
+def test_rank_uses_stored_vectors_and_query_vector(no_encoder):
+    session = Session("s")
+    session.reset("notice period?", _hits(3), None)
+    assert [h["id"] for h in session.missing_vectors()] == [0, 1, 2]
+
+    session.add_vectors({0: [1, 0, 0], 1: [0, 2, 0], 2: [0, 0, 1], 7: [1, 1, 1]})
+    assert session.missing_vectors() == []
+
+    ranked = session.rank("and for contractors?", query_vector=[0, 1, 0.1])
+    assert [h["id"] for h in ranked] == [1, 2, 0]
+    assert ranked[0]["score"] == pytest.approx(1 / np.sqrt(1.01))
+
+
+def test_extend_leaves_only_new_chunks_missing(no_encoder):
+    session = Session("s")
+    session.reset("notice period?", _hits(2), None)
+    session.add_vectors({0: [1, 0], 1: [0, 1]})
+
+    session.extend(_hits(3))
+
+    assert [h["id"] for h in session.missing_vectors()] == [2]
+
+
+def test_first_turn_until_answered():
+    store = SessionStore(max_sessions=4, ttl_seconds=60)
+    assert store.first_turn("s")
+
+    session = store.get("s")
+    assert store.first_turn("s")
+
+    session.remember("notice period?", "Four weeks.")
+    store.record(CACHED, 0)
+    assert not store.first_turn("s")
+    assert store.stats()["turns"][CACHED] == 1
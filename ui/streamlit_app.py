@@ -1,5 +1,6 @@
 import json
 import os
+import uuid
 
 import requests
 import streamlit as st
@@ -11,6 +12,24 @@ st.set_page_config(
 )
 
 BACKEND_DEFAULT = os.getenv("BACKEND_URL", "http://localhost:8000")
+REQUEST_TIMEOUT_S = 60
+# Ask the backend to degrade (skip rerank, smaller context, sources only) before the UI gives up
+DEADLINE_MS = float(os.getenv("UI_DEADLINE_MS", str((REQUEST_TIMEOUT_S - 5) * 1000)))
+
+DEGRADED_LABELS = {
+    "skip_rerank": "reranking skipped",
+    "shrink_context": "context shortened",
+    "fast_model": "faster model used",
+    "sources_only": "no answer generated, sources only",
+    "retrieval_fallback": "search index unavailable, answered from a snapshot",
+    "extractive_answer": "answer service unavailable, top passages shown",
+}
+
+CONTEXT_LABELS = {
+    "fresh": "new search",
+    "extended": "previous documents plus a narrow search",
+    "reused": "previous documents reused",
+}
 
 st.sidebar.title("⚙️ Configuration")
 
@@ -57,6 +76,17 @@ st.caption("Powered by Groq LLM + Qdrant vector search")
 
 if "history" not in st.session_state:
     st.session_state.history = []
+# Follow-up questions are answered in the context of this conversation on the backend
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+if st.sidebar.button("New conversation"):
+    try:
+        requests.delete(f"{backend_url}/sessions/{st.session_state.session_id}", timeout=3)
+    except Exception:
+        pass  # the backend session expires on its own
+    st.session_state.session_id = uuid.uuid4().hex
+    st.session_state.history = []
 
 question = st.text_area(
     "Ask a compliance or HR policy question:",
@@ -81,35 +111,65 @@ if submitted and question.strip():
         "question": question.strip(),
         "top_k": top_k,
         "filters": filters if filters else None,
+        "deadline_ms": DEADLINE_MS,
+        "session_id": st.session_state.session_id,
     }
 
-    with st.spinner("Querying backend..."):
-        try:
-            resp = requests.post(
-                f"{backend_url}/query",
-                json=payload,
-                timeout=60,
-            )
+    result: dict = {"answer": "", "sources": []}
+    timing: dict = {}
+    status = st.empty()
+    st.markdown("### Answer")
+    answer_box = st.empty()
+    status.info("Retrieving documents...")
+    try:
+        # Server-Sent Events: sources, then tokens, then the timing record
+        with requests.post(
+            f"{backend_url}/query/stream",
+            json=payload,
+            stream=True,
+            timeout=(5, REQUEST_TIMEOUT_S),
+        ) as resp:
             resp.raise_for_status()
-            result = resp.json()
-        except requests.exceptions.ConnectionError:
-            st.error(f"Cannot connect to backend at **{backend_url}**. Is FastAPI running?")
-            st.stop()
-        except requests.exceptions.Timeout:
-            st.error("Request timed out after 60 seconds.")
-            st.stop()
-        except requests.exceptions.HTTPError:
-            st.error(f"Backend error {resp.status_code}: {resp.text[:300]}")
-            st.stop()
-
-    latency = result.get("latency_ms", -1)
-    if latency == 0.0:
-        st.info("Result served from cache")
+            event = "message"
+            for line in resp.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                    continue
+                if not line.startswith("data:"):
+                    continue
+                data = json.loads(line[len("data:"):])
+                if event == "sources":
+                    result.update(data)
+                    status.info("Generating answer...")
+                elif event == "token":
+                    result["answer"] += data["text"]
+                    answer_box.markdown(result["answer"] + "▌")
+                elif event == "done":
+                    timing = data
+                elif event == "error":
+                    st.error(f"Backend error: {data.get('detail')}")
+                    st.stop()
+    except requests.exceptions.ConnectionError:
+        st.error(f"Cannot connect to backend at **{backend_url}**. Is FastAPI running?")
+        st.stop()
+    except requests.exceptions.Timeout:
+        st.error(f"Request timed out after {REQUEST_TIMEOUT_S} seconds.")
+        st.stop()
+    except requests.exceptions.HTTPError:
+        st.error(f"Backend error {resp.status_code}: {resp.text[:300]}")
+        st.stop()
+
+    answer_box.markdown(result["answer"])
+    latency = timing.get("latency_ms", -1)
+    ttft = timing.get("ttft_ms", -1)
+    if timing.get("cached"):
+        status.info("Result served from cache")
     else:
-        st.success(f"Response received in **{latency:.0f} ms**")
-
-    st.markdown("### Answer")
-    st.markdown(result["answer"])
+        status.success(f"First token in **{ttft:.0f} ms** · complete in {latency:.0f} ms")
+    if timing.get("degraded"):
+        st.warning("Answered under the time budget: "
+                   + ", ".join(DEGRADED_LABELS.get(d, d) for d in timing["degraded"]))
+    session = timing.get("session") or {}
 
     sources = result.get("sources", [])
     with st.expander(f"Sources ({len(sources)} documents retrieved)"):
@@ -131,13 +191,16 @@ if submitted and question.strip():
             st.write("No sources returned.")
 
     st.caption(
-        f"Latency: {latency:.0f} ms | top_k: {result.get('top_k')} | "
+        f"TTFT: {ttft:.0f} ms | Latency: {latency:.0f} ms | top_k: {result.get('top_k')} | "
         f"filters: {json.dumps(result.get('filters', {}))}"
+        + (f" | turn {session['turn']}: {CONTEXT_LABELS.get(session.get('context'), session.get('context'))}"
+           if session.get("context") else "")
     )
 
     st.session_state.history.insert(0, {
         "question": question.strip(),
         "answer": result["answer"],
+        "ttft_ms": ttft,
         "latency_ms": latency,
         "n_sources": len(sources),
     })
@@ -147,6 +210,7 @@ if st.session_state.history:
         for item in st.session_state.history[:10]:
             st.markdown(f"**Q:** {item['question']}")
             st.caption(
-                f"Latency: {item['latency_ms']:.0f} ms | Sources: {item['n_sources']}"
+                f"TTFT: {item['ttft_ms']:.0f} ms | Latency: {item['latency_ms']:.0f} ms | "
+                f"Sources: {item['n_sources']}"
             )
             st.divider()
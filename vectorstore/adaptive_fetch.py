@@ -0,0 +1,196 @@
+"""
+Adaptive fetch size for dense retrieval.
+
+A fixed fetch (top_k, or top_k * 3 with reranking) transfers chunks that are
+then dropped by the score threshold, the reranker or the CONTEXT_TOKEN_BUDGET
+in build_prompt. Adaptive fetch asks for a small first page and
+keeps only the hits scoring at least max(SCORE_THRESHOLD, ADAPTIVE_DROP_RATIO
+* best score). It widens the page (doubling, up to `max_k`) only when fewer
+than `top_k` hits qualify AND every fetched hit qualified, i.e. the
+drop-off has not been reached yet and a larger page can still add
+candidates.
+
+Only the first page carries payloads. A widened page fetches just its new
+tail (`offset` = hits already seen), with ids and scores only, and the
+payloads of the tail hits that make the kept set are fetched once by id
+afterwards (`fetch_payloads`), so no point is transferred twice.
+
+Candidates kept per query and payload bytes transferred are logged and
+aggregated in `adaptive_fetch_stats()`.
+
+Usage:
+    from vectorstore.adaptive_fetch import adaptive_retrieve
+    hits = adaptive_retrieve(question, top_k=5, max_k=15, filters=filters)
+
+Enable via: ADAPTIVE_FETCH=true in .env (dense retrieval mode)
+"""
+import json
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+from vectorstore.embedding_generator import embed_text
+from vectorstore.retriever import search, asearch, fetch_payloads, afetch_payloads
+from vectorstore.cpu_pool import run_cpu
+from rag_pipeline.configs.settings import SCORE_THRESHOLD, ADAPTIVE_FIRST_PAGE, ADAPTIVE_DROP_RATIO
+
+logger = logging.getLogger(__name__)
+
+_stats = {"queries": 0, "pages": 0, "widened": 0, "fetched": 0, "candidates": 0, "bytes": 0}
+_stats_lock = threading.Lock()
+
+
+def adaptive_cutoff(hits: List[Dict[str, Any]], drop_ratio: float = ADAPTIVE_DROP_RATIO) -> List[Dict[str, Any]]:
+    """Hits (sorted by score) above the absolute and relative score floor."""
+    if not hits:
+        return []
+    floor = max(SCORE_THRESHOLD, float(hits[0]["score"]) * drop_ratio)
+    return [h for h in hits if float(h["score"]) >= floor]
+
+
+def _payload_bytes(hits: List[Dict[str, Any]]) -> int:
+    return sum(len(json.dumps(h.get("payload") or {}, default=str)) for h in hits)
+
+
+def _next_page(page: int, hits: List[Dict[str, Any]], kept: List[Dict[str, Any]], top_k: int, max_k: int) -> int:
+    """Size of the next page, or 0 to stop."""
+    saturated = len(hits) == page and len(kept) == len(hits)
+    if len(kept) >= top_k or not saturated or page >= max_k:
+        return 0
+    return min(page * 2, max_k)
+
+
+def _extend(hits: List[Dict[str, Any]], tail: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # An approximate index may rank a boundary point again in the tail
+    seen = {h["id"] for h in hits}
+    return hits + [h for h in tail if h["id"] not in seen]
+
+
+def _first_page_payloads(
+    kept: List[Dict[str, Any]], first: Dict[Any, Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(kept hits with the first page's payloads, kept hits still without one)."""
+    kept = [first.get(h["id"], h) for h in kept]
+    return kept, [h for h in kept if h["id"] not in first]
+
+
+def _merge_payloads(kept: List[Dict[str, Any]], filled: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    by_id = {h["id"]: h for h in filled}
+    return [by_id.get(h["id"], h) for h in kept]
+
+
+def _record(pages: int, fetched: int, kept: int, n_bytes: int) -> None:
+    with _stats_lock:
+        _stats["queries"] += 1
+        _stats["pages"] += pages
+        _stats["widened"] += 1 if pages > 1 else 0
+        _stats["fetched"] += fetched
+        _stats["candidates"] += kept
+        _stats["bytes"] += n_bytes
+        avg_candidates = _stats["candidates"] / _stats["queries"]
+        avg_bytes = _stats["bytes"] / _stats["queries"]
+    logger.info(
+        "Adaptive fetch | pages=%d | fetched=%d | kept=%d | bytes=%d | avg_candidates=%.1f | avg_bytes=%.0f",
+        pages, fetched, kept, n_bytes, avg_candidates, avg_bytes,
+    )
+
+
+def adaptive_search(
+    qvec: Sequence[float],
+    top_k: int = 5,
+    max_k: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """Adaptive `search` with an already-embedded query; returns (hits, info).
+    `fetched` counts distinct points transferred, `bytes` their payloads."""
+    max_k = max(max_k or top_k, top_k)
+    page = max(1, min(ADAPTIVE_FIRST_PAGE, max_k))
+    pages = 0
+    hits: List[Dict[str, Any]] = []
+    while page:
+        tail = search(
+            qvec, top_k=page - len(hits), filters=filters, with_payload=with_payload and not pages, offset=len(hits),
+        )
+        hits = _extend(hits, tail)
+        if not pages:
+            first = {h["id"]: h for h in hits}
+        kept = adaptive_cutoff(hits)
+        pages += 1
+        page = _next_page(page, hits, kept, top_k, max_k)
+
+    kept, missing = _first_page_payloads(kept, first)
+    n_bytes = _payload_bytes(list(first.values()))
+    if with_payload and missing:
+        filled = fetch_payloads(missing, filters)
+        n_bytes += _payload_bytes(filled)
+        kept = _merge_payloads(kept, filled)
+    return kept, {"pages": pages, "fetched": len(hits), "bytes": n_bytes}
+
+
+async def aadaptive_search(
+    qvec: Sequence[float],
+    top_k: int = 5,
+    max_k: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    max_k = max(max_k or top_k, top_k)
+    page = max(1, min(ADAPTIVE_FIRST_PAGE, max_k))
+    pages = 0
+    hits: List[Dict[str, Any]] = []
+    while page:
+        tail = await asearch(
+            qvec, top_k=page - len(hits), filters=filters, with_payload=with_payload and not pages, offset=len(hits),
+        )
+        hits = _extend(hits, tail)
+        if not pages:
+            first = {h["id"]: h for h in hits}
+        kept = adaptive_cutoff(hits)
+        pages += 1
+        page = _next_page(page, hits, kept, top_k, max_k)
+
+    kept, missing = _first_page_payloads(kept, first)
+    n_bytes = _payload_bytes(list(first.values()))
+    if with_payload and missing:
+        filled = await afetch_payloads(missing, filters)
+        n_bytes += _payload_bytes(filled)
+        kept = _merge_payloads(kept, filled)
+    return kept, {"pages": pages, "fetched": len(hits), "bytes": n_bytes}
+
+
+def adaptive_retrieve(
+    query: str,
+    top_k: int = 5,
+    max_k: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+) -> List[Dict[str, Any]]:
+    """Dense retrieval returning between 0 and `max_k` hits (see module doc)."""
+    kept, info = adaptive_search(embed_text(query), top_k, max_k, filters, with_payload)
+    _record(info["pages"], info["fetched"], len(kept), info["bytes"])
+    return kept
+
+
+async def aadaptive_retrieve(
+    query: str,
+    top_k: int = 5,
+    max_k: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+    query_vector: Optional[Sequence[float]] = None,
+) -> List[Dict[str, Any]]:
+    qvec = query_vector if query_vector is not None else await run_cpu(embed_text, query)
+    kept, info = await aadaptive_search(qvec, top_k, max_k, filters, with_payload)
+    _record(info["pages"], info["fetched"], len(kept), info["bytes"])
+    return kept
+
+
+def adaptive_fetch_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    n = stats["queries"]
+    stats["avg_candidates"] = round(stats["candidates"] / n, 2) if n else 0.0
+    stats["avg_fetched"] = round(stats["fetched"] / n, 2) if n else 0.0
+    stats["avg_bytes"] = round(stats["bytes"] / n, 1) if n else 0.0
+    return stats
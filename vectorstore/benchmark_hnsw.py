@@ -0,0 +1,81 @@
+import os, time, argparse, statistics
+from typing import List
+
+import numpy as np
+
+from vectorstore.hnsw_index import HNSWIndex
+from vectorstore.evaluation import load_queries, percentile, QUERIES_PATH
+from rag_pipeline.configs.settings import HNSW_INDEX_DIR
+
+REPORT_PATH = os.path.join("evaluation", "hnsw_benchmark.md")
+
+
+def build_query_vectors(index: HNSWIndex, n_corpus: int, seed: int = 0) -> np.ndarray:
+    """Eval queries (embedded) plus noisy copies of random corpus vectors."""
+    from vectorstore.embedding_generator import embed_texts
+    from vectorstore.projection import project_queries
+
+    queries = [q["query"] for q in load_queries(QUERIES_PATH)]
+    vecs: List[np.ndarray] = [np.asarray(project_queries(embed_texts(queries, normalize=True)), dtype=np.float32)]
+
+    if n_corpus > 0 and len(index) > 0:
+        rng = np.random.default_rng(seed)
+        rows = rng.integers(0, len(index), size=n_corpus)
+        noisy = np.asarray(index.vectors[rows], dtype=np.float32)
+        noisy = noisy + 0.05 * rng.standard_normal(noisy.shape).astype(np.float32)
+        vecs.append(noisy)
+
+    return np.vstack(vecs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HNSW recall@k vs latency against exact search")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--ef", type=str, default="16,32,64,128,256")
+    parser.add_argument("--corpus-queries", type=int, default=200)
+    args = parser.parse_args()
+
+    index = HNSWIndex.load(HNSW_INDEX_DIR)
+    queries = build_query_vectors(index, args.corpus_queries)
+    k = args.k
+
+    # Ground truth + exact latency
+    exact_lat: List[float] = []
+    truth = []
+    for q in queries:
+        t0 = time.perf_counter()
+        hits = index.exact_search(q, top_k=k, with_payload=False)
+        exact_lat.append((time.perf_counter() - t0) * 1000.0)
+        truth.append({h["id"] for h in hits})
+
+    rows = []
+    for ef in [int(x) for x in args.ef.split(",") if x.strip()]:
+        lat: List[float] = []
+        recalls: List[float] = []
+        for q, gt in zip(queries, truth):
+            t0 = time.perf_counter()
+            hits = index.search(q, top_k=k, with_payload=False, ef_search=ef)
+            lat.append((time.perf_counter() - t0) * 1000.0)
+            recalls.append(len({h["id"] for h in hits} & gt) / max(len(gt), 1))
+        rows.append((ef, statistics.mean(recalls), statistics.mean(lat), percentile(lat, 95)))
+
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        f.write("# HNSW Benchmark (recall vs latency)\n\n")
+        f.write(f"- Index: `{HNSW_INDEX_DIR}` (**{len(index)}** chunks, dim={index.dim}, M={index.m})\n")
+        f.write(f"- Queries: **{len(queries)}** ({len(queries) - args.corpus_queries} eval + {args.corpus_queries} perturbed corpus)\n")
+        f.write(f"- Top-K: **{k}**\n\n")
+        f.write("| Search | Recall@K | Latency avg (ms) | Latency p95 (ms) |\n")
+        f.write("|---|---:|---:|---:|\n")
+        f.write(f"| exact | 1.0000 | {statistics.mean(exact_lat):.3f} | {percentile(exact_lat, 95):.3f} |\n")
+        for ef, rec, avg_ms, p95_ms in rows:
+            f.write(f"| hnsw ef={ef} | {rec:.4f} | {avg_ms:.3f} | {p95_ms:.3f} |\n")
+
+    print(f"exact        latency avg {statistics.mean(exact_lat):.3f} ms")
+    for ef, rec, avg_ms, p95_ms in rows:
+        print(f"ef={ef:<5} recall@{k}={rec:.4f} latency avg {avg_ms:.3f} ms p95 {p95_ms:.3f} ms")
+    print(f"Report: {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
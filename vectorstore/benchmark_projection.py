@@ -0,0 +1,125 @@
+import os, time, argparse, statistics
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+from vectorstore.local_index import LocalIndex
+from vectorstore.projection import fit_pca, matryoshka
+from vectorstore.evaluation import load_queries, percentile, QUERIES_PATH, TOP_K
+from rag_pipeline.configs.settings import SNAPSHOT_DIR, LOCAL_INDEX_DIR
+
+REPORT_PATH = os.path.join("evaluation", "projection_benchmark.md")
+
+
+def load_corpus(snapshot_dir: str) -> Tuple[List[int], np.ndarray, List[Dict[str, Any]], str]:
+    """Full-dimension ids, vectors and payloads from a snapshot, else the local index."""
+    if os.path.exists(os.path.join(snapshot_dir, "manifest.json")):
+        from vectorstore.snapshot import read_manifest, load_shard
+        manifest = read_manifest(snapshot_dir)
+        if manifest.get("projection"):
+            raise ValueError(f"Snapshot {snapshot_dir} holds reduced vectors; export one built without VECTOR_REDUCTION")
+        shards = [load_shard(snapshot_dir, s["name"]) for s in manifest["shards"]]
+        ids = [int(i) for s in shards for i in s[0]]
+        vectors = np.vstack([np.asarray(s[1], dtype=np.float32) for s in shards])
+        payloads = [p for s in shards for p in s[2]]
+        return ids, vectors, payloads, snapshot_dir
+
+    index = LocalIndex.load(LOCAL_INDEX_DIR)
+    points = list(index.iter_points())
+    vectors = np.vstack([np.asarray(v, dtype=np.float32) for _, v, _ in points])
+    return [p[0] for p in points], vectors, [p[2] for p in points], LOCAL_INDEX_DIR
+
+
+def doc_recall(results: List[Dict[str, Any]], expected: str) -> float:
+    return 1.0 if expected in [str((r.get("payload") or {}).get("doc_id", "")) for r in results] else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k loss vs memory and latency of reduced vectors")
+    parser.add_argument("--dims", type=str, default="64,128,192")
+    parser.add_argument("--snapshot", default=SNAPSHOT_DIR, help="full-dimension snapshot (falls back to the local index)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per query")
+    parser.add_argument("--no-matryoshka", action="store_true", help="only benchmark PCA")
+    args = parser.parse_args()
+
+    from vectorstore.embedding_generator import embed_texts
+
+    ids, corpus, payloads, source = load_corpus(args.snapshot)
+    queries = load_queries(QUERIES_PATH)
+    qvecs = np.asarray(embed_texts([q["query"] for q in queries], normalize=True), dtype=np.float32)
+    print(f"Corpus: {len(ids)} vectors, dim={corpus.shape[1]} ({source}); queries: {len(queries)}")
+
+    def run(label: str, index: LocalIndex, vecs: np.ndarray) -> Dict[str, Any]:
+        lat: List[float] = []
+        recalls: List[float] = []
+        results = []
+        for q, qvec in zip(queries, vecs):
+            filters = q.get("filters", {})
+            hits = index.search(qvec, TOP_K, filters)
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                index.search(qvec, TOP_K, filters)
+                lat.append((time.perf_counter() - t0) * 1000.0)
+            results.append(hits)
+            expected = str(q.get("expected_doc_id", "")).strip()
+            if expected:
+                recalls.append(doc_recall(hits, expected))
+        return {
+            "label": label,
+            "dim": index.dim,
+            "results": results,
+            "recall": statistics.mean(recalls) if recalls else 0.0,
+            "mem_mb": index.vectors.nbytes / 1e6,
+            "avg_ms": statistics.mean(lat) if lat else 0.0,
+            "p95_ms": percentile(lat, 95),
+        }
+
+    def build(vectors: np.ndarray) -> LocalIndex:
+        index = LocalIndex.empty(vectors.shape[1])
+        index.add(ids, vectors, payloads)
+        return index
+
+    full = run("full", build(corpus), qvecs)
+    runs = [full]
+    for dim in [int(x) for x in args.dims.split(",") if x.strip()]:
+        pca = fit_pca(corpus, dim)
+        r = run(f"pca-{dim}", build(pca.apply(corpus)), pca.apply(qvecs))
+        r["explained"] = pca.explained_variance
+        runs.append(r)
+        if not args.no_matryoshka:
+            m = matryoshka(dim)
+            runs.append(run(f"matryoshka-{dim}", build(m.apply(corpus)), m.apply(qvecs)))
+
+    # Recall@k of the reduced search against the full-dimension top-k
+    for r in runs:
+        overlaps = []
+        for hits, base in zip(r["results"], full["results"]):
+            base_ids = {h["id"] for h in base}
+            if base_ids:
+                overlaps.append(len({h["id"] for h in hits} & base_ids) / len(base_ids))
+        r["overlap"] = statistics.mean(overlaps) if overlaps else 0.0
+
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        f.write("# Vector Projection Benchmark Report\n\n")
+        f.write(f"- Corpus: **{len(ids)}** vectors, dim **{corpus.shape[1]}** (`{source}`)\n")
+        f.write(f"- Queries: **{len(queries)}** (`{QUERIES_PATH}`), filters applied\n")
+        f.write(f"- Top-K: **{TOP_K}**; exact search on the in-process index\n")
+        f.write("- Matryoshka rows are truncation only; all-MiniLM-L6-v2 is not Matryoshka-trained\n\n")
+        f.write(f"| Vectors | Dim | Recall@{TOP_K} vs full | Recall@{TOP_K} (expected doc) | Memory (MB) "
+                f"| Latency avg (ms) | Latency p95 (ms) | Explained var. |\n")
+        f.write("|---|---:|---:|---:|---:|---:|---:|---:|\n")
+        for r in runs:
+            explained = f"{r['explained']:.3f}" if "explained" in r else "-"
+            f.write(f"| {r['label']} | {r['dim']} | {r['overlap']:.4f} | {r['recall']:.4f} | {r['mem_mb']:.2f} "
+                    f"| {r['avg_ms']:.3f} | {r['p95_ms']:.3f} | {explained} |\n")
+
+    for r in runs:
+        print(f"{r['label']:<16} dim={r['dim']:<4} recall@{TOP_K}_vs_full={r['overlap']:.4f} "
+              f"doc_recall={r['recall']:.4f} mem={r['mem_mb']:.2f} MB "
+              f"avg={r['avg_ms']:.3f} ms p95={r['p95_ms']:.3f} ms")
+    print(f"Report: {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
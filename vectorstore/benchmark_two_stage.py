@@ -0,0 +1,85 @@
+import os, time, argparse, statistics
+from typing import Dict, Any, List
+
+from vectorstore.retriever import _backend_search
+from vectorstore.doc_index import two_stage_search
+from vectorstore.embedding_generator import embed_texts
+from vectorstore.projection import project_queries
+from vectorstore.evaluation import load_queries, percentile, QUERIES_PATH, TOP_K
+
+REPORT_PATH = os.path.join("evaluation", "two_stage_report.md")
+
+
+def doc_recall(results: List[Dict[str, Any]], expected: str) -> float:
+    return 1.0 if expected in [str((r.get("payload") or {}).get("doc_id", "")) for r in results] else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Two-stage (doc -> chunk) vs single-stage retrieval")
+    parser.add_argument("--docs", type=str, default="1,2,3,5", help="candidate document counts to try")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per query")
+    args = parser.parse_args()
+
+    queries = load_queries(QUERIES_PATH)
+    qvecs = project_queries(embed_texts([q["query"] for q in queries], normalize=True))
+
+    def run(label: str, fn) -> Dict[str, Any]:
+        lat: List[float] = []
+        recalls: List[float] = []
+        results = []
+        for q, qvec in zip(queries, qvecs):
+            filters = q.get("filters", {})
+            hits = fn(qvec, filters)
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                fn(qvec, filters)
+                lat.append((time.perf_counter() - t0) * 1000.0)
+            results.append(hits)
+            expected = str(q.get("expected_doc_id", "")).strip()
+            if expected:
+                recalls.append(doc_recall(hits, expected))
+        return {
+            "label": label,
+            "results": results,
+            "recall": statistics.mean(recalls) if recalls else 0.0,
+            "avg_ms": statistics.mean(lat) if lat else 0.0,
+            "p95_ms": percentile(lat, 95),
+        }
+
+    # Timed repeats must reach the backend, so bypass the retrieval cache
+    single = run("single-stage", lambda v, f: _backend_search(v, TOP_K, f, True))
+    runs = [single]
+    for n_docs in [int(x) for x in args.docs.split(",") if x.strip()]:
+        runs.append(run(
+            f"two-stage ({n_docs} docs)",
+            lambda v, f, n=n_docs: two_stage_search(v, TOP_K, f, True, chunk_search=_backend_search, n_docs=n),
+        ))
+
+    # Overlap of the chunk top-k with single-stage (1.0 = identical result sets)
+    for r in runs:
+        overlaps = []
+        for hits, base in zip(r["results"], single["results"]):
+            base_ids = {h["id"] for h in base}
+            if base_ids:
+                overlaps.append(len({h["id"] for h in hits} & base_ids) / len(base_ids))
+        r["overlap"] = statistics.mean(overlaps) if overlaps else 0.0
+
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        f.write("# Two-stage Retrieval Evaluation Report\n\n")
+        f.write(f"- Queries: **{len(queries)}** (`{QUERIES_PATH}`)\n")
+        f.write(f"- Top-K: **{TOP_K}**\n")
+        f.write("- Latency excludes query embedding (same vector for every run)\n\n")
+        f.write(f"| Search | Recall@{TOP_K} (expected doc) | Chunk overlap vs single-stage | Latency avg (ms) | Latency p95 (ms) |\n")
+        f.write("|---|---:|---:|---:|---:|\n")
+        for r in runs:
+            f.write(f"| {r['label']} | {r['recall']:.4f} | {r['overlap']:.4f} | {r['avg_ms']:.2f} | {r['p95_ms']:.2f} |\n")
+
+    for r in runs:
+        print(f"{r['label']:<22} recall@{TOP_K}={r['recall']:.4f} overlap={r['overlap']:.4f} "
+              f"avg={r['avg_ms']:.2f} ms p95={r['p95_ms']:.2f} ms")
+    print(f"Report: {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Compact on-disk BM25 inverted index over the chunk corpus.
+
+Dense MiniLM vectors are weak on exact identifiers ("Article 7",
+"29 CFR 1910.1200"); a lexical index answers those without running the
+encoder at all. Postings are stored as flat arrays and memory-mapped at load
+time, so a lookup is a handful of array slices plus a vectorised BM25 score:
+
+    manifest.json     chunk count, term count, avgdl, k1, b
+    vocab.json        sorted term list (term id = position)
+    term_offsets.npy  int64 [V+1] posting range of each term
+    doc_deltas.npy    uint32 delta-encoded chunk rows per posting list
+    tfs.npy           uint16 term frequency per posting
+    doc_norm.npy      float32 [N] k1 * (1 - b + b * dl / avgdl)
+    ids.npy           uint64 [N] point ids (same as Qdrant, see stable_point_id)
+    payloads.jsonl    one payload per line
+    bitmaps.npz       filter bitmaps (see vectorstore/local_index.py)
+
+Usage:
+    python -m vectorstore.bm25_index        # build from data/chunks (no encoder needed)
+    from vectorstore.bm25_index import get_bm25_index
+    hits = get_bm25_index().search("29 CFR 1910", top_k=5)
+
+Enable via: RETRIEVAL_MODE=lexical or RETRIEVAL_MODE=hybrid in .env
+"""
+import os
+import re
+import json
+import math
+from collections import Counter, defaultdict
+from typing import Optional, Dict, Any, List, Sequence
+
+import numpy as np
+
+from vectorstore.local_index import PayloadFilter, top_k_indices, _save_array
+from vectorstore.index_version import VersionedSingleton
+from rag_pipeline.configs.settings import BM25_INDEX_DIR, BM25_K1, BM25_B
+
+_MANIFEST = "manifest.json"
+_VOCAB = "vocab.json"
+_OFFSETS = "term_offsets.npy"
+_DELTAS = "doc_deltas.npy"
+_TFS = "tfs.npy"
+_DOC_NORM = "doc_norm.npy"
+_IDS = "ids.npy"
+_PAYLOADS = "payloads.jsonl"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens. Dotted/hyphenated identifiers ("1910.1200",
+    "2016/679") are kept whole and also split into their parts."""
+    tokens: List[str] = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if tok in _STOPWORDS:
+            continue
+        tokens.append(tok)
+        if not tok.isalnum():
+            tokens.extend(p for p in re.split(r"[.\-/]", tok) if p and p not in _STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    def __init__(
+        self,
+        vocab: List[str],
+        offsets: np.ndarray,
+        deltas: np.ndarray,
+        tfs: np.ndarray,
+        doc_norm: np.ndarray,
+        ids: np.ndarray,
+        payloads: List[Dict[str, Any]],
+        payload_filter: Optional[PayloadFilter] = None,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+        avgdl: float = 0.0,
+    ):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.deltas = deltas
+        self.tfs = tfs
+        self.doc_norm = doc_norm
+        self.ids = ids
+        self.payloads = payloads
+        self.payload_filter = payload_filter or PayloadFilter(payloads)
+        # doc_norm is precomputed from these; kept to describe the built index
+        self.k1 = k1
+        self.b = b
+        self.avgdl = avgdl
+        self._term_id = {t: i for i, t in enumerate(vocab)}
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    # ── Build / persistence ─────────────────────────────────────────────────
+    @classmethod
+    def build(
+        cls,
+        ids: Sequence[int],
+        payloads: Sequence[Dict[str, Any]],
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+    ) -> "BM25Index":
+        postings: Dict[str, List[tuple]] = defaultdict(list)
+        doc_len = np.zeros(len(payloads), dtype=np.float32)
+
+        for row, payload in enumerate(payloads):
+            tokens = tokenize(payload.get("text", "") or "")
+            doc_len[row] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((row, min(tf, 65535)))
+
+        vocab = sorted(postings)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        deltas: List[int] = []
+        tfs: List[int] = []
+        for i, term in enumerate(vocab):
+            prev = 0
+            for row, tf in postings[term]:  # rows are appended in increasing order
+                deltas.append(row - prev)
+                tfs.append(tf)
+                prev = row
+            offsets[i + 1] = len(deltas)
+
+        avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+        doc_norm = (k1 * (1.0 - b + b * doc_len / max(avgdl, 1e-9))).astype(np.float32)
+
+        return cls(
+            vocab,
+            offsets,
+            np.asarray(deltas, dtype=np.uint32),
+            np.asarray(tfs, dtype=np.uint16),
+            doc_norm,
+            np.asarray(ids, dtype=np.uint64),
+            list(payloads),
+            k1=k1,
+            b=b,
+            avgdl=avgdl,
+        )
+
+    def save(self, path: str = BM25_INDEX_DIR) -> None:
+        os.makedirs(path, exist_ok=True)
+        _save_array(os.path.join(path, _OFFSETS), self.offsets)
+        _save_array(os.path.join(path, _DELTAS), self.deltas)
+        _save_array(os.path.join(path, _TFS), self.tfs)
+        _save_array(os.path.join(path, _DOC_NORM), self.doc_norm)
+        _save_array(os.path.join(path, _IDS), self.ids)
+        with open(os.path.join(path, _VOCAB), "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+        with open(os.path.join(path, _PAYLOADS), "w", encoding="utf-8") as f:
+            for p in self.payloads:
+                f.write(json.dumps(p, ensure_ascii=False) + "\n")
+        self.payload_filter.save(path)
+        with open(os.path.join(path, _MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({
+                "count": len(self),
+                "terms": len(self.vocab),
+                "avgdl": self.avgdl,
+                "k1": self.k1,
+                "b": self.b,
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str = BM25_INDEX_DIR) -> "BM25Index":
+        if not os.path.exists(os.path.join(path, _MANIFEST)):
+            raise FileNotFoundError(f"Missing BM25 index in {path}. Run vectorstore/bm25_index.py first.")
+
+        with open(os.path.join(path, _MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        with open(os.path.join(path, _VOCAB), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        with open(os.path.join(path, _PAYLOADS), "r", encoding="utf-8") as f:
+            payloads = [json.loads(line) for line in f if line.strip()]
+
+        return cls(
+            vocab,
+            np.load(os.path.join(path, _OFFSETS), mmap_mode="r"),
+            np.load(os.path.join(path, _DELTAS), mmap_mode="r"),
+            np.load(os.path.join(path, _TFS), mmap_mode="r"),
+            np.load(os.path.join(path, _DOC_NORM), mmap_mode="r"),
+            np.load(os.path.join(path, _IDS)),
+            payloads,
+            payload_filter=PayloadFilter.load(path, payloads),
+            k1=float(manifest.get("k1", BM25_K1)),
+            b=float(manifest.get("b", BM25_B)),
+            avgdl=float(manifest.get("avgdl", 0.0)),
+        )
+
+    # ── Search ───────────────────────────────────────────────────────────────
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        with_payload: bool = True,
+    ) -> List[Dict[str, Any]]:
+        n = len(self)
+        mask = self.payload_filter.mask(**filters) if filters else None
+
+        rows_parts: List[np.ndarray] = []
+        score_parts: List[np.ndarray] = []
+        for term, qtf in Counter(tokenize(query)).items():
+            tid = self._term_id.get(term)
+            if tid is None:
+                continue
+            start, end = int(self.offsets[tid]), int(self.offsets[tid + 1])
+            rows = np.cumsum(self.deltas[start:end], dtype=np.int64)
+            tf = self.tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            scores = qtf * idf * tf * (self.k1 + 1.0) / (tf + self.doc_norm[rows])
+            if mask is not None:
+                keep = mask[rows]
+                rows, scores = rows[keep], scores[keep]
+            rows_parts.append(rows)
+            score_parts.append(scores)
+
+        if not rows_parts:
+            return []
+
+        if len(rows_parts) == 1:
+            rows, scores = rows_parts[0], score_parts[0]
+        else:
+            rows, inverse = np.unique(np.concatenate(rows_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+
+        order = top_k_indices(scores, top_k)
+        return [
+            {
+                "id": int(self.ids[rows[i]]),
+                "score": float(scores[i]),
+                "payload": self.payloads[rows[i]] if with_payload else {},
+            }
+            for i in order
+        ]
+
+
+_bm25_index: VersionedSingleton[BM25Index] = VersionedSingleton(lambda: BM25Index.load(BM25_INDEX_DIR))
+
+
+def get_bm25_index() -> BM25Index:
+    return _bm25_index.get()
+
+
+def build_bm25_index(path: str = BM25_INDEX_DIR) -> BM25Index:
+    """Rebuild the index from data/chunks; the caller bumps the index version."""
+    from vectorstore.index_builder import iter_chunk_payloads, stable_point_id
+
+    payloads = list(iter_chunk_payloads())
+    index = BM25Index.build([stable_point_id(p) for p in payloads], payloads)
+    index.save(path)
+    print(f"Saved BM25 index ({len(index)} chunks, {len(index.vocab)} terms) -> {path}")
+    return index
+
+
+def main():
+    from vectorstore.index_version import bump_index_version
+
+    build_bm25_index()
+    bump_index_version("bm25_index")
+
+
+if __name__ == "__main__":
+    main()
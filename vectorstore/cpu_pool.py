@@ -0,0 +1,27 @@
+"""
+Bounded executor for CPU-bound work on the async query path.
+
+Embedding, cross-encoder reranking and in-process index search hold the
+CPU (and mostly the GIL), so the event loop hands them to this small pool
+instead of running them inline. The pool size caps how many of these jobs
+run at once, however many requests are in flight.
+
+Usage:
+    from vectorstore.cpu_pool import run_cpu
+    qvec = await run_cpu(embed_text, question)
+
+Enable via: CPU_WORKERS in .env (default: min(4, cpu_count))
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from rag_pipeline.configs.settings import CPU_WORKERS
+
+_cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+
+
+async def run_cpu(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_cpu_executor, functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,257 @@
+"""
+Document-level index for two-stage (document -> chunk) retrieval.
+
+Each doc_id gets one vector: the L2-normalised mean of its chunk vectors.
+A query first picks the TWO_STAGE_DOCS closest documents, then the chunk
+search runs only inside them through a `doc_ids` filter, so the number of
+chunk vectors scored no longer grows with the whole corpus.
+
+The document vectors live next to the chunk vectors of the active backend:
+a `<collection>_docs` Qdrant collection for RETRIEVAL_BACKEND=qdrant, or a
+LocalIndex in DOC_INDEX_DIR for the in-process backends.
+
+Usage:
+    python -m vectorstore.doc_index                 # build after index_builder
+    python -m vectorstore.benchmark_two_stage       # compare with single-stage
+
+Enable via: ENABLE_TWO_STAGE=true in .env
+"""
+import hashlib
+from typing import Optional, Dict, Any, List, Iterator, Tuple, Callable, Sequence
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams, PointStruct, PayloadSchemaType, QueryRequest
+
+from vectorstore.local_index import LocalIndex
+from vectorstore.metadata_filter import build_filter
+from vectorstore.index_version import bump_index_version, VersionedSingleton
+from vectorstore.qdrant_pool import get_qdrant_client, get_async_qdrant_client
+from rag_pipeline.configs.settings import (
+    RETRIEVAL_BACKEND,
+    DOC_COLLECTION_NAME, DOC_INDEX_DIR, TWO_STAGE_DOCS, LOCAL_INDEX_DIR, HNSW_INDEX_DIR,
+)
+
+DOC_FIELDS = [
+    "doc_id", "dataset_name", "subset", "split", "department",
+    "document_type", "category", "region", "created_at",
+]
+
+SCROLL_BATCH = 256
+
+
+def doc_point_id(doc_id: str) -> int:
+    """Stable unsigned 64-bit id for a document-level point."""
+    h = hashlib.sha1(f"doc::{doc_id}".encode("utf-8")).digest()
+    return int.from_bytes(h[:8], byteorder="big", signed=False)
+
+
+def pool_chunk_vectors(
+    chunks: Iterator[Tuple[Sequence[float], Dict[str, Any]]],
+) -> Tuple[List[int], np.ndarray, List[Dict[str, Any]]]:
+    """Mean-pool chunk vectors per doc_id. Returns (ids, vectors, payloads)."""
+    sums: Dict[str, np.ndarray] = {}
+    payloads: Dict[str, Dict[str, Any]] = {}
+
+    for vec, payload in chunks:
+        doc_id = str(payload.get("doc_id") or "")
+        if not doc_id:
+            continue
+        v = np.asarray(vec, dtype=np.float32)
+        if doc_id in sums:
+            sums[doc_id] += v
+            meta = payloads[doc_id]
+            meta["n_chunks"] += 1
+            created_at = str(payload.get("created_at", "") or "")
+            if created_at and (not meta["created_at"] or created_at < meta["created_at"]):
+                meta["created_at"] = created_at
+        else:
+            sums[doc_id] = v.copy()
+            meta = {k: payload.get(k, "") for k in DOC_FIELDS}
+            meta["n_chunks"] = 1
+            payloads[doc_id] = meta
+
+    doc_ids = sorted(sums)
+    if not doc_ids:
+        return [], np.zeros((0, 0), dtype=np.float32), []
+
+    vectors = np.stack([sums[d] for d in doc_ids])
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return [doc_point_id(d) for d in doc_ids], vectors / norms, [payloads[d] for d in doc_ids]
+
+
+def _iter_qdrant_chunks(client: QdrantClient) -> Iterator[Tuple[Sequence[float], Dict[str, Any]]]:
+    from vectorstore.partitions import searchable_collections
+    for collection in searchable_collections():
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection,
+                limit=SCROLL_BATCH,
+                offset=offset,
+                with_vectors=True,
+                with_payload=DOC_FIELDS,
+            )
+            for p in points:
+                yield p.vector, p.payload or {}
+            if offset is None:
+                break
+
+
+def _iter_local_chunks(index: LocalIndex) -> Iterator[Tuple[Sequence[float], Dict[str, Any]]]:
+    for _, vec, payload in index.iter_points():
+        yield vec, payload
+
+
+# ── Query time ────────────────────────────────────────────────────────────────
+_doc_index: VersionedSingleton[LocalIndex] = VersionedSingleton(lambda: LocalIndex.load(DOC_INDEX_DIR))
+
+
+def get_doc_index() -> LocalIndex:
+    return _doc_index.get()
+
+
+def search_docs(
+    qvec: Sequence[float],
+    n_docs: int = TWO_STAGE_DOCS,
+    filters: Optional[Dict[str, Any]] = None,
+) -> List[str]:
+    """doc_ids of the n_docs documents closest to the query."""
+    if RETRIEVAL_BACKEND == "qdrant":
+        client = get_qdrant_client()
+        hits = client.query_points(
+            collection_name=DOC_COLLECTION_NAME,
+            query=list(qvec),
+            query_filter=build_filter(**filters) if filters else None,
+            limit=n_docs,
+            with_payload=["doc_id"],
+        )
+        return [str((p.payload or {}).get("doc_id", "")) for p in hits.points]
+
+    hits = get_doc_index().search(qvec, top_k=n_docs, filters=filters, with_payload=True)
+    return [str(h["payload"].get("doc_id", "")) for h in hits]
+
+
+def search_docs_batch(
+    qvecs: Sequence[Sequence[float]],
+    n_docs: int = TWO_STAGE_DOCS,
+    filters: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+) -> List[List[str]]:
+    """`search_docs` for many queries; one query_batch_points call on Qdrant."""
+    filters_list = list(filters) if filters is not None else [None] * len(qvecs)
+    if not qvecs:
+        return []
+    if RETRIEVAL_BACKEND != "qdrant":
+        return [search_docs(v, n_docs=n_docs, filters=f) for v, f in zip(qvecs, filters_list)]
+
+    responses = get_qdrant_client().query_batch_points(
+        collection_name=DOC_COLLECTION_NAME,
+        requests=[
+            QueryRequest(
+                query=list(qvec),
+                filter=build_filter(**f) if f else None,
+                limit=n_docs,
+                with_payload=["doc_id"],
+            )
+            for qvec, f in zip(qvecs, filters_list)
+        ],
+    )
+    return [[str((p.payload or {}).get("doc_id", "")) for p in r.points] for r in responses]
+
+
+async def asearch_docs(
+    qvec: Sequence[float],
+    n_docs: int = TWO_STAGE_DOCS,
+    filters: Optional[Dict[str, Any]] = None,
+) -> List[str]:
+    """Async `search_docs` against the Qdrant document collection."""
+    hits = await get_async_qdrant_client().query_points(
+        collection_name=DOC_COLLECTION_NAME,
+        query=list(qvec),
+        query_filter=build_filter(**filters) if filters else None,
+        limit=n_docs,
+        with_payload=["doc_id"],
+    )
+    return [str((p.payload or {}).get("doc_id", "")) for p in hits.points]
+
+
+def two_stage_search(
+    qvec: Sequence[float],
+    top_k: int,
+    filters: Optional[Dict[str, Any]],
+    with_payload: bool,
+    chunk_search: Callable[..., List[Dict[str, Any]]],
+    n_docs: int = TWO_STAGE_DOCS,
+) -> List[Dict[str, Any]]:
+    """Document search, then `chunk_search` restricted to the candidate docs."""
+    doc_ids = search_docs(qvec, n_docs=n_docs, filters=filters)
+    if not doc_ids:
+        return []
+    chunk_filters = dict(filters or {})
+    chunk_filters["doc_ids"] = doc_ids
+    return chunk_search(qvec, top_k, chunk_filters, with_payload)
+
+
+# ── Build ─────────────────────────────────────────────────────────────────────
+def main():
+    if RETRIEVAL_BACKEND == "qdrant":
+        client = get_qdrant_client()
+        from vectorstore.partitions import searchable_collections
+        collections = searchable_collections()
+        ids, vectors, payloads = pool_chunk_vectors(_iter_qdrant_chunks(client))
+        if not ids:
+            print(f"No chunks found in {collections}. Run vectorstore/index_builder.py first.")
+            return
+
+        existing = [c.name for c in client.get_collections().collections]
+        if DOC_COLLECTION_NAME not in existing:
+            client.create_collection(
+                collection_name=DOC_COLLECTION_NAME,
+                vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.COSINE),
+            )
+            print(f"Created collection '{DOC_COLLECTION_NAME}' with dim={vectors.shape[1]}")
+
+        for start in range(0, len(ids), SCROLL_BATCH):
+            client.upsert(
+                collection_name=DOC_COLLECTION_NAME,
+                points=[
+                    PointStruct(id=pid, vector=vec.tolist(), payload=payload)
+                    for pid, vec, payload in zip(
+                        ids[start:start + SCROLL_BATCH],
+                        vectors[start:start + SCROLL_BATCH],
+                        payloads[start:start + SCROLL_BATCH],
+                    )
+                ],
+            )
+
+        # Stage two filters chunks by doc_id, so index that payload field
+        # wherever chunks live (every partition when PARTITION_FIELD is set)
+        for collection in collections:
+            client.create_payload_index(
+                collection_name=collection,
+                field_name="doc_id",
+                field_schema=PayloadSchemaType.KEYWORD,
+            )
+        print(f"Indexed payload field 'doc_id' in {len(collections)} chunk collection(s)")
+        print(f"Upserted {len(ids)} document vectors into '{DOC_COLLECTION_NAME}'")
+        bump_index_version("doc_index")
+        return
+
+    if RETRIEVAL_BACKEND == "hnsw":
+        from vectorstore.hnsw_index import HNSWIndex
+        chunks = HNSWIndex.load(HNSW_INDEX_DIR)
+    else:
+        chunks = LocalIndex.load(LOCAL_INDEX_DIR)
+
+    ids, vectors, payloads = pool_chunk_vectors(_iter_local_chunks(chunks))
+    docs = LocalIndex.empty(chunks.dim, model_name=chunks.model_name)
+    if ids:
+        docs.add(ids, vectors, payloads)
+    docs.save(DOC_INDEX_DIR)
+    print(f"Saved document index ({len(docs)} docs from {len(chunks)} chunks) -> {DOC_INDEX_DIR}")
+    bump_index_version("doc_index")
+
+
+if __name__ == "__main__":
+    main()
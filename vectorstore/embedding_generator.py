@@ -1,9 +1,14 @@
 from typing import List, Optional
 from sentence_transformers import SentenceTransformer
 
-_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+from rag_pipeline.configs.settings import EMBEDDING_MODEL_NAME
+
+_MODEL_NAME = EMBEDDING_MODEL_NAME
 _model = SentenceTransformer(_MODEL_NAME)
 
+def model_name() -> str:
+    return _MODEL_NAME
+
 def embedding_dim() -> int:
     return _model.get_sentence_embedding_dimension()
 
@@ -0,0 +1,82 @@
+"""
+In-process fallback for Qdrant retrieval.
+
+While the Qdrant circuit breaker is open (rag_pipeline/circuit_breaker.py),
+or when a Qdrant call fails, dense search is answered here instead: an exact
+LocalIndex search over the vector snapshot in FALLBACK_SNAPSHOT_DIR (written
+by `python -m vectorstore.snapshot export`), or over the local index in
+LOCAL_INDEX_DIR when there is no snapshot. Vectors are projected like the
+live collection, so the same query vector works on both.
+
+The snapshot may be older than the collection; fallback hits carry
+"fallback": True so the answer can be marked as degraded
+("retrieval_fallback"). Partitioned collections and two-stage retrieval are
+searched as one flat index here.
+
+The index is loaded on first use, or at API startup when circuit breakers
+are enabled (`warm_fallback_index`), so the first fallback does not pay for
+loading it. It is reloaded once the index version is bumped (reindex,
+snapshot import), so a stale copy is not served until restart.
+
+Usage:
+    python -m vectorstore.snapshot export --out data/snapshot
+    from vectorstore.fallback_index import fallback_search
+    hits = fallback_search(qvec, top_k=5, filters={"department": "HR"})
+
+Enable via: ENABLE_CIRCUIT_BREAKERS=true FALLBACK_SNAPSHOT_DIR=data/snapshot in .env
+"""
+import os
+import logging
+from typing import Optional, Dict, Any, List, Sequence
+
+from vectorstore.index_version import VersionedSingleton
+from vectorstore.local_index import LocalIndex
+from rag_pipeline.configs.settings import FALLBACK_SNAPSHOT_DIR, LOCAL_INDEX_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def _load() -> Optional[LocalIndex]:
+    if os.path.exists(os.path.join(FALLBACK_SNAPSHOT_DIR, "manifest.json")):
+        from vectorstore.snapshot import load_snapshot_index
+        index = load_snapshot_index(FALLBACK_SNAPSHOT_DIR)
+        source = FALLBACK_SNAPSHOT_DIR
+    elif os.path.exists(os.path.join(LOCAL_INDEX_DIR, "manifest.json")):
+        index = LocalIndex.load(LOCAL_INDEX_DIR)
+        source = LOCAL_INDEX_DIR
+    else:
+        logger.warning("No fallback index: neither %s nor %s holds a manifest", FALLBACK_SNAPSHOT_DIR, LOCAL_INDEX_DIR)
+        return None
+    logger.info("Fallback index loaded | points=%d | source=%s", len(index), source)
+    return index
+
+
+_fallback_index: VersionedSingleton[Optional[LocalIndex]] = VersionedSingleton(_load)
+
+
+def get_fallback_index() -> Optional[LocalIndex]:
+    """The fallback index, or None if there is nothing to load."""
+    return _fallback_index.get()
+
+
+def warm_fallback_index() -> None:
+    try:
+        get_fallback_index()
+    except Exception as exc:
+        logger.warning("Fallback index could not be loaded: %s", exc)
+
+
+def fallback_search(
+    qvec: Sequence[float],
+    top_k: int,
+    filters: Optional[Dict[str, Any]],
+    with_payload: bool,
+) -> Optional[List[Dict[str, Any]]]:
+    """Hits marked "fallback", or None when no fallback index is available."""
+    index = get_fallback_index()
+    if index is None:
+        return None
+    hits = index.search(qvec, top_k=top_k, filters=filters, with_payload=with_payload)
+    for h in hits:
+        h["fallback"] = True
+    return hits
@@ -0,0 +1,392 @@
+"""
+Persistent in-process HNSW approximate index.
+
+Pure Python/NumPy Hierarchical Navigable Small World graph (Malkov & Yashunin)
+for corpora where exact search (vectorstore/local_index.py) stops scaling and
+no external vector service is available. Payloads and filter bitmaps are
+inherited from LocalIndex; the graph is stored next to them in compact int32
+arrays that are memory-mapped at load time:
+
+    hnsw.json        M, ef_construction, entry point, max level
+    levels.npy       int8 [N] top layer of each node
+    links0.npy       int32 [N, 2*M] layer-0 neighbours, -1 padded
+    links_upper.npy  int32 [U, max_level, M] layers >= 1 for the U nodes that have them
+    upper_row.npy    int32 [N] row of each node in links_upper.npy (-1 if none)
+
+Re-adding an existing id overwrites its vector and re-links the node: its
+old links are dropped from the graph and rebuilt for the new vector on the
+next search or save.
+
+Filtered search honours build_filter() semantics: very selective filters are
+answered exactly over the matching rows, broader ones traverse the graph and
+only collect matching nodes.
+
+Usage:
+    RETRIEVAL_BACKEND=hnsw python -m vectorstore.index_builder   # build / extend
+    python -m vectorstore.benchmark_hnsw                         # recall vs latency
+    from vectorstore.hnsw_index import get_hnsw_index
+    hits = get_hnsw_index().search(qvec, top_k=5, ef_search=128)
+
+Enable via: RETRIEVAL_BACKEND=hnsw in .env
+"""
+import os
+import json
+import math
+import heapq
+import threading
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+
+from vectorstore.local_index import LocalIndex, PayloadFilter, _normalize, _save_array
+from vectorstore.index_version import VersionedSingleton
+from rag_pipeline.configs.settings import (
+    HNSW_INDEX_DIR, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH,
+)
+
+_GRAPH_META = "hnsw.json"
+_LEVELS = "levels.npy"
+_LINKS0 = "links0.npy"
+_LINKS_UPPER = "links_upper.npy"
+_UPPER_ROW = "upper_row.npy"
+
+# Below this fraction of matching rows, a filtered query is answered exactly
+FILTER_EXACT_FRACTION = 0.05
+
+
+class HNSWIndex(LocalIndex):
+    BACKEND = "hnsw"
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        payloads: List[Dict[str, Any]],
+        payload_filter: Optional[PayloadFilter] = None,
+        model_name: str = "",
+        m: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+        ef_search: int = HNSW_EF_SEARCH,
+        seed: int = 42,
+    ):
+        super().__init__(vectors, ids, payloads, payload_filter=payload_filter, model_name=model_name)
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._ml = 1.0 / math.log(max(m, 2))
+        self._rng = np.random.default_rng(seed)
+
+        self.entry_point = -1
+        self.max_level = -1
+        # Mutable graph: node -> [layer0 links, layer1 links, ...]
+        self._links: List[List[List[int]]] = []
+        self._levels: List[int] = []
+        # Read-only graph loaded from disk (memory-mapped), used until the first insert
+        self._mm: Optional[Dict[str, np.ndarray]] = None
+        self._stale: set = set()  # overwritten nodes whose links were built for the old vector
+        self._graph_lock = threading.RLock()
+
+    @classmethod
+    def empty(cls, dim: int, model_name: str = "", **kwargs) -> "HNSWIndex":
+        return cls(
+            np.zeros((0, dim), dtype=np.float32),
+            np.zeros(0, dtype=np.uint64),
+            [],
+            model_name=model_name,
+            **kwargs,
+        )
+
+    # ── Graph access ─────────────────────────────────────────────────────────
+    @property
+    def graph_size(self) -> int:
+        if self._mm is not None:
+            return int(self._mm["levels"].shape[0])
+        return len(self._levels)
+
+    def _level_of(self, node: int) -> int:
+        if self._mm is not None:
+            return int(self._mm["levels"][node])
+        return self._levels[node]
+
+    def _neighbors(self, node: int, level: int) -> List[int]:
+        if self._mm is None:
+            return self._links[node][level]
+        if level == 0:
+            row = self._mm["links0"][node]
+        else:
+            row = self._mm["links_upper"][self._mm["upper_row"][node], level - 1]
+        return [int(x) for x in row if x >= 0]
+
+    def _thaw(self) -> None:
+        """Copy a memory-mapped graph into mutable lists before inserting."""
+        if self._mm is None:
+            return
+        n = self.graph_size
+        levels = [int(x) for x in self._mm["levels"]]
+        links = [[self._neighbors(i, lvl) for lvl in range(levels[i] + 1)] for i in range(n)]
+        self._mm = None
+        self._levels, self._links = levels, links
+
+    # ── Construction ─────────────────────────────────────────────────────────
+    def add(
+        self,
+        ids: Sequence[int],
+        vectors: Sequence[Sequence[float]],
+        payloads: Sequence[Dict[str, Any]],
+    ) -> None:
+        """Upsert points; overwritten nodes are re-linked on the next `_ensure_ready`."""
+        overwritten = {self._id_pos[int(pid)] for pid in ids if int(pid) in self._id_pos}
+        super().add(ids, vectors, payloads)
+        self._stale.update(pos for pos in overwritten if pos < self.graph_size)
+
+    def _ensure_ready(self) -> None:
+        super()._ensure_ready()
+        if self.graph_size < len(self) or self._stale:
+            with self._graph_lock:
+                self._thaw()
+                if self._stale:
+                    self._relink(sorted(self._stale))
+                    self._stale.clear()
+                for node in range(self.graph_size, len(self)):
+                    self._insert(node)
+
+    def _random_level(self) -> int:
+        return int(-math.log(max(self._rng.random(), 1e-12)) * self._ml)
+
+    def _select_neighbors(self, candidates: List[Tuple[float, int]], m: int) -> List[int]:
+        """HNSW neighbour-selection heuristic: prefer candidates that are not
+        closer to an already selected neighbour than to the base vector."""
+        selected: List[int] = []
+        for sim, c in sorted(candidates, reverse=True):
+            if len(selected) >= m:
+                break
+            if selected:
+                closest = float(np.max(self.vectors[selected] @ self.vectors[c]))
+                if closest > sim:
+                    continue
+            selected.append(c)
+        if len(selected) < m:
+            # Backfill with the nearest skipped candidates to keep the graph dense
+            chosen = set(selected)
+            for sim, c in sorted(candidates, reverse=True):
+                if len(selected) >= m:
+                    break
+                if c not in chosen:
+                    selected.append(c)
+                    chosen.add(c)
+        return selected
+
+    def _insert(self, node: int) -> None:
+        level = self._random_level()
+        self._levels.append(level)
+        self._links.append([[] for _ in range(level + 1)])
+
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+
+        self._connect(node, level)
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def _relink(self, nodes: List[int]) -> None:
+        """Rebuild the links of overwritten nodes for their new vectors.
+
+        Links pointing at them were chosen for the old vectors and are
+        dropped everywhere; their own outgoing links are kept until they are
+        replaced, so the graph stays navigable while searching for them.
+        """
+        stale = set(nodes)
+        for links in self._links:
+            for lvl, nb in enumerate(links):
+                if stale.intersection(nb):
+                    links[lvl] = [n for n in nb if n not in stale]
+        if self.graph_size > 1:
+            for node in nodes:
+                self._connect(node, self._levels[node])
+
+    def _connect(self, node: int, level: int) -> None:
+        """Link `node` on layers `level`..0 to its nearest nodes, both ways."""
+        q = self.vectors[node]
+        ep = [self.entry_point]
+        for lvl in range(self.max_level, level, -1):
+            ep = [c for _, c in self._search_layer(q, ep, 1, lvl)]
+
+        for lvl in range(min(level, self.max_level), -1, -1):
+            found = [(s, c) for s, c in self._search_layer(q, ep, self.ef_construction, lvl) if c != node]
+            if not found:
+                continue
+            m_max = self.m0 if lvl == 0 else self.m
+            neighbors = self._select_neighbors(found, self.m)
+            self._links[node][lvl] = neighbors
+
+            for nb in neighbors:
+                links = self._links[nb][lvl]
+                links.append(node)
+                if len(links) > m_max:
+                    sims = self.vectors[links] @ self.vectors[nb]
+                    self._links[nb][lvl] = self._select_neighbors(list(zip(sims.tolist(), links)), m_max)
+            ep = [c for _, c in found]
+
+    # ── Search ───────────────────────────────────────────────────────────────
+    def _search_layer(
+        self,
+        q: np.ndarray,
+        entry_points: List[int],
+        ef: int,
+        level: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> List[Tuple[float, int]]:
+        """Greedy best-first search on one layer. Returns (similarity, node) pairs.
+
+        With `allowed`, every node is still traversed but only allowed nodes are
+        collected, so the graph stays connected under restrictive filters.
+        """
+        visited = set(entry_points)
+        sims = self.vectors[entry_points] @ q
+        candidates = [(-float(s), e) for s, e in zip(sims, entry_points)]
+        heapq.heapify(candidates)
+        frontier = [(float(s), e) for s, e in zip(sims, entry_points)]
+        heapq.heapify(frontier)
+        found = [(s, e) for s, e in frontier if allowed is None or allowed[e]]
+        heapq.heapify(found)
+
+        while candidates:
+            neg_sim, c = heapq.heappop(candidates)
+            if len(frontier) >= ef and -neg_sim < frontier[0][0]:
+                break
+
+            nbrs = [n for n in self._neighbors(c, level) if n not in visited]
+            if not nbrs:
+                continue
+            visited.update(nbrs)
+
+            for s, n in zip((self.vectors[nbrs] @ q).tolist(), nbrs):
+                if len(frontier) < ef or s > frontier[0][0]:
+                    heapq.heappush(candidates, (-s, n))
+                    heapq.heappush(frontier, (s, n))
+                    if len(frontier) > ef:
+                        heapq.heappop(frontier)
+                if allowed is not None and allowed[n] and (len(found) < ef or s > found[0][0]):
+                    heapq.heappush(found, (s, n))
+                    if len(found) > ef:
+                        heapq.heappop(found)
+
+        return sorted(frontier if allowed is None else found, reverse=True)
+
+    def search(
+        self,
+        qvec: Sequence[float],
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        with_payload: bool = True,
+        ef_search: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        self._ensure_ready()
+        if self.entry_point < 0:
+            return []
+
+        q = _normalize(np.asarray(qvec, dtype=np.float32))
+        mask = self.mask(**filters) if filters else None
+        ef = max(ef_search or self.ef_search, top_k)
+
+        if mask is not None:
+            n_allowed = int(mask.sum())
+            if n_allowed == 0:
+                return []
+            fraction = n_allowed / len(self)
+            if fraction < FILTER_EXACT_FRACTION:
+                return super().search(q, top_k=top_k, filters=filters, with_payload=with_payload)
+            ef = min(int(math.ceil(ef / fraction)), len(self))
+
+        ep = [self.entry_point]
+        for lvl in range(self.max_level, 0, -1):
+            ep = [c for _, c in self._search_layer(q, ep, 1, lvl)]
+        found = self._search_layer(q, ep, ef, 0, allowed=mask)
+
+        return [
+            {
+                "id": int(self.ids[i]),
+                "score": float(s),
+                "payload": self.payloads[i] if with_payload else {},
+            }
+            for s, i in found[:top_k]
+        ]
+
+    def exact_search(
+        self,
+        qvec: Sequence[float],
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        with_payload: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Brute-force search over the same vectors (ground truth for benchmarks)."""
+        self._ensure_ready()
+        return super().search(qvec, top_k=top_k, filters=filters, with_payload=with_payload)
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+    def save(self, path: str = HNSW_INDEX_DIR) -> None:
+        super().save(path)
+        n = self.graph_size
+        levels = np.array([self._level_of(i) for i in range(n)], dtype=np.int8)
+
+        links0 = np.full((n, self.m0), -1, dtype=np.int32)
+        upper_nodes = [i for i in range(n) if levels[i] > 0]
+        upper_row = np.full(n, -1, dtype=np.int32)
+        depth = max(self.max_level, 1)
+        links_upper = np.full((len(upper_nodes), depth, self.m), -1, dtype=np.int32)
+
+        for i in range(n):
+            nb = self._neighbors(i, 0)
+            links0[i, :len(nb)] = nb
+        for row, i in enumerate(upper_nodes):
+            upper_row[i] = row
+            for lvl in range(1, int(levels[i]) + 1):
+                nb = self._neighbors(i, lvl)
+                links_upper[row, lvl - 1, :len(nb)] = nb
+
+        _save_array(os.path.join(path, _LEVELS), levels)
+        _save_array(os.path.join(path, _LINKS0), links0)
+        _save_array(os.path.join(path, _LINKS_UPPER), links_upper)
+        _save_array(os.path.join(path, _UPPER_ROW), upper_row)
+        with open(os.path.join(path, _GRAPH_META), "w", encoding="utf-8") as f:
+            json.dump({
+                "m": self.m,
+                "ef_construction": self.ef_construction,
+                "entry_point": self.entry_point,
+                "max_level": self.max_level,
+                "count": n,
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str = HNSW_INDEX_DIR) -> "HNSWIndex":
+        index = super().load(path)
+        meta_path = os.path.join(path, _GRAPH_META)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"Missing HNSW graph in {path}. Run vectorstore/index_builder.py with RETRIEVAL_BACKEND=hnsw first.")
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        index.m = int(meta["m"])
+        index.m0 = 2 * index.m
+        index.ef_construction = int(meta["ef_construction"])
+        index._ml = 1.0 / math.log(max(index.m, 2))
+        index.entry_point = int(meta["entry_point"])
+        index.max_level = int(meta["max_level"])
+        index._mm = {
+            "levels": np.load(os.path.join(path, _LEVELS), mmap_mode="r"),
+            "links0": np.load(os.path.join(path, _LINKS0), mmap_mode="r"),
+            "links_upper": np.load(os.path.join(path, _LINKS_UPPER), mmap_mode="r"),
+            "upper_row": np.load(os.path.join(path, _UPPER_ROW), mmap_mode="r"),
+        }
+        return index
+
+
+_hnsw_index: VersionedSingleton[HNSWIndex] = VersionedSingleton(lambda: HNSWIndex.load(HNSW_INDEX_DIR))
+
+
+def get_hnsw_index() -> HNSWIndex:
+    return _hnsw_index.get()
@@ -1,15 +1,15 @@
 import os
 import csv
 import hashlib
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Iterator
 
-from qdrant_client import QdrantClient
 from qdrant_client.models import PointStruct
 
-from vectorstore.embedding_generator import embed_texts
-
-QDRANT_URL = "http://localhost:6333"
-COLLECTION_NAME = "hr_chunks"
+from vectorstore.qdrant_pool import get_qdrant_client
+from vectorstore.index_version import bump_index_version
+from vectorstore.projection import load_projection, index_dim
+from vectorstore.partitions import upsert_points
+from rag_pipeline.configs.settings import RETRIEVAL_BACKEND, RETRIEVAL_MODE, LOCAL_INDEX_DIR, HNSW_INDEX_DIR
 
 CHUNKS_META = os.path.join("data", "chunks_metadata.csv")
 CHUNKS_DIR = os.path.join("data", "chunks")
@@ -40,38 +40,17 @@ def stable_point_id(payload: dict) -> int:
     return int.from_bytes(h[:8], byteorder="big", signed=False)
 
 
-def main():
-    client = QdrantClient(url=QDRANT_URL)
-
-    if not os.path.exists(CHUNKS_META):
-        raise FileNotFoundError(f"Missing {CHUNKS_META}. Run ingestion/chunker.py first.")
+def iter_chunk_payloads(meta_path: str = CHUNKS_META) -> Iterator[Dict[str, Any]]:
+    """Yield one Qdrant payload (metadata + full text) per non-empty chunk file."""
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"Missing {meta_path}. Run ingestion/chunker.py first.")
 
-    with open(CHUNKS_META, "r", encoding="utf-8") as f:
+    with open(meta_path, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         rows: List[Dict[str, Any]] = list(reader)
 
     print(f"Found {len(rows)} chunks in metadata.")
 
-    batch_texts: List[str] = []
-    batch_payloads: List[Dict[str, Any]] = []
-
-    def flush():
-        nonlocal batch_texts, batch_payloads
-        if not batch_payloads:
-            return
-
-        vectors = embed_texts(batch_texts, batch_size=32, show_progress=False, normalize=True)
-
-        points: List[PointStruct] = []
-        for payload, vec in zip(batch_payloads, vectors):
-            pid = stable_point_id(payload)
-            points.append(PointStruct(id=pid, vector=vec, payload=payload))
-
-        client.upsert(collection_name=COLLECTION_NAME, points=points)
-        print(f"Upserted {len(points)} points")
-
-        batch_texts, batch_payloads = [], []
-
     for r in rows:
         chunk_file = r.get("chunk_file", "") or ""
         chunk_basename = os.path.basename(chunk_file)
@@ -86,7 +65,7 @@ def main():
             print(f"[SKIP] empty: {chunk_path}")
             continue
 
-        payload = {
+        yield {
             "chunk_id": r.get("chunk_id", ""),
             "doc_id": r.get("doc_id", ""),
             "chunk_index": int(r.get("chunk_index", 0) or 0),
@@ -102,13 +81,82 @@ def main():
             "text": text,  #
         }
 
+
+def open_local_store(backend: str = RETRIEVAL_BACKEND):
+    """Open the in-process index for `backend`, extending it if it already exists."""
+    from vectorstore.embedding_generator import model_name
+
+    if backend == "hnsw":
+        from vectorstore.hnsw_index import HNSWIndex as store_cls
+        path = HNSW_INDEX_DIR
+    else:
+        from vectorstore.local_index import LocalIndex as store_cls
+        path = LOCAL_INDEX_DIR
+
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        print(f"Extending existing {backend} index in {path}")
+        return store_cls.load(path), path
+    return store_cls.empty(index_dim(), model_name=model_name()), path
+
+
+def main():
+    from vectorstore.embedding_generator import embed_texts
+
+    projection = load_projection()
+    if projection is not None:
+        print(f"Storing reduced vectors: {projection.projection_id}")
+
+    local_index = None
+    local_path = ""
+    client = None
+    if RETRIEVAL_BACKEND in ("local", "hnsw"):
+        local_index, local_path = open_local_store(RETRIEVAL_BACKEND)
+    else:
+        client = get_qdrant_client()
+
+    batch_texts: List[str] = []
+    batch_payloads: List[Dict[str, Any]] = []
+
+    def flush():
+        nonlocal batch_texts, batch_payloads
+        if not batch_payloads:
+            return
+
+        vectors = embed_texts(batch_texts, batch_size=32, show_progress=False, normalize=True)
+        if projection is not None:
+            vectors = projection.apply(vectors).tolist()
+
+        if local_index is not None:
+            local_index.add([stable_point_id(p) for p in batch_payloads], vectors, batch_payloads)
+            print(f"Added {len(batch_payloads)} points to {RETRIEVAL_BACKEND} index")
+        else:
+            points: List[PointStruct] = []
+            for payload, vec in zip(batch_payloads, vectors):
+                pid = stable_point_id(payload)
+                points.append(PointStruct(id=pid, vector=vec, payload=payload))
+
+            upsert_points(client, points)
+            print(f"Upserted {len(points)} points")
+
+        batch_texts, batch_payloads = [], []
+
+    for payload in iter_chunk_payloads():
         batch_payloads.append(payload)
-        batch_texts.append(text)
+        batch_texts.append(payload["text"])
 
         if len(batch_payloads) >= BATCH_SIZE:
             flush()
 
     flush()
+
+    if local_index is not None:
+        local_index.save(local_path)
+        print(f"Saved {RETRIEVAL_BACKEND} index ({len(local_index)} chunks) -> {local_path}")
+    # Lexical and hybrid retrieval read the BM25 index: keep it in step with the vectors
+    if RETRIEVAL_MODE in ("lexical", "hybrid"):
+        from vectorstore.bm25_index import build_bm25_index
+        build_bm25_index()
+    bump_index_version("index_builder", projection=projection.projection_id if projection else None)
     print("Done indexing.")
 
 
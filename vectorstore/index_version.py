@@ -0,0 +1,105 @@
+"""
+Index version shared between the indexing scripts and the API.
+
+Every script that changes what a search can return (index_builder,
+doc_index, bm25_index, snapshot import, reset_collection) bumps a counter in
+INDEX_VERSION_PATH. Readers stat the file on each call and only re-read it
+when its mtime changes, so caches keyed on the version are invalidated by a
+reindex without restarting the API. VersionedSingleton does the same for the
+in-process indexes: it reloads them the first time they are used after a
+bump.
+
+Usage:
+    from vectorstore.index_version import bump_index_version, current_index_version
+    bump_index_version("index_builder")    # after writing the index
+    current_index_version()                # -> int, 0 if never built
+    _index = VersionedSingleton(lambda: LocalIndex.load(LOCAL_INDEX_DIR))
+    _index.get()                           # reloaded after a bump
+"""
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Tuple, Callable, Generic, TypeVar
+
+from rag_pipeline.configs.settings import INDEX_VERSION_PATH
+
+_cached: Tuple[Optional[Tuple[str, int, int]], Dict[str, Any]] = (None, {"version": 0})
+_lock = threading.Lock()
+
+
+def read_index_version(path: Optional[str] = None) -> Dict[str, Any]:
+    """Full version record ({"version", "updated_at", "updated_by", ...})."""
+    global _cached
+    path = path or INDEX_VERSION_PATH
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return {"version": 0}
+
+    # Bumps rename a new file into place, so the inode changes even when two
+    # of them land within one mtime tick
+    key = (path, st.st_ino, st.st_mtime_ns)
+    if _cached[0] == key:
+        return _cached[1]
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        # Unreadable file: keep serving the last version we read
+        return _cached[1] if _cached[0] and _cached[0][0] == path else {"version": 0}
+
+    with _lock:
+        _cached = (key, record)
+    return record
+
+
+def current_index_version() -> int:
+    return int(read_index_version().get("version", 0))
+
+
+def bump_index_version(updated_by: str, path: Optional[str] = None, **fields: Any) -> int:
+    """Increment the version. Extra `fields` (e.g. projection=...) are stored
+    with it and carried over by later bumps that do not set them."""
+    path = path or INDEX_VERSION_PATH
+    previous = read_index_version(path)
+    record = {
+        **previous,
+        **fields,
+        "version": int(previous.get("version", 0)) + 1,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "updated_by": updated_by,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp, path)
+    print(f"Index version -> {record['version']} ({updated_by})")
+    return record["version"]
+
+
+T = TypeVar("T")
+
+
+class VersionedSingleton(Generic[T]):
+    """Lazily loaded object, reloaded under the lock once the index version
+    moves past the one it was loaded at. Callers holding the old object keep
+    using it until their search returns. A loader returning None (nothing to
+    load) is not retried until the next bump."""
+
+    def __init__(self, loader: Callable[[], T]):
+        self._loader = loader
+        self._value: Optional[T] = None
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        version = current_index_version()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._value = self._loader()
+                    self._version = version
+        return self._value
@@ -0,0 +1,357 @@
+"""
+In-process exact vector search over a memory-mapped embedding matrix.
+
+An alternative to Qdrant for small and medium corpora: vectors live in a
+float32 .npy file that is memory-mapped at load time, scoring is a single
+NumPy matrix-vector product and top-k selection uses argpartition. Metadata
+filters are answered from per-value bitmaps precomputed at build time, with
+the same semantics as `vectorstore.metadata_filter.build_filter`.
+
+On-disk layout (LOCAL_INDEX_DIR):
+    manifest.json    model name, dimension, distance, chunk count
+    vectors.npy      float32 [N, dim], L2-normalised
+    ids.npy          uint64 [N] point ids (same as Qdrant, see stable_point_id)
+    payloads.jsonl   one payload per line, row-aligned with vectors.npy
+    bitmaps.npz      packed bitmaps keyed "<field>=<value>"
+
+Usage:
+    RETRIEVAL_BACKEND=local python -m vectorstore.index_builder   # build
+    from vectorstore.local_index import get_local_index
+    hits = get_local_index().search(qvec, top_k=5, filters={"department": "HR"})
+
+Enable via: RETRIEVAL_BACKEND=local in .env
+"""
+import os
+import json
+from typing import Optional, Dict, Any, List, Sequence, Iterator, Tuple
+
+import numpy as np
+
+from vectorstore.index_version import VersionedSingleton
+from rag_pipeline.configs.settings import LOCAL_INDEX_DIR
+
+BITMAP_FIELDS = ["department", "category", "document_type", "region", "dataset_name"]
+
+_MANIFEST = "manifest.json"
+_VECTORS = "vectors.npy"
+_IDS = "ids.npy"
+_PAYLOADS = "payloads.jsonl"
+_BITMAPS = "bitmaps.npz"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def _save_array(path: str, array: np.ndarray) -> None:
+    """np.save via a temp file and rename: a loaded index keeps reading the
+    old file through its mmap while a rebuild replaces it."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first (argpartition + small sort)."""
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        part = np.argpartition(scores, n - k)[n - k:]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def build_bitmaps(payloads: Sequence[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """One boolean row mask per (field, value) pair found in the payloads."""
+    n = len(payloads)
+    bitmaps: Dict[str, np.ndarray] = {}
+    for field in BITMAP_FIELDS:
+        for i, p in enumerate(payloads):
+            value = str(p.get(field, "") or "")
+            key = f"{field}={value}"
+            bm = bitmaps.get(key)
+            if bm is None:
+                bm = bitmaps[key] = np.zeros(n, dtype=bool)
+            bm[i] = True
+    return bitmaps
+
+
+class PayloadFilter:
+    """Row masks over row-aligned payloads, mirroring build_filter() semantics.
+
+    Equality filters are answered from precomputed per-value bitmaps; range
+    filters compare against a lazily built column of payload values.
+    """
+
+    def __init__(self, payloads: Sequence[Dict[str, Any]], bitmaps: Optional[Dict[str, np.ndarray]] = None):
+        self.payloads = payloads
+        self.bitmaps = bitmaps if bitmaps is not None else build_bitmaps(payloads)
+        self._columns: Dict[str, np.ndarray] = {}
+        self._groups: Dict[str, Dict[str, np.ndarray]] = {}
+
+    def column(self, field: str) -> np.ndarray:
+        col = self._columns.get(field)
+        if col is None:
+            col = self._columns[field] = np.array([str(p.get(field, "") or "") for p in self.payloads])
+        return col
+
+    def rows_for(self, field: str, values: Sequence[str]) -> np.ndarray:
+        """Rows whose `field` is one of `values` (lazy value -> rows index)."""
+        groups = self._groups.get(field)
+        if groups is None:
+            lists: Dict[str, List[int]] = {}
+            for i, p in enumerate(self.payloads):
+                lists.setdefault(str(p.get(field, "") or ""), []).append(i)
+            groups = self._groups[field] = {k: np.asarray(v, dtype=np.int64) for k, v in lists.items()}
+        parts = [groups[v] for v in values if v in groups]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def _bitmap(self, field: str, value: str) -> np.ndarray:
+        bm = self.bitmaps.get(f"{field}={value}")
+        return bm if bm is not None else np.zeros(len(self.payloads), dtype=bool)
+
+    def mask(
+        self,
+        department: Optional[str] = None,
+        category: Optional[str] = None,
+        document_type: Optional[str] = None,
+        region: Optional[str] = None,
+        dataset_name: Optional[str] = None,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None,
+        doc_ids: Optional[Sequence[str]] = None,
+    ) -> Optional[np.ndarray]:
+        """Row mask for the given filters. None = no filter."""
+        mask: Optional[np.ndarray] = None
+
+        for field, value in (
+            ("department", department),
+            ("category", category),
+            ("document_type", document_type),
+            ("region", region),
+            ("dataset_name", dataset_name),
+        ):
+            if value:
+                bm = self._bitmap(field, value)
+                mask = bm.copy() if mask is None else (mask & bm)
+
+        if created_from or created_to:
+            created_at = self.column("created_at")
+            rng = np.ones(len(self.payloads), dtype=bool)
+            if created_from:
+                rng &= created_at >= created_from
+            if created_to:
+                rng &= created_at <= created_to
+            mask = rng if mask is None else (mask & rng)
+
+        if doc_ids:
+            in_docs = np.zeros(len(self.payloads), dtype=bool)
+            in_docs[self.rows_for("doc_id", doc_ids)] = True
+            mask = in_docs if mask is None else (mask & in_docs)
+
+        return mask
+
+    def save(self, path: str) -> None:
+        np.savez(
+            os.path.join(path, _BITMAPS),
+            **{k: np.packbits(v) for k, v in self.bitmaps.items()},
+        )
+
+    @classmethod
+    def load(cls, path: str, payloads: Sequence[Dict[str, Any]]) -> "PayloadFilter":
+        n = len(payloads)
+        with np.load(os.path.join(path, _BITMAPS)) as packed:
+            bitmaps = {k: np.unpackbits(packed[k], count=n).astype(bool) for k in packed.files}
+        return cls(payloads, bitmaps)
+
+
+class LocalIndex:
+    BACKEND = "local"  # RETRIEVAL_BACKEND that builds this index
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        payloads: List[Dict[str, Any]],
+        payload_filter: Optional[PayloadFilter] = None,
+        model_name: str = "",
+    ):
+        self.vectors = vectors
+        self.ids = ids
+        self.payloads = payloads
+        self.payload_filter = payload_filter
+        self.model_name = model_name
+        self._id_pos = {int(pid): i for i, pid in enumerate(ids)}
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    @property
+    def dim(self) -> int:
+        if self._pending_vectors:
+            return int(self._pending_vectors[0].shape[1])
+        return int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0
+
+    @classmethod
+    def empty(cls, dim: int, model_name: str = "") -> "LocalIndex":
+        return cls(
+            np.zeros((0, dim), dtype=np.float32),
+            np.zeros(0, dtype=np.uint64),
+            [],
+            model_name=model_name,
+        )
+
+    # ── Build / persistence ─────────────────────────────────────────────────
+    def add(
+        self,
+        ids: Sequence[int],
+        vectors: Sequence[Sequence[float]],
+        payloads: Sequence[Dict[str, Any]],
+    ) -> None:
+        """Upsert points. Existing ids are overwritten in place."""
+        vecs = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+
+        # Last occurrence wins when the same id appears twice in one batch
+        latest = {int(pid): row for row, pid in enumerate(ids)}
+
+        new_ids, new_rows = [], []
+        for pid, row in latest.items():
+            payload = payloads[row]
+            pos = self._id_pos.get(pid)
+            if pos is not None:
+                self._materialize()
+                self.vectors[pos] = vecs[row]
+                self.payloads[pos] = dict(payload)
+            else:
+                self._id_pos[pid] = len(self.payloads)
+                self.payloads.append(dict(payload))
+                new_ids.append(pid)
+                new_rows.append(row)
+
+        if new_rows:
+            self._pending_vectors.append(vecs[new_rows])
+            self._pending_ids.extend(new_ids)
+
+        self.payload_filter = None
+
+    def _materialize(self) -> None:
+        """Fold pending inserts into writable in-memory arrays."""
+        if isinstance(self.vectors, np.memmap) or not self.vectors.flags.writeable:
+            self.vectors = np.array(self.vectors, dtype=np.float32)
+        if self._pending_vectors:
+            self.vectors = np.vstack([self.vectors.reshape(-1, self._pending_vectors[0].shape[1])]
+                                     + self._pending_vectors)
+            self.ids = np.concatenate([np.asarray(self.ids, dtype=np.uint64),
+                                       np.asarray(self._pending_ids, dtype=np.uint64)])
+            self._pending_vectors, self._pending_ids = [], []
+
+    def _ensure_ready(self) -> None:
+        if self._pending_vectors:
+            self._materialize()
+        if self.payload_filter is None:
+            self.payload_filter = PayloadFilter(self.payloads)
+
+    def save(self, path: str = LOCAL_INDEX_DIR) -> None:
+        self._ensure_ready()
+        os.makedirs(path, exist_ok=True)
+        _save_array(os.path.join(path, _VECTORS), np.ascontiguousarray(self.vectors, dtype=np.float32))
+        _save_array(os.path.join(path, _IDS), np.asarray(self.ids, dtype=np.uint64))
+        with open(os.path.join(path, _PAYLOADS), "w", encoding="utf-8") as f:
+            for p in self.payloads:
+                f.write(json.dumps(p, ensure_ascii=False) + "\n")
+        self.payload_filter.save(path)
+        manifest = {
+            "model_name": self.model_name,
+            "dim": self.dim,
+            "distance": "cosine",
+            "count": len(self),
+        }
+        with open(os.path.join(path, _MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str = LOCAL_INDEX_DIR) -> "LocalIndex":
+        if not os.path.exists(os.path.join(path, _MANIFEST)):
+            raise FileNotFoundError(f"Missing {cls.BACKEND} index in {path}. "
+                                    f"Run vectorstore/index_builder.py with RETRIEVAL_BACKEND={cls.BACKEND} first.")
+
+        with open(os.path.join(path, _MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        vectors = np.load(os.path.join(path, _VECTORS), mmap_mode="r")
+        ids = np.load(os.path.join(path, _IDS))
+        with open(os.path.join(path, _PAYLOADS), "r", encoding="utf-8") as f:
+            payloads = [json.loads(line) for line in f if line.strip()]
+
+        return cls(
+            vectors, ids, payloads,
+            payload_filter=PayloadFilter.load(path, payloads),
+            model_name=manifest.get("model_name", ""),
+        )
+
+    def payloads_for(self, ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        """Payloads of the given point ids (unknown ids are left out)."""
+        return {int(pid): self.payloads[self._id_pos[int(pid)]] for pid in ids if int(pid) in self._id_pos}
+
+    def vectors_for(self, ids: Sequence[int]) -> Dict[int, np.ndarray]:
+        """Stored vectors of the given point ids (unknown ids are left out)."""
+        self._ensure_ready()
+        return {int(pid): self.vectors[self._id_pos[int(pid)]] for pid in ids if int(pid) in self._id_pos}
+
+    def iter_points(self) -> Iterator[Tuple[int, np.ndarray, Dict[str, Any]]]:
+        """Yield (id, vector, payload) for every stored point."""
+        self._ensure_ready()
+        for i, payload in enumerate(self.payloads):
+            yield int(self.ids[i]), self.vectors[i], payload
+
+    # ── Filtering ────────────────────────────────────────────────────────────
+    def mask(self, **filters: Any) -> Optional[np.ndarray]:
+        """Row mask for build_filter()-style keyword filters. None = no filter."""
+        self._ensure_ready()
+        return self.payload_filter.mask(**filters)
+
+    # ── Search ───────────────────────────────────────────────────────────────
+    def search(
+        self,
+        qvec: Sequence[float],
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        with_payload: bool = True,
+    ) -> List[Dict[str, Any]]:
+        self._ensure_ready()
+        q = _normalize(np.asarray(qvec, dtype=np.float32))
+        mask = self.mask(**filters) if filters else None
+
+        if mask is None:
+            scores = self.vectors @ q
+            rows = top_k_indices(scores, top_k)
+            row_scores = scores[rows]
+        else:
+            candidates = np.flatnonzero(mask)
+            scores = self.vectors[candidates] @ q
+            order = top_k_indices(scores, top_k)
+            rows = candidates[order]
+            row_scores = scores[order]
+
+        return [
+            {
+                "id": int(self.ids[i]),
+                "score": float(s),
+                "payload": self.payloads[i] if with_payload else {},
+            }
+            for i, s in zip(rows, row_scores)
+        ]
+
+
+_local_index: VersionedSingleton[LocalIndex] = VersionedSingleton(lambda: LocalIndex.load(LOCAL_INDEX_DIR))
+
+
+def get_local_index() -> LocalIndex:
+    return _local_index.get()
@@ -1,5 +1,5 @@
 from typing import Optional, Dict, Any, List
-from qdrant_client.models import Filter, FieldCondition, MatchValue, Range
+from qdrant_client.models import Filter, FieldCondition, MatchValue, MatchAny, Range
 
 def _eq(key: str, value: str) -> FieldCondition:
     return FieldCondition(key=key, match=MatchValue(value=value))
@@ -12,6 +12,7 @@ def build_filter(
     dataset_name: Optional[str] = None,
     created_from: Optional[str] = None,  
     created_to: Optional[str] = None,
+    doc_ids: Optional[List[str]] = None,
 ) -> Optional[Filter]:
     must: List[FieldCondition] = []
 
@@ -26,6 +27,9 @@ def build_filter(
     if dataset_name:
         must.append(_eq("dataset_name", dataset_name))
 
+    if doc_ids:
+        must.append(FieldCondition(key="doc_id", match=MatchAny(any=list(doc_ids))))
+
     if created_from or created_to:
         rng = {}
         if created_from:
@@ -0,0 +1,162 @@
+"""
+Filter-aware routing to per-partition Qdrant collections.
+
+Nearly every production query carries a `department` or `region` filter, yet
+a single collection makes Qdrant walk the filtered HNSW graph over every
+point. With PARTITION_FIELD set, points are written to one collection per
+value of that field (`<COLLECTION_NAME>__<field>_<value>`):
+
+  - a query filtered on PARTITION_FIELD searches only its partition;
+  - an unfiltered query fans out to all partitions in parallel and the
+    per-partition top-k lists are merged by score.
+
+Each partition is an ordinary collection, so large partitions can be given
+their own shard/replica settings or placed on different nodes of a Qdrant
+cluster. The partition list is read from Qdrant and cached per index
+version; the version itself is checked at most every
+PARTITION_REFRESH_SECONDS, so a search does not stat the version file.
+
+Usage:
+    PARTITION_FIELD=department python -m vectorstore.reset_collection
+    PARTITION_FIELD=department python -m vectorstore.index_builder
+    from vectorstore.partitions import partitioned_search
+    hits = partitioned_search(qvec, top_k=5, filters={"department": "HR"})
+
+Enable via: PARTITION_FIELD=department (or region, ...) in .env, RETRIEVAL_BACKEND=qdrant
+"""
+import re
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams, PointStruct
+
+from vectorstore.index_version import current_index_version
+from vectorstore.retriever import _qdrant_search, _aqdrant_search
+from vectorstore.qdrant_pool import get_qdrant_client
+from rag_pipeline.configs.settings import (
+    COLLECTION_NAME, PARTITION_FIELD, PARTITION_FANOUT_WORKERS, PARTITION_REFRESH_SECONDS,
+)
+
+PARTITION_FIELDS = ["department", "category", "document_type", "region", "dataset_name"]
+
+if PARTITION_FIELD and PARTITION_FIELD not in PARTITION_FIELDS:
+    raise ValueError(f"PARTITION_FIELD must be one of {PARTITION_FIELDS}, got {PARTITION_FIELD!r}")
+
+_prefix = f"{COLLECTION_NAME}__{PARTITION_FIELD}_"
+
+# Searches every partition of an unfiltered query concurrently
+_fanout_executor = ThreadPoolExecutor(max_workers=PARTITION_FANOUT_WORKERS, thread_name_prefix="partition")
+
+_partitions: Tuple[Optional[int], List[str]] = (None, [])
+_partitions_checked = 0.0  # monotonic time of the last version check
+_partitions_lock = threading.Lock()
+_created: set = set()
+
+
+def partition_collection(value: Any) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", str(value or "").lower()).strip("_") or "unset"
+    return f"{_prefix}{slug}"
+
+
+def list_partitions(refresh: bool = False) -> List[str]:
+    """Partition collections present in Qdrant (cached per index version)."""
+    global _partitions, _partitions_checked
+    now = time.monotonic()
+    if not refresh and _partitions[0] is not None and now - _partitions_checked < PARTITION_REFRESH_SECONDS:
+        return _partitions[1]
+    version = current_index_version()
+    if refresh or _partitions[0] != version:
+        with _partitions_lock:
+            if refresh or _partitions[0] != version:
+                names = [c.name for c in get_qdrant_client().get_collections().collections]
+                _partitions = (version, sorted(n for n in names if n.startswith(_prefix)))
+    _partitions_checked = now
+    return _partitions[1]
+
+
+def searchable_collections() -> List[str]:
+    """Collections holding chunk points: the partitions, or COLLECTION_NAME."""
+    return list_partitions() if PARTITION_FIELD else [COLLECTION_NAME]
+
+
+def route(filters: Optional[Dict[str, Any]]) -> List[str]:
+    """Collections a query must search: its own partition, or all of them."""
+    value = (filters or {}).get(PARTITION_FIELD)
+    partitions = list_partitions()
+    if value:
+        name = partition_collection(value)
+        return [name] if name in partitions else []
+    return partitions
+
+
+def _merge(per_partition: Sequence[List[Dict[str, Any]]], top_k: int) -> List[Dict[str, Any]]:
+    hits = [h for hs in per_partition for h in hs]
+    return sorted(hits, key=lambda h: h["score"], reverse=True)[:top_k]
+
+
+def partitioned_search(
+    qvec: Sequence[float],
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+) -> List[Dict[str, Any]]:
+    collections = route(filters)
+    if len(collections) <= 1:
+        return _qdrant_search(qvec, top_k, filters, with_payload, collections[0]) if collections else []
+    futures = [
+        _fanout_executor.submit(_qdrant_search, qvec, top_k, filters, with_payload, name)
+        for name in collections
+    ]
+    return _merge([f.result() for f in futures], top_k)
+
+
+async def apartitioned_search(
+    qvec: Sequence[float],
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+) -> List[Dict[str, Any]]:
+    collections = route(filters)
+    per_partition = await asyncio.gather(
+        *[_aqdrant_search(qvec, top_k, filters, with_payload, name) for name in collections]
+    )
+    return _merge(per_partition, top_k)
+
+
+# ── Indexing ──────────────────────────────────────────────────────────────────
+def _ensure_collection(client: QdrantClient, name: str, dim: int) -> None:
+    if name in _created:
+        return
+    if not client.collection_exists(name):
+        client.create_collection(
+            collection_name=name,
+            vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+        )
+        print(f"Created partition '{name}' with dim={dim}")
+    _created.add(name)
+
+
+def upsert_points(client: QdrantClient, points: List[PointStruct]) -> None:
+    """Upsert into COLLECTION_NAME, or into each point's partition collection."""
+    if not PARTITION_FIELD:
+        client.upsert(collection_name=COLLECTION_NAME, points=points)
+        return
+    groups: Dict[str, List[PointStruct]] = {}
+    for p in points:
+        groups.setdefault(partition_collection((p.payload or {}).get(PARTITION_FIELD)), []).append(p)
+    for name, group in groups.items():
+        _ensure_collection(client, name, len(group[0].vector))
+        client.upsert(collection_name=name, points=group)
+
+
+def drop_partitions(client: QdrantClient) -> List[str]:
+    names = [c.name for c in client.get_collections().collections if c.name.startswith(_prefix)]
+    for name in names:
+        client.delete_collection(collection_name=name)
+        print(f"Deleted partition {name}")
+    _created.clear()
+    return names
@@ -0,0 +1,262 @@
+"""
+Dimensionality reduction for stored and query vectors.
+
+At 384 float32 dimensions, vector RAM and search cost grow linearly with the
+corpus. With VECTOR_REDUCTION set, every vector written to the index and
+every query vector is mapped to REDUCED_DIM dimensions and L2-normalised
+again, so cosine scores keep their meaning:
+
+  - "pca": a projection fitted on the corpus embeddings, saved to
+    PROJECTION_PATH (mean + components, float32);
+  - "matryoshka": keep the first REDUCED_DIM dimensions. Only meaningful for
+    models trained with Matryoshka loss; all-MiniLM-L6-v2 is not.
+
+The projection id is recorded in the index version file by index_builder
+and snapshot import. At query time the loaded projection must match it, so
+a refitted artifact cannot silently be used against vectors from the old one.
+
+Usage:
+    python -m vectorstore.projection fit --dim 128 --snapshot data/snapshot
+    VECTOR_REDUCTION=pca python -m vectorstore.reset_collection
+    VECTOR_REDUCTION=pca python -m vectorstore.index_builder
+    python -m vectorstore.benchmark_projection
+
+Enable via: VECTOR_REDUCTION=pca (or matryoshka) in .env
+"""
+import os
+import time
+import argparse
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import Optional, List, Sequence
+
+import numpy as np
+
+from vectorstore.index_version import read_index_version
+from rag_pipeline.configs.settings import VECTOR_REDUCTION, REDUCED_DIM, PROJECTION_PATH, SNAPSHOT_DIR
+
+
+class Projection:
+    def __init__(
+        self,
+        method: str,
+        dim: int,
+        source_dim: Optional[int] = None,
+        mean: Optional[np.ndarray] = None,
+        components: Optional[np.ndarray] = None,
+        model_name: str = "",
+        explained_variance: float = 0.0,
+    ):
+        self.method = method
+        self.dim = dim
+        self.source_dim = source_dim
+        self.mean = mean
+        self.components = components  # [dim, source_dim]
+        self.model_name = model_name
+        self.explained_variance = explained_variance
+
+    @property
+    def projection_id(self) -> str:
+        if self.method == "matryoshka":
+            return f"matryoshka-{self.dim}"
+        h = hashlib.sha1(f"{self.method}:{self.source_dim}:{self.dim}".encode("utf-8"))
+        h.update(np.ascontiguousarray(self.mean, dtype=np.float32).tobytes())
+        h.update(np.ascontiguousarray(self.components, dtype=np.float32).tobytes())
+        return f"{self.method}-{self.dim}-{h.hexdigest()[:12]}"
+
+    def apply(self, vectors) -> np.ndarray:
+        """[n, source_dim] -> [n, dim], L2-normalised. Rows already at `dim` pass through."""
+        x = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if x.shape[1] == self.dim:
+            return x
+        if self.method == "matryoshka":
+            out = x[:, : self.dim]
+        else:
+            if x.shape[1] != self.source_dim:
+                raise ValueError(f"Projection expects dim {self.source_dim}, got {x.shape[1]}")
+            out = (x - self.mean) @ self.components.T
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (out / norms).astype(np.float32)
+
+    def save(self, path: str = PROJECTION_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            method=self.method,
+            dim=self.dim,
+            source_dim=self.source_dim,
+            mean=self.mean,
+            components=self.components,
+            model_name=self.model_name,
+            explained_variance=self.explained_variance,
+            fitted_at=datetime.now(timezone.utc).isoformat(),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = PROJECTION_PATH) -> "Projection":
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Missing {path}. Run `python -m vectorstore.projection fit` first.")
+        with np.load(path) as z:
+            return cls(
+                method=str(z["method"]),
+                dim=int(z["dim"]),
+                source_dim=int(z["source_dim"]),
+                mean=z["mean"].astype(np.float32),
+                components=z["components"].astype(np.float32),
+                model_name=str(z["model_name"]),
+                explained_variance=float(z["explained_variance"]),
+            )
+
+
+def fit_pca(vectors, dim: int, model_name: str = "") -> Projection:
+    """PCA from the eigenvectors of the covariance matrix (source_dim x source_dim)."""
+    x = np.asarray(vectors, dtype=np.float64)
+    if dim >= x.shape[1]:
+        raise ValueError(f"Reduced dim {dim} must be below the embedding dim {x.shape[1]}")
+    mean = x.mean(axis=0)
+    xc = x - mean
+    cov = xc.T @ xc / max(len(x) - 1, 1)
+    eigvals, eigvecs = np.linalg.eigh(cov)
+    order = np.argsort(eigvals)[::-1][:dim]
+    return Projection(
+        method="pca",
+        dim=dim,
+        source_dim=x.shape[1],
+        mean=mean.astype(np.float32),
+        components=eigvecs[:, order].T.astype(np.float32),
+        model_name=model_name,
+        explained_variance=float(eigvals[order].sum() / max(eigvals.sum(), 1e-12)),
+    )
+
+
+def matryoshka(dim: int) -> Projection:
+    return Projection(method="matryoshka", dim=dim)
+
+
+def load_projection(method: str = VECTOR_REDUCTION, path: str = PROJECTION_PATH) -> Optional[Projection]:
+    """The configured projection, without checking it against the index (build time)."""
+    if method in ("", "none"):
+        return None
+    if method == "matryoshka":
+        return matryoshka(REDUCED_DIM)
+    if method == "pca":
+        return Projection.load(path)
+    raise ValueError(f"Unknown VECTOR_REDUCTION: {method}")
+
+
+# ── Query time ────────────────────────────────────────────────────────────────
+_projection: Optional[Projection] = None
+_projection_loaded = False
+_projection_lock = threading.Lock()
+
+
+def get_projection() -> Optional[Projection]:
+    """Configured projection, checked against the one the index was built with."""
+    global _projection, _projection_loaded
+    if not _projection_loaded:
+        with _projection_lock:
+            if not _projection_loaded:
+                projection = load_projection()
+                record = read_index_version()
+                built_with = record.get("projection")
+                loaded = projection.projection_id if projection else None
+                if "projection" in record and built_with != loaded:
+                    raise RuntimeError(
+                        f"Index was built with projection {built_with!r} but {loaded!r} is configured. "
+                        f"Rebuild the index or restore the matching {PROJECTION_PATH}."
+                    )
+                _projection = projection
+                _projection_loaded = True
+    return _projection
+
+
+def projection_id() -> Optional[str]:
+    projection = load_projection()
+    return projection.projection_id if projection else None
+
+
+def project_query(qvec: Sequence[float]) -> Sequence[float]:
+    projection = get_projection()
+    if projection is None:
+        return qvec
+    return projection.apply(qvec)[0].tolist()
+
+
+def project_queries(qvecs: Sequence[Sequence[float]]) -> List[Sequence[float]]:
+    projection = get_projection()
+    if projection is None or not len(qvecs):
+        return list(qvecs)
+    return projection.apply(qvecs).tolist()
+
+
+def index_dim() -> int:
+    """Dimension of the vectors stored in the index."""
+    projection = load_projection()
+    if projection is not None:
+        return projection.dim
+    from vectorstore.embedding_generator import embedding_dim
+    return embedding_dim()
+
+
+# ── Fitting ───────────────────────────────────────────────────────────────────
+def _snapshot_vectors(src_dir: str, sample: int) -> np.ndarray:
+    from vectorstore.snapshot import read_manifest, load_shard
+    manifest = read_manifest(src_dir)
+    if manifest.get("projection"):
+        raise ValueError(f"Snapshot {src_dir} already holds reduced vectors ({manifest['projection']})")
+    parts, n = [], 0
+    for shard in manifest["shards"]:
+        _, vectors, _ = load_shard(src_dir, shard["name"])
+        parts.append(np.asarray(vectors[: sample - n], dtype=np.float32))
+        n += len(parts[-1])
+        if n >= sample:
+            break
+    return np.vstack(parts)
+
+
+def _corpus_vectors(sample: int) -> np.ndarray:
+    from vectorstore.index_builder import iter_chunk_payloads
+    from vectorstore.embedding_generator import embed_texts
+    texts = []
+    for payload in iter_chunk_payloads():
+        texts.append(payload["text"])
+        if len(texts) >= sample:
+            break
+    return np.asarray(embed_texts(texts, batch_size=32, show_progress=True, normalize=True), dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the vector projection used by VECTOR_REDUCTION=pca")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fit = sub.add_parser("fit", help="fit PCA on corpus embeddings")
+    fit.add_argument("--dim", type=int, default=REDUCED_DIM)
+    fit.add_argument("--snapshot", default=None, help=f"read vectors from a snapshot (e.g. {SNAPSHOT_DIR}) "
+                                                      "instead of re-embedding the chunks")
+    fit.add_argument("--sample", type=int, default=50_000, help="max vectors used for fitting")
+    fit.add_argument("--out", default=PROJECTION_PATH)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.snapshot:
+        vectors = _snapshot_vectors(args.snapshot, args.sample)
+        from vectorstore.snapshot import read_manifest
+        model = read_manifest(args.snapshot).get("model_name", "")
+    else:
+        from vectorstore.embedding_generator import model_name
+        vectors = _corpus_vectors(args.sample)
+        model = model_name()
+
+    projection = fit_pca(vectors, args.dim, model_name=model)
+    projection.save(args.out)
+    print(f"Fitted PCA {projection.source_dim} -> {projection.dim} on {len(vectors)} vectors "
+          f"(explained variance {projection.explained_variance:.3f}) in {time.perf_counter() - t0:.2f}s")
+    print(f"Projection {projection.projection_id} -> {args.out}")
+    print("Rebuild the index with VECTOR_REDUCTION=pca to store reduced vectors.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Process-wide Qdrant client.
+
+Building a QdrantClient per call pays for a fresh HTTP (or gRPC) connection
+on every query. Every module asks this manager instead: one long-lived
+client per process with a keep-alive connection pool, created lazily on
+first use and re-created after a fork, so gunicorn/uvicorn workers never
+share the parent's sockets.
+
+The async API path gets an AsyncQdrantClient with the same settings, bound
+to the event loop that first asked for it.
+
+Usage:
+    from vectorstore.qdrant_pool import get_qdrant_client
+    client = get_qdrant_client()
+    client.query_points(...)
+    await get_async_qdrant_client().query_points(...)
+
+Enable via: QDRANT_PREFER_GRPC=true, QDRANT_TIMEOUT, QDRANT_POOL_SIZE in .env
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Optional, Dict, Any
+
+import httpx
+from qdrant_client import QdrantClient, AsyncQdrantClient
+
+from rag_pipeline.configs.settings import (
+    QDRANT_URL, QDRANT_PREFER_GRPC, QDRANT_GRPC_PORT, QDRANT_TIMEOUT, QDRANT_POOL_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[QdrantClient] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+_async_client: Optional[AsyncQdrantClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _forget_client() -> None:
+    """Drop the inherited clients in a forked child without closing the
+    parent's connections, and replace a lock that may have been held."""
+    global _client, _client_pid, _client_lock, _async_client, _async_client_loop
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+    _async_client = None
+    _async_client_loop = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_client)
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    return dict(
+        url=QDRANT_URL,
+        prefer_grpc=QDRANT_PREFER_GRPC,
+        grpc_port=QDRANT_GRPC_PORT,
+        timeout=QDRANT_TIMEOUT,
+        # qdrant-client disables keep-alive for localhost by default
+        limits=httpx.Limits(
+            max_connections=QDRANT_POOL_SIZE,
+            max_keepalive_connections=QDRANT_POOL_SIZE,
+        ),
+    )
+
+
+def _create_client() -> QdrantClient:
+    return QdrantClient(**_client_kwargs())
+
+
+def get_qdrant_client() -> QdrantClient:
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = _create_client()
+                _client_pid = pid
+                logger.info("Qdrant client connected to %s (grpc=%s)", QDRANT_URL, QDRANT_PREFER_GRPC)
+    return _client
+
+
+def close_qdrant_client() -> None:
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            try:
+                _client.close()
+            except Exception as exc:
+                logger.warning("Error closing Qdrant client: %s", exc)
+        _client = None
+        _client_pid = None
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Async client for the running event loop. Only call from a coroutine."""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = AsyncQdrantClient(**_client_kwargs())
+        _async_client_loop = loop
+        logger.info("Async Qdrant client connected to %s (grpc=%s)", QDRANT_URL, QDRANT_PREFER_GRPC)
+    return _async_client
+
+
+async def close_async_qdrant_client() -> None:
+    global _async_client, _async_client_loop
+    client, _async_client, _async_client_loop = _async_client, None, None
+    if client is not None:
+        try:
+            await client.close()
+        except Exception as exc:
+            logger.warning("Error closing async Qdrant client: %s", exc)
+
+
+def qdrant_health() -> Dict[str, Any]:
+    """Probe the server with a cheap call. A failed probe drops the client so
+    the next request reconnects instead of reusing a dead connection."""
+    t0 = time.perf_counter()
+    try:
+        get_qdrant_client().get_collections()
+    except Exception as exc:
+        close_qdrant_client()
+        return {"status": "unavailable", "url": QDRANT_URL, "error": str(exc)}
+    return {
+        "status": "ok",
+        "url": QDRANT_URL,
+        "grpc": QDRANT_PREFER_GRPC,
+        "latency_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+    }
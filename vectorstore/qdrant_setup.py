@@ -1,17 +1,24 @@
-from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams
-from vectorstore.embedding_generator import embedding_dim
+from vectorstore.projection import index_dim
 
-QDRANT_URL = "http://localhost:6333"
-COLLECTION_NAME = "hr_chunks"
+from vectorstore.qdrant_pool import get_qdrant_client
+from rag_pipeline.configs.settings import COLLECTION_NAME, PARTITION_FIELD
 
 def main():
-    client = QdrantClient(url=QDRANT_URL)
+    client = get_qdrant_client()
     print("Connected to Qdrant.")
 
-    dim = embedding_dim()
+    dim = index_dim()
     existing = [c.name for c in client.get_collections().collections]
 
+    if PARTITION_FIELD:
+        from vectorstore.partitions import list_partitions
+        partitions = list_partitions(refresh=True)
+        print(f"Partitioned by '{PARTITION_FIELD}': {len(partitions)} collections, created by index_builder (dim={dim})")
+        for name in partitions:
+            print(f"  {name}: {client.count(name).count} points")
+        return
+
     if COLLECTION_NAME not in existing:
         client.create_collection(
             collection_name=COLLECTION_NAME,
@@ -31,8 +38,8 @@ def main():
         pass
 
     if size is not None and size != dim:
-        print(f" Dimension mismatch: collection size={size} but embedding_dim={dim}")
-        print("   Fix: delete & recreate collection, or use the matching embedding model.")
+        print(f" Dimension mismatch: collection size={size} but index dim={dim}")
+        print("   Fix: delete & recreate collection, or use the matching embedding model / VECTOR_REDUCTION.")
     else:
         print(f"Collection '{COLLECTION_NAME}' exists and dim looks OK ({dim}).")
 
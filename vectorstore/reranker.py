@@ -4,26 +4,278 @@ Cross-encoder re-ranking for retrieved chunks.
 Uses sentence-transformers CrossEncoder (cross-encoder/ms-marco-MiniLM-L-6-v2)
 to re-score query-document pairs and return the top_k most relevant chunks.
 
+Scoring goes through a small service instead of one `predict` per request:
+  - an LRU score cache keyed by (query hash, index version, chunk_id), so
+    re-asked questions and overlapping candidate sets are not scored twice,
+    and a reindex that rewrites a chunk under the same id is rescored;
+  - chunk text is cut to the model's token budget before it is sent, rather
+    than shipping the full 3.5 KB chunk for the CrossEncoder to truncate;
+  - a dispatcher thread merges the pairs of concurrent requests into shared
+    `predict` batches (up to RERANK_BATCH_SIZE pairs, waiting at most
+    RERANK_MAX_WAIT_MS) and runs them on RERANK_WORKERS threads.
+
 Usage:
-    from vectorstore.reranker import rerank
+    from vectorstore.reranker import rerank, arerank
     reranked = rerank(query, retrieved_chunks, top_k=5)
+    reranked = await arerank(query, retrieved_chunks, top_k=5)
+    reranked = cascade_rerank(query, retrieved_chunks, top_k=5)
+
+Cascade mode (`cascade_rerank`) reads the dense score distribution first and
+skips the cross-encoder when the order is already decisive, or scores only
+the ambiguous band around rank k.
 
-Enable via: ENABLE_RERANKING=true in .env
+Enable via: ENABLE_RERANKING=true in .env (RERANK_CASCADE=true for cascade)
 """
-from typing import List, Dict, Any
+import os
+import time
+import queue
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+from vectorstore.index_version import current_index_version
+from rag_pipeline.configs.settings import (
+    RERANK_CACHE_SIZE, RERANK_BATCH_SIZE, RERANK_MAX_WAIT_MS, RERANK_WORKERS, RERANK_MAX_TOKENS,
+    RERANK_SKIP_MIN_SCORE, RERANK_SKIP_MARGIN, RERANK_BAND,
+)
+
+logger = logging.getLogger(__name__)
 
 _cross_encoder = None
+_cross_encoder_lock = threading.Lock()
 _MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
 
 
 def _get_cross_encoder():
     global _cross_encoder
     if _cross_encoder is None:
-        from sentence_transformers import CrossEncoder
-        _cross_encoder = CrossEncoder(_MODEL_NAME)
+        with _cross_encoder_lock:
+            if _cross_encoder is None:
+                from sentence_transformers import CrossEncoder
+                _cross_encoder = CrossEncoder(_MODEL_NAME)
     return _cross_encoder
 
 
+# ── Input truncation ─────────────────────────────────────────────────────────
+def _max_tokens(encoder) -> int:
+    model_max = getattr(encoder, "max_length", None) or RERANK_MAX_TOKENS
+    return min(model_max, RERANK_MAX_TOKENS)
+
+
+def truncate_pair(encoder, query: str, text: str) -> str:
+    """Cut `text` so [CLS] query [SEP] text [SEP] fits the model's max tokens.
+
+    Uses the model tokenizer's offset mapping so the original text is kept
+    (no decode round trip); falls back to ~4 characters per token.
+    """
+    max_tokens = _max_tokens(encoder)
+    tokenizer = getattr(encoder, "tokenizer", None)
+    if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+        budget = max(max_tokens - len(query.split()) * 2 - 3, 16)
+        return text[: budget * 4]
+
+    q_tokens = len(tokenizer(query, add_special_tokens=False)["input_ids"])
+    budget = max(max_tokens - q_tokens - 3, 16)
+    # Bound tokenizer work: a word-piece is never shorter than one character
+    head = text[: budget * 8]
+    enc = tokenizer(
+        head,
+        add_special_tokens=False,
+        truncation=True,
+        max_length=budget,
+        return_offsets_mapping=True,
+    )
+    offsets = enc["offset_mapping"]
+    if not offsets or len(enc["input_ids"]) < budget:
+        return head
+    return head[: offsets[-1][1]]
+
+
+# ── Score cache ───────────────────────────────────────────────────────────────
+_Key = Tuple[str, int, str]  # (query sha1, index version, chunk key)
+
+
+class _ScoreCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._scores: "OrderedDict[_Key, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: _Key) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._scores.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key: _Key, score: float) -> None:
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_size:
+                self._scores.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scores.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._scores),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_score_cache = _ScoreCache(RERANK_CACHE_SIZE)
+
+
+# ── Cross-request batching ───────────────────────────────────────────────────
+class _Job:
+    __slots__ = ("pairs", "future")
+
+    def __init__(self, pairs: List[List[str]]):
+        self.pairs = pairs
+        self.future: Future = Future()
+
+
+class RerankDispatcher:
+    """Merges pending scoring jobs into shared `predict` batches."""
+
+    def __init__(
+        self,
+        batch_size: int = RERANK_BATCH_SIZE,
+        max_wait_ms: float = RERANK_MAX_WAIT_MS,
+        workers: int = RERANK_WORKERS,
+    ):
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self.batches = 0
+        self.pairs_scored = 0
+
+    def _start(self) -> None:
+        # (Re)start after a fork: threads are not inherited by the child
+        self._queue: "queue.Queue[_Job]" = queue.Queue()
+        self._slots = threading.Semaphore(self.workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rerank")
+        threading.Thread(target=self._loop, name="rerank-dispatcher", daemon=True).start()
+        self._pid = os.getpid()
+
+    def submit(self, pairs: List[List[str]]) -> Future:
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+        job = _Job(pairs)
+        self._queue.put(job)
+        return job.future
+
+    def _loop(self) -> None:
+        while True:
+            jobs = [self._queue.get()]
+            n_pairs = len(jobs[0].pairs)
+            # Wait for a free worker; requests that arrive meanwhile join this batch
+            self._slots.acquire()
+            deadline = time.monotonic() + self.max_wait
+            while n_pairs < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                n_pairs += len(job.pairs)
+            self._pool.submit(self._run, jobs)
+
+    def _run(self, jobs: List[_Job]) -> None:
+        try:
+            pairs = [p for job in jobs for p in job.pairs]
+            try:
+                scores = _get_cross_encoder().predict(pairs, batch_size=self.batch_size)
+            except Exception as exc:
+                for job in jobs:
+                    job.future.set_exception(exc)
+                return
+            self.batches += 1
+            self.pairs_scored += len(pairs)
+            start = 0
+            for job in jobs:
+                end = start + len(job.pairs)
+                job.future.set_result([float(s) for s in scores[start:end]])
+                start = end
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "pairs_scored": self.pairs_scored,
+            "avg_batch_pairs": round(self.pairs_scored / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+_dispatcher = RerankDispatcher()
+
+
+# ── Public API ────────────────────────────────────────────────────────────────
+def _chunk_key(result: Dict[str, Any]) -> str:
+    payload = result.get("payload", {}) or {}
+    return str(payload.get("chunk_id") or result.get("id"))
+
+
+def _prepare(query: str, results: List[Dict[str, Any]]):
+    """Cached scores plus the (index, key, pair) list still to be scored."""
+    q_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()
+    version = current_index_version()
+    scores: List[Optional[float]] = []
+    todo: List[Tuple[int, _Key, List[str]]] = []
+    encoder = None
+    for i, r in enumerate(results):
+        key = (q_hash, version, _chunk_key(r))
+        score = _score_cache.get(key)
+        scores.append(score)
+        if score is None:
+            encoder = encoder or _get_cross_encoder()
+            text = (r.get("payload", {}) or {}).get("text", "")
+            todo.append((i, key, [query, truncate_pair(encoder, query, text)]))
+    return scores, todo
+
+
+def _finish(
+    results: List[Dict[str, Any]],
+    scores: List[Optional[float]],
+    todo: List[Tuple[int, _Key, List[str]]],
+    new_scores: List[float],
+    top_k: int,
+) -> List[Dict[str, Any]]:
+    for (i, key, _), score in zip(todo, new_scores):
+        _score_cache.put(key, score)
+        scores[i] = score
+    ranked = sorted(zip(scores, range(len(results))), key=lambda x: x[0], reverse=True)
+    out = []
+    for score, i in ranked[:top_k]:
+        results[i]["rerank_score"] = score
+        out.append(results[i])
+    return out
+
+
 def rerank(query: str, results: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
     """Re-rank retrieved chunks using a cross-encoder.
 
@@ -33,17 +285,96 @@ def rerank(query: str, results: List[Dict[str, Any]], top_k: int) -> List[Dict[s
         top_k: Number of top results to return after re-ranking.
 
     Returns:
-        Re-ranked and truncated list of results.
+        Re-ranked and truncated list of results (each with 'rerank_score').
     """
     if not results:
         return results
 
-    encoder = _get_cross_encoder()
+    scores, todo = _prepare(query, results)
+    new_scores = _dispatcher.submit([pair for _, _, pair in todo]).result() if todo else []
+    return _finish(results, scores, todo, new_scores, top_k)
+
+
+async def arerank(query: str, results: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """`rerank` that awaits the dispatcher instead of blocking a thread."""
+    if not results:
+        return results
+
+    from vectorstore.cpu_pool import run_cpu
+    scores, todo = await run_cpu(_prepare, query, results)
+    new_scores = await asyncio.wrap_future(_dispatcher.submit([pair for _, _, pair in todo])) if todo else []
+    return _finish(results, scores, todo, new_scores, top_k)
+
+
+# ── Cascade ──────────────────────────────────────────────────────────────────
+_cascade_counts = {"skip": 0, "band": 0, "full": 0, "pairs_avoided": 0}
+_cascade_lock = threading.Lock()
+
+
+def cascade_plan(
+    results: List[Dict[str, Any]],
+    top_k: int,
+    min_score: float = RERANK_SKIP_MIN_SCORE,
+    margin: float = RERANK_SKIP_MARGIN,
+    band: float = RERANK_BAND,
+) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Decide how much of `results` (sorted by dense "score") needs the cross-encoder.
+
+    Returns (decision, kept, to_rerank):
+      - "skip": top score >= min_score and rank k beats rank k+1 by >= margin;
+        `kept` is the dense top_k, nothing is reranked.
+      - "band": top score is high but the cut-off is close; hits scoring more
+        than `band` above rank k are kept in dense order, hits within `band`
+        of rank k are reranked for the remaining slots, the rest are dropped.
+      - "full": top score < min_score, the dense order is not trusted.
+    """
+    if not results:
+        return "skip", [], []
+    scores = [float(r.get("score") or 0.0) for r in results]
+    if scores[0] < min_score:
+        return "full", [], results
+
+    k = min(top_k, len(results))
+    s_k = scores[k - 1]
+    gap = s_k - scores[k] if len(results) > k else float("inf")
+    if gap >= margin:
+        return "skip", results[:k], []
+
+    kept = [r for r, s in zip(results[:k], scores) if s > s_k + band]
+    ambiguous = [r for r, s in zip(results, scores) if s_k - band <= s <= s_k + band]
+    return "band", kept, ambiguous
+
+
+def _record(decision: str, n_results: int, n_reranked: int) -> None:
+    with _cascade_lock:
+        _cascade_counts[decision] += 1
+        _cascade_counts["pairs_avoided"] += n_results - n_reranked
+
+
+def cascade_rerank(query: str, results: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """`rerank` that only scores what `cascade_plan` marks as ambiguous."""
+    decision, kept, todo = cascade_plan(results, top_k)
+    _record(decision, len(results), len(todo))
+    if not todo:
+        return kept
+    return kept + rerank(query, todo, top_k - len(kept))
+
+
+async def acascade_rerank(query: str, results: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    decision, kept, todo = cascade_plan(results, top_k)
+    _record(decision, len(results), len(todo))
+    if not todo:
+        return kept
+    return kept + await arerank(query, todo, top_k - len(kept))
+
 
-    texts = [r.get("payload", {}).get("text", "") for r in results]
-    pairs = [[query, t] for t in texts]
+def clear_rerank_cache() -> None:
+    _score_cache.clear()
 
-    scores = encoder.predict(pairs)
 
-    ranked = sorted(zip(scores, results), key=lambda x: x[0], reverse=True)
-    return [r for _, r in ranked[:top_k]]
+def reranker_stats() -> Dict[str, Any]:
+    with _cascade_lock:
+        cascade = dict(_cascade_counts)
+    decided = cascade["skip"] + cascade["band"] + cascade["full"]
+    cascade["skip_rate"] = round(cascade["skip"] / decided, 4) if decided else 0.0
+    return {"score_cache": _score_cache.stats(), "dispatcher": _dispatcher.stats(), "cascade": cascade}
@@ -1,24 +1,32 @@
-from qdrant_client import QdrantClient
-from vectorstore.embedding_generator import embedding_dim
+from vectorstore.projection import index_dim, projection_id
 from qdrant_client.models import Distance, VectorParams
 
-QDRANT_URL = "http://localhost:6333"
-COLLECTION_NAME = "hr_chunks"
+from vectorstore.qdrant_pool import get_qdrant_client
+from vectorstore.index_version import bump_index_version
+from vectorstore.partitions import drop_partitions
+from rag_pipeline.configs.settings import COLLECTION_NAME, PARTITION_FIELD
 
 def main():
-    client = QdrantClient(url=QDRANT_URL)
-    dim = embedding_dim()
+    client = get_qdrant_client()
+    dim = index_dim()
 
     existing = [c.name for c in client.get_collections().collections]
     if COLLECTION_NAME in existing:
         client.delete_collection(collection_name=COLLECTION_NAME)
         print(f"Deleted collection {COLLECTION_NAME}")
 
+    # Recreated in partitioned mode too (left empty), so tools addressing
+    # COLLECTION_NAME directly still find it
     client.create_collection(
         collection_name=COLLECTION_NAME,
         vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
     )
     print(f"Recreated collection {COLLECTION_NAME} dim={dim}")
 
+    if PARTITION_FIELD:
+        drop_partitions(client)
+        print(f"Partitions by '{PARTITION_FIELD}' are created by index_builder dim={dim}")
+    bump_index_version("reset_collection", projection=projection_id())
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Retrieval-stage cache.
+
+Maps (query vector, filters, fetch size, search options, index version) to
+the list of hits returned by the backend. It sits below the API answer cache:
+a re-asked question skips Qdrant even when the answer cache misses (another
+top_k, a changed prompt), and bumping the index version (see
+vectorstore/index_version.py) makes every older entry unreachable.
+
+Usage:
+    from vectorstore.retrieval_cache import get_retrieval_cache
+    cache = get_retrieval_cache()
+    key = cache.key(qvec, top_k, filters, with_payload, two_stage)
+    hits = cache.get(key)
+
+Enable via: ENABLE_RETRIEVAL_CACHE=true in .env (default)
+"""
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+
+from vectorstore.index_version import current_index_version
+from rag_pipeline.configs.settings import (
+    RETRIEVAL_BACKEND, COLLECTION_NAME, RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL_SECONDS,
+)
+
+
+class RetrievalCache:
+    def __init__(self, max_size: int = RETRIEVAL_CACHE_SIZE, ttl_seconds: int = RETRIEVAL_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(
+        self,
+        qvec: Sequence[float],
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        with_payload: bool,
+        two_stage: bool,
+        offset: int = 0,
+    ) -> str:
+        h = hashlib.sha256(np.asarray(qvec, dtype=np.float32).tobytes())
+        h.update(json.dumps(
+            {
+                "filters": filters or {},
+                "top_k": top_k,
+                "offset": offset,
+                "with_payload": with_payload,
+                "two_stage": two_stage,
+                "backend": RETRIEVAL_BACKEND,
+                "collection": COLLECTION_NAME,
+                "version": current_index_version(),
+            },
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] >= self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            hits = entry[1]
+        # Callers (rerank, RRF) may annotate hits; keep the cached copy clean
+        return [copy.copy(h) for h in hits]
+
+    def put(self, key: str, hits: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), [copy.copy(h) for h in hits])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "index_version": current_index_version(),
+            }
+
+
+_retrieval_cache: Optional[RetrievalCache] = None
+_retrieval_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    global _retrieval_cache
+    if _retrieval_cache is None:
+        with _retrieval_cache_lock:
+            if _retrieval_cache is None:
+                _retrieval_cache = RetrievalCache()
+    return _retrieval_cache
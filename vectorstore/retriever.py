@@ -1,37 +1,637 @@
-from typing import Optional, Dict, Any, List
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter
+import asyncio
+import logging
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Sequence, Union
 
-from vectorstore.embedding_generator import embed_text
+import grpc
+import httpx
+from qdrant_client.http.exceptions import ApiException
+from qdrant_client.models import Filter, QueryRequest
+
+from vectorstore.embedding_generator import embed_text, embed_texts
 from vectorstore.metadata_filter import build_filter
-from rag_pipeline.configs.settings import QDRANT_URL, COLLECTION_NAME
+from vectorstore.qdrant_pool import get_qdrant_client, get_async_qdrant_client
+from vectorstore.cpu_pool import run_cpu
+from vectorstore.retrieval_cache import get_retrieval_cache
+from vectorstore.projection import project_query, project_queries
+from vectorstore.fallback_index import fallback_search
+from rag_pipeline.circuit_breaker import qdrant_breaker, guard, CircuitOpenError
+from rag_pipeline.configs.settings import (
+    COLLECTION_NAME, RETRIEVAL_BACKEND, RETRIEVAL_MODE, HYBRID_CANDIDATES, RRF_K,
+    ENABLE_TWO_STAGE, ENABLE_RETRIEVAL_CACHE, PARTITION_FIELD,
+)
 
-def retrieve(
-    query: str,
-    top_k: int = 5,
-    filters: Optional[Dict[str, Any]] = None,
-    with_payload: bool = True,
+logger = logging.getLogger(__name__)
+
+# Runs the dense leg of hybrid retrieval alongside the lexical leg
+_hybrid_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid")
+
+# Qdrant down, failing or behind an open breaker: answered from the fallback
+# index. Anything else is a bug and propagates.
+_QDRANT_ERRORS = (CircuitOpenError, ApiException, grpc.RpcError, httpx.TransportError, ConnectionError, TimeoutError)
+
+def _qdrant_search(
+    qvec: Sequence[float],
+    top_k: int,
+    filters: Optional[Dict[str, Any]],
+    with_payload: bool,
+    collection: str = COLLECTION_NAME,
+    offset: int = 0,
 ) -> List[Dict[str, Any]]:
-    client = QdrantClient(url=QDRANT_URL)
-    qvec = embed_text(query)
+    client = get_qdrant_client()
 
     flt: Optional[Filter] = build_filter(**filters) if filters else None
 
     hits = client.query_points(
-        collection_name=COLLECTION_NAME,
-        query=qvec,
+        collection_name=collection,
+        query=list(qvec),
+        query_filter=flt,
+        limit=top_k,
+        offset=offset,
+        with_payload=with_payload,
+    )
+
+    return _to_results(hits.points)
+
+async def _aqdrant_search(
+    qvec: Sequence[float],
+    top_k: int,
+    filters: Optional[Dict[str, Any]],
+    with_payload: bool,
+    collection: str = COLLECTION_NAME,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    flt: Optional[Filter] = build_filter(**filters) if filters else None
+
+    hits = await get_async_qdrant_client().query_points(
+        collection_name=collection,
+        query=list(qvec),
         query_filter=flt,
         limit=top_k,
+        offset=offset,
         with_payload=with_payload,
     )
+    return _to_results(hits.points)
 
+def _qdrant_search_batch(
+    qvecs: Sequence[Sequence[float]],
+    top_k: int,
+    filters_list: Sequence[Optional[Dict[str, Any]]],
+    with_payload: bool,
+) -> List[List[Dict[str, Any]]]:
+    """All queries in one query_batch_points round trip."""
+    if not qvecs:
+        return []
+    responses = get_qdrant_client().query_batch_points(
+        collection_name=COLLECTION_NAME,
+        requests=[
+            QueryRequest(
+                query=list(qvec),
+                filter=build_filter(**filters) if filters else None,
+                limit=top_k,
+                with_payload=with_payload,
+            )
+            for qvec, filters in zip(qvecs, filters_list)
+        ],
+    )
+    return [_to_results(r.points) for r in responses]
+
+def _to_results(points) -> List[Dict[str, Any]]:
     results: List[Dict[str, Any]] = []
-    for p in hits.points:
+    for p in points:
         results.append({"id": p.id, "score": float(p.score), "payload": p.payload or {}})
     return results
 
+def _backend_search(
+    qvec: Sequence[float],
+    top_k: int,
+    filters: Optional[Dict[str, Any]],
+    with_payload: bool,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """Hits ranked offset .. offset + top_k - 1. Qdrant skips the offset
+    server-side; the in-process indexes and the partition merge rank the
+    whole prefix and slice it."""
+    if RETRIEVAL_BACKEND == "local":
+        from vectorstore.local_index import get_local_index
+        hits = get_local_index().search(qvec, top_k=top_k + offset, filters=filters, with_payload=with_payload)
+        return hits[offset:]
+    if RETRIEVAL_BACKEND == "hnsw":
+        from vectorstore.hnsw_index import get_hnsw_index
+        hits = get_hnsw_index().search(qvec, top_k=top_k + offset, filters=filters, with_payload=with_payload)
+        return hits[offset:]
+    if RETRIEVAL_BACKEND == "qdrant":
+        if PARTITION_FIELD:
+            from vectorstore.partitions import partitioned_search
+            return partitioned_search(qvec, top_k + offset, filters, with_payload)[offset:]
+        return _qdrant_search(qvec, top_k, filters, with_payload, offset=offset)
+    raise ValueError(f"Unknown RETRIEVAL_BACKEND: {RETRIEVAL_BACKEND}")
+
+def _is_fallback(hits: List[Dict[str, Any]]) -> bool:
+    return any(h.get("fallback") for h in hits)
+
+def _fallback_or_raise(exc: Exception, qvecs, top_k, filters_list, with_payload) -> List[List[Dict[str, Any]]]:
+    results = [fallback_search(v, top_k, f, with_payload) for v, f in zip(qvecs, filters_list)]
+    if any(r is None for r in results):
+        raise exc
+    logger.warning("Qdrant unavailable (%s), %d queries answered from the fallback index", exc, len(results))
+    return results
+
+def _guarded(run, qvec, top_k, filters, with_payload, offset: int = 0) -> List[Dict[str, Any]]:
+    """`run()` behind the Qdrant circuit breaker. While the breaker is open,
+    or when the call fails, the fallback index answers instead."""
+    breaker = qdrant_breaker()
+    if breaker is None:
+        return run()
+    try:
+        with guard(breaker):
+            return run()
+    except _QDRANT_ERRORS as exc:
+        return _fallback_or_raise(exc, [qvec], top_k + offset, [filters], with_payload)[0][offset:]
+
+async def _aguarded(run, qvec, top_k, filters, with_payload, offset: int = 0) -> List[Dict[str, Any]]:
+    breaker = qdrant_breaker()
+    if breaker is None:
+        return await run()
+    try:
+        with guard(breaker):
+            return await run()
+    except _QDRANT_ERRORS as exc:
+        results = await run_cpu(_fallback_or_raise, exc, [qvec], top_k + offset, [filters], with_payload)
+        return results[0][offset:]
+
+def search(
+    qvec: Sequence[float],
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+    two_stage: Optional[bool] = None,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """Search the configured backend (RETRIEVAL_BACKEND) with an already-embedded query.
+
+    With two-stage retrieval (ENABLE_TWO_STAGE, or `two_stage=True`) the
+    closest documents are picked first and only their chunks are searched.
+    Hits are cached per index version (ENABLE_RETRIEVAL_CACHE). With
+    VECTOR_REDUCTION the query is projected like the stored vectors.
+    `offset` skips the best hits, so a caller widening a page fetches only
+    the new tail.
+    """
+    qvec = project_query(qvec)
+    use_two_stage = ENABLE_TWO_STAGE if two_stage is None else two_stage
+    cache = get_retrieval_cache() if ENABLE_RETRIEVAL_CACHE else None
+    if cache is not None:
+        key = cache.key(qvec, top_k, filters, with_payload, use_two_stage, offset)
+        hits = cache.get(key)
+        if hits is not None:
+            return hits
+
+    def run() -> List[Dict[str, Any]]:
+        if use_two_stage and not (filters or {}).get("doc_ids"):
+            from vectorstore.doc_index import two_stage_search
+            return two_stage_search(
+                qvec, top_k, filters, with_payload, chunk_search=partial(_backend_search, offset=offset),
+            )
+        return _backend_search(qvec, top_k, filters, with_payload, offset)
+
+    hits = _guarded(run, qvec, top_k, filters, with_payload, offset) if RETRIEVAL_BACKEND == "qdrant" else run()
+
+    # Fallback hits come from a possibly older snapshot: not cached
+    if cache is not None and not _is_fallback(hits):
+        cache.put(key, hits)
+    return hits
+
+def _payload_collections(filters: Optional[Dict[str, Any]]) -> List[str]:
+    if PARTITION_FIELD:
+        from vectorstore.partitions import route
+        return route(filters)
+    return [COLLECTION_NAME]
+
+def _index_payloads(hits: List[Dict[str, Any]]) -> Optional[Dict[int, Dict[str, Any]]]:
+    """Payloads from the in-process index the hits came from; None for Qdrant."""
+    ids = [h["id"] for h in hits]
+    if _is_fallback(hits):
+        from vectorstore.fallback_index import get_fallback_index
+        index = get_fallback_index()
+        return index.payloads_for(ids) if index is not None else {}
+    if RETRIEVAL_BACKEND == "local":
+        from vectorstore.local_index import get_local_index
+        return get_local_index().payloads_for(ids)
+    if RETRIEVAL_BACKEND == "hnsw":
+        from vectorstore.hnsw_index import get_hnsw_index
+        return get_hnsw_index().payloads_for(ids)
+    return None
+
+def _fallback_payloads(exc: Exception, hits: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    from vectorstore.fallback_index import get_fallback_index
+    index = get_fallback_index()
+    if index is None:
+        raise exc
+    return index.payloads_for([h["id"] for h in hits])
+
+def _with_payloads(hits: List[Dict[str, Any]], payloads: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{**h, "payload": payloads.get(int(h["id"]), {})} for h in hits]
+
+def fetch_payloads(hits: List[Dict[str, Any]], filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Fill in the payloads of hits searched with with_payload=False, by id
+    in one lookup per collection (`filters` routes it to the partitions)."""
+    if not hits:
+        return hits
+    payloads = _index_payloads(hits)
+    if payloads is None:
+        ids = [h["id"] for h in hits]
+        payloads = {}
+        try:
+            with guard(qdrant_breaker()):
+                for collection in _payload_collections(filters):
+                    for p in get_qdrant_client().retrieve(
+                        collection_name=collection, ids=ids, with_payload=True, with_vectors=False,
+                    ):
+                        payloads[int(p.id)] = p.payload or {}
+        except _QDRANT_ERRORS as exc:
+            if qdrant_breaker() is None:
+                raise
+            payloads = _fallback_payloads(exc, hits)
+    return _with_payloads(hits, payloads)
+
+async def afetch_payloads(hits: List[Dict[str, Any]], filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    if not hits:
+        return hits
+    if RETRIEVAL_BACKEND != "qdrant" or _is_fallback(hits):
+        return await run_cpu(fetch_payloads, hits, filters)
+    ids = [h["id"] for h in hits]
+    payloads: Dict[int, Dict[str, Any]] = {}
+    try:
+        with guard(qdrant_breaker()):
+            for collection in await run_cpu(_payload_collections, filters):
+                for p in await get_async_qdrant_client().retrieve(
+                    collection_name=collection, ids=ids, with_payload=True, with_vectors=False,
+                ):
+                    payloads[int(p.id)] = p.payload or {}
+    except _QDRANT_ERRORS as exc:
+        if qdrant_breaker() is None:
+            raise
+        payloads = await run_cpu(_fallback_payloads, exc, hits)
+    return _with_payloads(hits, payloads)
+
+def _index_vectors(hits: List[Dict[str, Any]]) -> Optional[Dict[int, Any]]:
+    """Vectors from the in-process index the hits came from; None for Qdrant."""
+    ids = [h["id"] for h in hits]
+    if _is_fallback(hits):
+        from vectorstore.fallback_index import get_fallback_index
+        index = get_fallback_index()
+        return index.vectors_for(ids) if index is not None else {}
+    if RETRIEVAL_BACKEND == "local":
+        from vectorstore.local_index import get_local_index
+        return get_local_index().vectors_for(ids)
+    if RETRIEVAL_BACKEND == "hnsw":
+        from vectorstore.hnsw_index import get_hnsw_index
+        return get_hnsw_index().vectors_for(ids)
+    return None
+
+def _point_vectors(points) -> Dict[int, Any]:
+    # Unnamed vectors only; anything else is left to the caller to encode
+    return {int(p.id): p.vector for p in points if isinstance(p.vector, list)}
+
+def fetch_vectors(hits: List[Dict[str, Any]], filters: Optional[Dict[str, Any]] = None) -> Dict[int, Any]:
+    """Stored (projected) vectors of `hits` by point id, looked up like
+    `fetch_payloads`. Best effort: ids Qdrant could not return are left out."""
+    if not hits:
+        return {}
+    vectors = _index_vectors(hits)
+    if vectors is not None:
+        return vectors
+    ids = [h["id"] for h in hits]
+    vectors = {}
+    try:
+        with guard(qdrant_breaker()):
+            for collection in _payload_collections(filters):
+                vectors.update(_point_vectors(get_qdrant_client().retrieve(
+                    collection_name=collection, ids=ids, with_payload=False, with_vectors=True,
+                )))
+    except _QDRANT_ERRORS as exc:
+        logger.warning("Vector lookup failed (%s) | ids=%d", exc, len(ids))
+    return vectors
+
+async def afetch_vectors(hits: List[Dict[str, Any]], filters: Optional[Dict[str, Any]] = None) -> Dict[int, Any]:
+    if not hits:
+        return {}
+    if RETRIEVAL_BACKEND != "qdrant" or _is_fallback(hits):
+        return await run_cpu(fetch_vectors, hits, filters)
+    ids = [h["id"] for h in hits]
+    vectors: Dict[int, Any] = {}
+    try:
+        with guard(qdrant_breaker()):
+            for collection in await run_cpu(_payload_collections, filters):
+                vectors.update(_point_vectors(await get_async_qdrant_client().retrieve(
+                    collection_name=collection, ids=ids, with_payload=False, with_vectors=True,
+                )))
+    except _QDRANT_ERRORS as exc:
+        logger.warning("Vector lookup failed (%s) | ids=%d", exc, len(ids))
+    return vectors
+
+def _per_query_filters(
+    filters: Union[None, Dict[str, Any], Sequence[Optional[Dict[str, Any]]]],
+    n: int,
+) -> List[Optional[Dict[str, Any]]]:
+    """One shared filter dict, or one per query."""
+    if filters is None or isinstance(filters, dict):
+        return [filters] * n
+    filters_list = list(filters)
+    if len(filters_list) != n:
+        raise ValueError(f"Got {len(filters_list)} filter sets for {n} queries")
+    return filters_list
+
+def search_batch(
+    qvecs: Sequence[Sequence[float]],
+    top_k: int = 5,
+    filters: Union[None, Dict[str, Any], Sequence[Optional[Dict[str, Any]]]] = None,
+    with_payload: bool = True,
+    two_stage: Optional[bool] = None,
+) -> List[List[Dict[str, Any]]]:
+    """`search` for many query vectors. On Qdrant this is one batch request
+    (two with two-stage retrieval); the in-process backends and partitioned
+    collections are searched per query."""
+    filters_list = _per_query_filters(filters, len(qvecs))
+    qvecs = project_queries(qvecs)
+    if RETRIEVAL_BACKEND != "qdrant" or PARTITION_FIELD:
+        return [search(v, top_k, f, with_payload, two_stage) for v, f in zip(qvecs, filters_list)]
+
+    use_two_stage = ENABLE_TWO_STAGE if two_stage is None else two_stage
+    cache = get_retrieval_cache() if ENABLE_RETRIEVAL_CACHE else None
+    if cache is None:
+        return _guarded_batch(qvecs, top_k, filters_list, with_payload, use_two_stage)
+
+    # Only the cache misses go to Qdrant
+    keys = [cache.key(v, top_k, f, with_payload, use_two_stage) for v, f in zip(qvecs, filters_list)]
+    results = [cache.get(k) for k in keys]
+    misses = [i for i, r in enumerate(results) if r is None]
+    if misses:
+        fetched = _guarded_batch(
+            [qvecs[i] for i in misses], top_k, [filters_list[i] for i in misses], with_payload, use_two_stage,
+        )
+        for i, hits in zip(misses, fetched):
+            if not _is_fallback(hits):
+                cache.put(keys[i], hits)
+            results[i] = hits
+    return results
+
+def _guarded_batch(
+    qvecs: Sequence[Sequence[float]],
+    top_k: int,
+    filters_list: List[Optional[Dict[str, Any]]],
+    with_payload: bool,
+    use_two_stage: bool,
+) -> List[List[Dict[str, Any]]]:
+    breaker = qdrant_breaker()
+    if breaker is None:
+        return _qdrant_search_batch_staged(qvecs, top_k, filters_list, with_payload, use_two_stage)
+    # The staged search adds doc_ids to the filters; the fallback gets the originals
+    original_filters = list(filters_list)
+    try:
+        with guard(breaker):
+            return _qdrant_search_batch_staged(qvecs, top_k, filters_list, with_payload, use_two_stage)
+    except _QDRANT_ERRORS as exc:
+        return _fallback_or_raise(exc, qvecs, top_k, original_filters, with_payload)
+
+def _qdrant_search_batch_staged(
+    qvecs: Sequence[Sequence[float]],
+    top_k: int,
+    filters_list: List[Optional[Dict[str, Any]]],
+    with_payload: bool,
+    use_two_stage: bool,
+) -> List[List[Dict[str, Any]]]:
+    if use_two_stage:
+        from vectorstore.doc_index import search_docs_batch
+        pending = [i for i, f in enumerate(filters_list) if not (f or {}).get("doc_ids")]
+        doc_ids = search_docs_batch([qvecs[i] for i in pending], filters=[filters_list[i] for i in pending])
+        empty = set()
+        for i, ids in zip(pending, doc_ids):
+            if ids:
+                filters_list[i] = {**(filters_list[i] or {}), "doc_ids": ids}
+            else:
+                empty.add(i)
+
+        # Queries whose document stage found nothing get no chunk results
+        keep = [i for i in range(len(qvecs)) if i not in empty]
+        hits = _qdrant_search_batch([qvecs[i] for i in keep], top_k, [filters_list[i] for i in keep], with_payload)
+        results: List[List[Dict[str, Any]]] = [[] for _ in qvecs]
+        for i, h in zip(keep, hits):
+            results[i] = h
+        return results
+
+    return _qdrant_search_batch(qvecs, top_k, filters_list, with_payload)
+
+async def _aqdrant_backend_search(
+    qvec: Sequence[float],
+    top_k: int,
+    filters: Optional[Dict[str, Any]],
+    with_payload: bool,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    if PARTITION_FIELD:
+        from vectorstore.partitions import apartitioned_search
+        return (await apartitioned_search(qvec, top_k + offset, filters, with_payload))[offset:]
+    return await _aqdrant_search(qvec, top_k, filters, with_payload, offset=offset)
+
+async def asearch(
+    qvec: Sequence[float],
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+    two_stage: Optional[bool] = None,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """Async `search`. Qdrant is queried with the async client; the in-process
+    backends are CPU-bound and run on the bounded CPU pool."""
+    if RETRIEVAL_BACKEND != "qdrant":
+        return await run_cpu(search, qvec, top_k, filters, with_payload, two_stage, offset)
+
+    qvec = project_query(qvec)
+    use_two_stage = ENABLE_TWO_STAGE if two_stage is None else two_stage
+    cache = get_retrieval_cache() if ENABLE_RETRIEVAL_CACHE else None
+    if cache is not None:
+        key = cache.key(qvec, top_k, filters, with_payload, use_two_stage, offset)
+        hits = cache.get(key)
+        if hits is not None:
+            return hits
+
+    async def run() -> List[Dict[str, Any]]:
+        if use_two_stage and not (filters or {}).get("doc_ids"):
+            from vectorstore.doc_index import asearch_docs
+            doc_ids = await asearch_docs(qvec, filters=filters)
+            if not doc_ids:
+                return []
+            doc_filters = {**(filters or {}), "doc_ids": doc_ids}
+            return await _aqdrant_backend_search(qvec, top_k, doc_filters, with_payload, offset)
+        return await _aqdrant_backend_search(qvec, top_k, filters, with_payload, offset)
+
+    hits = await _aguarded(run, qvec, top_k, filters, with_payload, offset)
+
+    if cache is not None and not _is_fallback(hits):
+        cache.put(key, hits)
+    return hits
+
+def dense_retrieve(
+    query: str,
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+) -> List[Dict[str, Any]]:
+    qvec = embed_text(query)
+    return search(qvec, top_k=top_k, filters=filters, with_payload=with_payload)
+
+def lexical_retrieve(
+    query: str,
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+) -> List[Dict[str, Any]]:
+    """BM25 lookup; no encoder call. Scores are raw BM25, not cosine."""
+    from vectorstore.bm25_index import get_bm25_index
+    return get_bm25_index().search(query, top_k=top_k, filters=filters, with_payload=with_payload)
+
+def reciprocal_rank_fusion(
+    rankings: Dict[str, List[Dict[str, Any]]],
+    top_k: int,
+    k: int = RRF_K,
+) -> List[Dict[str, Any]]:
+    """Fuse ranked lists by sum(1 / (k + rank)), keyed on point id.
+
+    Each fused hit keeps its per-ranker scores as "<name>_score" and the fused
+    value as "fusion_score". "score" stays the dense cosine (0.0 when only the
+    lexical side matched) so SCORE_THRESHOLD keeps its meaning.
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for name, hits in rankings.items():
+        for rank, h in enumerate(hits, start=1):
+            entry = fused.setdefault(h["id"], {"id": h["id"], "score": 0.0, "payload": h.get("payload") or {}, "fusion_score": 0.0})
+            entry["fusion_score"] += 1.0 / (k + rank)
+            entry[f"{name}_score"] = h["score"]
+            if h.get("fallback"):
+                entry["fallback"] = True
+            if name == "dense":
+                entry["score"] = h["score"]
+    return sorted(fused.values(), key=lambda r: r["fusion_score"], reverse=True)[:top_k]
+
+def hybrid_retrieve(
+    query: str,
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+) -> List[Dict[str, Any]]:
+    """Run dense and BM25 retrieval concurrently and fuse them with RRF."""
+    fetch_k = max(top_k, HYBRID_CANDIDATES)
+    dense_future = _hybrid_executor.submit(dense_retrieve, query, fetch_k, filters, with_payload)
+    lexical = lexical_retrieve(query, top_k=fetch_k, filters=filters, with_payload=with_payload)
+    dense = dense_future.result()
+    return reciprocal_rank_fusion({"dense": dense, "lexical": lexical}, top_k=top_k)
+
+def retrieve(
+    query: str,
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+    mode: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Retrieve chunks for `query` using RETRIEVAL_MODE (or an explicit `mode`)."""
+    mode = (mode or RETRIEVAL_MODE).lower()
+    if mode == "lexical":
+        return lexical_retrieve(query, top_k=top_k, filters=filters, with_payload=with_payload)
+    if mode == "hybrid":
+        return hybrid_retrieve(query, top_k=top_k, filters=filters, with_payload=with_payload)
+    if mode == "dense":
+        return dense_retrieve(query, top_k=top_k, filters=filters, with_payload=with_payload)
+    raise ValueError(f"Unknown RETRIEVAL_MODE: {mode}")
+
+def retrieve_batch(
+    queries: Sequence[str],
+    top_k: int = 5,
+    filters: Union[None, Dict[str, Any], Sequence[Optional[Dict[str, Any]]]] = None,
+    with_payload: bool = True,
+    mode: Optional[str] = None,
+    query_vectors: Optional[Sequence[Sequence[float]]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """`retrieve` for many queries: one encoder call for all of them and one
+    batched backend search. `filters` is shared or given per query;
+    `query_vectors` skips the encoder when the caller has them."""
+    mode = (mode or RETRIEVAL_MODE).lower()
+    filters_list = _per_query_filters(filters, len(queries))
+    if not queries:
+        return []
+
+    if mode == "lexical":
+        return [lexical_retrieve(q, top_k, f, with_payload) for q, f in zip(queries, filters_list)]
+    if mode not in ("dense", "hybrid"):
+        raise ValueError(f"Unknown RETRIEVAL_MODE: {mode}")
+
+    fetch_k = max(top_k, HYBRID_CANDIDATES) if mode == "hybrid" else top_k
+    qvecs = query_vectors
+    if qvecs is None:
+        qvecs = embed_texts(list(queries), batch_size=64, show_progress=False, normalize=True)
+    dense = search_batch(qvecs, top_k=fetch_k, filters=filters_list, with_payload=with_payload)
+    if mode == "dense":
+        return dense
+
+    return [
+        reciprocal_rank_fusion(
+            {"dense": d, "lexical": lexical_retrieve(q, fetch_k, f, with_payload)},
+            top_k=top_k,
+        )
+        for q, f, d in zip(queries, filters_list, dense)
+    ]
+
+async def adense_retrieve(
+    query: str,
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+    query_vector: Optional[Sequence[float]] = None,
+) -> List[Dict[str, Any]]:
+    qvec = query_vector if query_vector is not None else await run_cpu(embed_text, query)
+    return await asearch(qvec, top_k=top_k, filters=filters, with_payload=with_payload)
+
+async def ahybrid_retrieve(
+    query: str,
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+    query_vector: Optional[Sequence[float]] = None,
+) -> List[Dict[str, Any]]:
+    fetch_k = max(top_k, HYBRID_CANDIDATES)
+    dense, lexical = await asyncio.gather(
+        adense_retrieve(query, fetch_k, filters, with_payload, query_vector),
+        run_cpu(lexical_retrieve, query, fetch_k, filters, with_payload),
+    )
+    return reciprocal_rank_fusion({"dense": dense, "lexical": lexical}, top_k=top_k)
+
+async def aretrieve(
+    query: str,
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    with_payload: bool = True,
+    mode: Optional[str] = None,
+    query_vector: Optional[Sequence[float]] = None,
+) -> List[Dict[str, Any]]:
+    """Async `retrieve` for the async API path. `query_vector`, when the
+    caller already embedded `query` (e.g. for the semantic cache), skips
+    the encoder."""
+    mode = (mode or RETRIEVAL_MODE).lower()
+    if mode == "lexical":
+        return await run_cpu(lexical_retrieve, query, top_k, filters, with_payload)
+    if mode == "hybrid":
+        return await ahybrid_retrieve(
+            query, top_k=top_k, filters=filters, with_payload=with_payload, query_vector=query_vector,
+        )
+    if mode == "dense":
+        return await adense_retrieve(
+            query, top_k=top_k, filters=filters, with_payload=with_payload, query_vector=query_vector,
+        )
+    raise ValueError(f"Unknown RETRIEVAL_MODE: {mode}")
+
 if __name__ == "__main__":
     q = "compliance regulation obligations"
     res = retrieve(q, top_k=5, filters={"department": "Compliance"})
     for i, r in enumerate(res, 1):
-        print(i, r["score"], r["payload"].get("doc_id"), r["payload"].get("chunk_id"))
\ No newline at end of file
+        print(i, r["score"], r["payload"].get("doc_id"), r["payload"].get("chunk_id"))
@@ -0,0 +1,292 @@
+"""
+Collection snapshot export / import.
+
+Restoring an environment (or a lost qdrant_storage volume) normally means
+re-running embed + index over the whole corpus. A snapshot keeps the already
+computed vectors instead, so a restore is pure I/O:
+
+    manifest.json                  model name, dimension, projection, distance, chunk count, shard list
+    shard_00000.ids.npy            uint64 point ids
+    shard_00000.vectors.npy        float32 [n, dim]
+    shard_00000.payloads.parquet   payloads (zstd-compressed Parquet)
+
+Usage:
+    python -m vectorstore.snapshot export --out data/snapshot
+    python -m vectorstore.snapshot import --src data/snapshot --target qdrant --recreate
+    python -m vectorstore.snapshot import --src data/snapshot --target local
+"""
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Iterator, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams, PointStruct
+
+from vectorstore.qdrant_pool import get_qdrant_client
+from vectorstore.index_version import bump_index_version, read_index_version
+from vectorstore.projection import load_projection
+from vectorstore.partitions import searchable_collections, upsert_points, drop_partitions
+from rag_pipeline.configs.settings import (
+    COLLECTION_NAME, RETRIEVAL_BACKEND, LOCAL_INDEX_DIR, HNSW_INDEX_DIR, SNAPSHOT_DIR, PARTITION_FIELD,
+    EMBEDDING_MODEL_NAME,
+)
+
+MANIFEST = "manifest.json"
+SHARD_SIZE = 50_000
+SCROLL_BATCH = 1024
+UPSERT_BATCH = 1024
+
+
+def _shard_paths(root: str, name: str) -> Tuple[str, str, str]:
+    return (
+        os.path.join(root, f"{name}.ids.npy"),
+        os.path.join(root, f"{name}.vectors.npy"),
+        os.path.join(root, f"{name}.payloads.parquet"),
+    )
+
+
+# ── Export ────────────────────────────────────────────────────────────────────
+def _iter_qdrant_points(client: QdrantClient) -> Iterator[Tuple[int, List[float], Dict[str, Any]]]:
+    for collection in searchable_collections():
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection,
+                limit=SCROLL_BATCH,
+                offset=offset,
+                with_vectors=True,
+                with_payload=True,
+            )
+            for p in points:
+                yield int(p.id), p.vector, p.payload or {}
+            if offset is None:
+                break
+
+
+def _open_source(backend: str) -> Tuple[Iterator[Tuple[int, Any, Dict[str, Any]]], str]:
+    """(point iterator, model name) for the backend being exported. Qdrant
+    does not record the encoder, so the configured one is named; local
+    indexes saved without a model name fall back to it too."""
+    if backend == "qdrant":
+        return _iter_qdrant_points(get_qdrant_client()), EMBEDDING_MODEL_NAME
+    if backend == "hnsw":
+        from vectorstore.hnsw_index import HNSWIndex
+        index = HNSWIndex.load(HNSW_INDEX_DIR)
+    else:
+        from vectorstore.local_index import LocalIndex
+        index = LocalIndex.load(LOCAL_INDEX_DIR)
+    return index.iter_points(), index.model_name or EMBEDDING_MODEL_NAME
+
+
+def export_snapshot(out_dir: str, backend: str = RETRIEVAL_BACKEND, shard_size: int = SHARD_SIZE) -> Dict[str, Any]:
+    os.makedirs(out_dir, exist_ok=True)
+    points, model = _open_source(backend)
+
+    shards: List[Dict[str, Any]] = []
+    ids: List[int] = []
+    vectors: List[Any] = []
+    payloads: List[Dict[str, Any]] = []
+    dim = 0
+
+    def flush():
+        nonlocal ids, vectors, payloads
+        if not ids:
+            return
+        name = f"shard_{len(shards):05d}"
+        ids_path, vec_path, payload_path = _shard_paths(out_dir, name)
+        np.save(ids_path, np.asarray(ids, dtype=np.uint64))
+        np.save(vec_path, np.asarray(vectors, dtype=np.float32))
+        # from_pylist infers columns from the first row only: name every key
+        # seen in the shard so later rows keep theirs
+        keys = list(dict.fromkeys(k for payload in payloads for k in payload))
+        rows = [{k: payload.get(k) for k in keys} for payload in payloads]
+        pq.write_table(pa.Table.from_pylist(rows), payload_path, compression="zstd")
+        shards.append({"name": name, "count": len(ids)})
+        print(f"Wrote {name} ({len(ids)} points)")
+        ids, vectors, payloads = [], [], []
+
+    for pid, vec, payload in points:
+        ids.append(pid)
+        vectors.append(vec)
+        payloads.append(payload)
+        dim = dim or len(vec)
+        if len(ids) >= shard_size:
+            flush()
+    flush()
+
+    manifest = {
+        "collection": COLLECTION_NAME,
+        "source_backend": backend,
+        "model_name": model,
+        "dim": dim,
+        "projection": read_index_version().get("projection"),
+        "distance": "cosine",
+        "count": sum(s["count"] for s in shards),
+        "shards": shards,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# ── Import ────────────────────────────────────────────────────────────────────
+def read_manifest(src_dir: str) -> Dict[str, Any]:
+    path = os.path.join(src_dir, MANIFEST)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Missing {path}. Run `python -m vectorstore.snapshot export` first.")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_shard(src_dir: str, name: str) -> Tuple[np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+    ids_path, vec_path, payload_path = _shard_paths(src_dir, name)
+    # Parquet has one column per key seen in the shard: drop the nulls it
+    # filled in for points that never had the key
+    rows = pq.read_table(payload_path).to_pylist()
+    payloads = [{k: v for k, v in row.items() if v is not None} for row in rows]
+    return np.load(ids_path), np.load(vec_path, mmap_mode="r"), payloads
+
+
+def _target_projection(manifest: Dict[str, Any]):
+    """Projection to apply while importing: the configured one, unless the
+    snapshot vectors are already in that space."""
+    projection = load_projection()
+    if projection is None:
+        if manifest.get("projection"):
+            raise ValueError(f"Snapshot holds reduced vectors ({manifest['projection']}); set VECTOR_REDUCTION to match")
+        return None
+    if manifest.get("projection") == projection.projection_id:
+        return None
+    if manifest.get("projection"):
+        raise ValueError(f"Snapshot projection {manifest['projection']} != configured {projection.projection_id}")
+    return projection
+
+
+def _import_qdrant(src_dir: str, manifest: Dict[str, Any], workers: int, recreate: bool, projection=None) -> None:
+    client = get_qdrant_client()
+    dim = projection.dim if projection is not None else int(manifest["dim"])
+    existing = [c.name for c in client.get_collections().collections]
+    if recreate and COLLECTION_NAME in existing:
+        client.delete_collection(collection_name=COLLECTION_NAME)
+        print(f"Deleted collection {COLLECTION_NAME}")
+        existing.remove(COLLECTION_NAME)
+    if PARTITION_FIELD:
+        if recreate:
+            drop_partitions(client)
+    elif COLLECTION_NAME not in existing:
+        client.create_collection(
+            collection_name=COLLECTION_NAME,
+            vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+        )
+        print(f"Created collection '{COLLECTION_NAME}' with dim={dim}")
+
+    def upload(name: str) -> int:
+        ids, vectors, payloads = load_shard(src_dir, name)
+        for start in range(0, len(ids), UPSERT_BATCH):
+            end = start + UPSERT_BATCH
+            batch = projection.apply(vectors[start:end]) if projection is not None else vectors[start:end]
+            upsert_points(client, [
+                PointStruct(id=int(pid), vector=vec.tolist(), payload=payload)
+                for pid, vec, payload in zip(ids[start:end], batch, payloads[start:end])
+            ])
+        print(f"Upserted {name} ({len(ids)} points)")
+        return len(ids)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        total = sum(pool.map(upload, [s["name"] for s in manifest["shards"]]))
+    print(f"Imported {total} points into '{COLLECTION_NAME}'")
+
+
+def build_index(src_dir: str, manifest: Dict[str, Any], workers: int = 4, target: str = "local", projection=None):
+    """An in-memory LocalIndex (or HNSWIndex) holding every snapshot shard."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        shards = list(pool.map(lambda s: load_shard(src_dir, s["name"]), manifest["shards"]))
+
+    dim = int(manifest["dim"])
+    ids = np.concatenate([s[0] for s in shards]) if shards else np.zeros(0, dtype=np.uint64)
+    vectors = np.vstack([np.asarray(s[1]) for s in shards]) if shards else np.zeros((0, dim), dtype=np.float32)
+    payloads = [p for s in shards for p in s[2]]
+    if projection is not None:
+        vectors, dim = projection.apply(vectors), projection.dim
+
+    if target == "hnsw":
+        from vectorstore.hnsw_index import HNSWIndex
+        index = HNSWIndex.empty(dim, model_name=manifest.get("model_name", ""))
+    else:
+        from vectorstore.local_index import LocalIndex
+        index = LocalIndex.empty(dim, model_name=manifest.get("model_name", ""))
+
+    index.add(ids.tolist(), vectors, payloads)
+    return index
+
+
+def load_snapshot_index(src_dir: str = SNAPSHOT_DIR, workers: int = 4):
+    """A LocalIndex over the snapshot in `src_dir`, in the configured vector space."""
+    manifest = read_manifest(src_dir)
+    return build_index(src_dir, manifest, workers, "local", _target_projection(manifest))
+
+
+def _import_local(src_dir: str, manifest: Dict[str, Any], workers: int, target: str, projection=None) -> None:
+    index = build_index(src_dir, manifest, workers, target, projection)
+    path = HNSW_INDEX_DIR if target == "hnsw" else LOCAL_INDEX_DIR
+    index.save(path)
+    print(f"Imported {len(index)} points into {target} index -> {path}")
+
+
+def import_snapshot(
+    src_dir: str,
+    target: str = RETRIEVAL_BACKEND,
+    workers: int = 4,
+    recreate: bool = False,
+) -> None:
+    manifest = read_manifest(src_dir)
+    print(f"Snapshot: {manifest['count']} points, dim={manifest['dim']}, "
+          f"model={manifest.get('model_name') or 'unknown'}, {len(manifest['shards'])} shards")
+    projection = _target_projection(manifest)
+    if projection is not None:
+        print(f"Projecting vectors on import: {projection.projection_id}")
+    if target == "qdrant":
+        _import_qdrant(src_dir, manifest, workers, recreate, projection)
+    else:
+        _import_local(src_dir, manifest, workers, target, projection)
+    bump_index_version(
+        f"snapshot import ({target})",
+        projection=projection.projection_id if projection is not None else manifest.get("projection"),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / import vector snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="write ids, vectors and payloads to shards")
+    exp.add_argument("--out", default=SNAPSHOT_DIR)
+    exp.add_argument("--source", default=RETRIEVAL_BACKEND, choices=["qdrant", "local", "hnsw"])
+    exp.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+
+    imp = sub.add_parser("import", help="bulk-load shards without re-embedding")
+    imp.add_argument("--src", default=SNAPSHOT_DIR)
+    imp.add_argument("--target", default=RETRIEVAL_BACKEND, choices=["qdrant", "local", "hnsw"])
+    imp.add_argument("--workers", type=int, default=4)
+    imp.add_argument("--recreate", action="store_true", help="drop the Qdrant collection first")
+
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    if args.command == "export":
+        manifest = export_snapshot(args.out, backend=args.source, shard_size=args.shard_size)
+        print(f"Exported {manifest['count']} points -> {args.out}")
+    else:
+        import_snapshot(args.src, target=args.target, workers=args.workers, recreate=args.recreate)
+    print(f"Done in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()